@@ -0,0 +1,206 @@
+import bookingai_utils as utils
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+
+
+def job_names(params_paths):
+    """returns a unique name for each job, the name of its search parameters file (with a number if repeated)
+
+    Parameters
+    ----------
+    params_paths : list
+        paths to txt files with search parameters
+    """
+    names = []
+    for path in params_paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        unique = name
+        n = 2
+        while unique in names:
+            unique = f'{name}_{n}'
+            n += 1
+        names.append(unique)
+    return names
+
+
+def run_job(job):
+    """runs a single search from start to end in a headless browser: searches, scrapes, saves the dataset and asks
+    the questions, saving the answers next to it. runs in a worker process of run_batch
+
+    Parameters
+    ----------
+    job : dict
+        with the keys name, params_path, questions, dataset_path, amount, requests_per_minute, tokens_per_minute,
+        browser_profile
+
+    Returns
+    -------
+    dict
+        the job's name, status ('done' or 'failed'), seconds, listings, dataset path, answers path (None if there were
+        no questions) and error (None if done)
+    """
+    # imported in the worker, so the parent process never loads selenium or openai
+    import bookingai_bot
+    import bookingai_cgpt
+    import bookingai_matrix
+
+    start = time.perf_counter()
+    result = {'name': job['name'], 'status': 'failed', 'seconds': None, 'listings': 0,
+              'dataset': job['dataset_path'], 'answers': None, 'error': None}
+    bot = None
+
+    try:
+        stats_dict = utils.dict_from_text(job['params_path'])
+        bot = bookingai_bot.BookingBot(stats_dict=stats_dict, browser_profile=job['browser_profile'])
+        bot.search_vacation()
+        bot.save_search_data(amount=job['amount'], csv_path=job['dataset_path'])
+        result['listings'] = len(bot.data)
+
+        if job['questions']:
+            # each worker gets its share of the account's limits, so together they stay under them
+            helper = bookingai_cgpt.GPThelper(requests_per_minute=job['requests_per_minute'],
+                                              tokens_per_minute=job['tokens_per_minute'])
+            matrix = bookingai_matrix.ask_questions(bot, job['questions'], helper)
+            result['answers'] = bookingai_matrix.matrix_path(job['dataset_path'])
+            matrix.save(result['answers'])
+
+        result['status'] = 'done'
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {str(e).strip()}'
+        result['traceback'] = traceback.format_exc()
+    finally:
+        if bot is not None:
+            bot.quit()
+        result['seconds'] = time.perf_counter() - start
+
+    return result
+
+
+def run_batch(params_paths, questions=(), out_dir='batch_outputs', workers=4, amount=10, dataset_format='csv',
+              requests_per_minute=3500, tokens_per_minute=90000, browser_profile='headless', log=print):
+    """runs many searches at once, each in its own process with its own headless browser, at most workers at a time
+    each search writes its dataset (and the answers to the questions, see bookingai_matrix) to out_dir, progress is
+    logged as the jobs finish, and a summary of all jobs is written to out_dir/batch_summary.json
+
+    Parameters
+    ----------
+    params_paths : list
+        paths to txt files with search parameters, one job for each (see inputs_outputs/petah_tikvah.txt)
+
+    questions : list
+        yes or no questions to ask about the listings of each search, none if empty
+
+    out_dir : str
+        folder to write the datasets, answers and summary to, created if it does not exist
+
+    workers : int
+        max amount of searches (browsers) running at the same time
+
+    amount : int
+        amount of listings to scrape in each search
+
+    dataset_format : str
+        'csv', 'parquet' or 'arrow', format of the datasets and answer files
+
+    requests_per_minute : int
+        requests per minute limit of the openai account, split evenly between the workers
+
+    tokens_per_minute : int
+        tokens per minute limit of the openai account, split evenly between the workers
+
+    browser_profile : str
+        'headless' or 'fast' (headless, without images, fonts, media and trackers), see bookingai_browser.PROFILES
+
+    log : function
+        called with each progress line
+
+    Raises
+    ------
+    ValueError
+        if dataset_format or browser_profile is not one of the above
+
+    Returns
+    -------
+    list
+        the result of each job (see run_job), by the order of params_paths
+    """
+    if dataset_format not in ('csv', 'parquet', 'arrow'):
+        raise ValueError("dataset_format must be 'csv', 'parquet' or 'arrow'")
+    if browser_profile not in ('headless', 'fast'):
+        raise ValueError("browser_profile must be 'headless' or 'fast', jobs run with nobody watching")
+
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = []
+    for name, path in zip(job_names(params_paths), params_paths):
+        jobs.append({'name': name, 'params_path': os.path.abspath(path), 'questions': list(questions),
+                     'dataset_path': os.path.abspath(os.path.join(out_dir, f'{name}.{dataset_format}')),
+                     'amount': amount, 'requests_per_minute': max(1, requests_per_minute // workers),
+                     'tokens_per_minute': max(1, tokens_per_minute // workers),
+                     'browser_profile': browser_profile})
+
+    start = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_job, job): job for job in jobs}
+
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # the worker process itself died
+                result = {'name': job['name'], 'status': 'failed', 'seconds': None, 'listings': 0,
+                          'dataset': job['dataset_path'], 'answers': None,
+                          'error': f'{type(e).__name__}: {str(e).strip()}'}
+            results[job['name']] = result
+
+            if result['status'] == 'done':
+                line = f"{result['name']}: done in {result['seconds']:.1f}s, {result['listings']} listings"
+            else:
+                seconds = '' if result['seconds'] is None else f" after {result['seconds']:.1f}s"
+                line = f"{result['name']}: failed{seconds}, {result['error']}"
+            log(f'[{len(results)}/{len(jobs)}] {line}')
+
+    ordered = [results[job['name']] for job in jobs]
+    failed = sum(r['status'] != 'done' for r in ordered)
+    total = time.perf_counter() - start
+    job_seconds = sum(r['seconds'] or 0 for r in ordered)
+    log(f'{len(jobs) - failed} jobs done, {failed} failed, in {total:.1f}s ({job_seconds:.1f}s of work)')
+
+    summary = {'seconds': total, 'jobs': [{k: v for k, v in r.items() if k != 'traceback'} for r in ordered]}
+    with open(os.path.join(out_dir, 'batch_summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    return ordered
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='runs many bookingai searches in parallel, with no prompts')
+    arg_parser.add_argument('params', nargs='+', help='txt files with search parameters, one search for each')
+    arg_parser.add_argument('--questions', nargs='*', default=[], help='yes or no questions about each listing')
+    arg_parser.add_argument('--questions-file', help='a txt file with a question in each line')
+    arg_parser.add_argument('--out', default='batch_outputs', help='folder to write the results to')
+    arg_parser.add_argument('--workers', type=int, default=4, help='max amount of browsers at the same time')
+    arg_parser.add_argument('--amount', type=int, default=10, help='amount of listings in each search')
+    arg_parser.add_argument('--format', default='csv', choices=['csv', 'parquet', 'arrow'])
+    arg_parser.add_argument('--browser-profile', default='headless', choices=['headless', 'fast'],
+                            help='fast blocks images, fonts, media and trackers')
+    args = arg_parser.parse_args()
+
+    questions = list(args.questions)
+    if args.questions_file is not None:
+        with open(args.questions_file) as f:
+            questions.extend(line.strip() for line in f if line.strip())
+
+    results = run_batch(args.params, questions, args.out, args.workers, args.amount, args.format,
+                        browser_profile=args.browser_profile)
+    sys.exit(1 if any(r['status'] != 'done' for r in results) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,966 @@
+import bookingai_bot
+import bookingai_browser
+import bookingai_cascade
+import bookingai_cgpt
+import bookingai_data
+import bookingai_dedup
+import bookingai_fakes
+import bookingai_fetch
+import bookingai_metrics
+import bookingai_query
+import bookingai_utils as utils
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import json
+import lxml.html
+import os
+import pandas as pd
+import pprint
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def compare_batch_mode(csv_path, question, batch_size=5, api_base=None):
+    """asks the same question about every listing in a csv in the per listing mode and in the batched mode, and
+    compares the time, the amount of requests and the answers of both
+    the per listing mode is the accurate one (see README), so the accuracy of the batched mode is measured as its
+    agreement with it
+    the cache is turned off so both modes actually send their requests
+
+    Parameters
+    ----------
+    csv_path : str
+        path to a csv with listings data, like inputs_outputs/results.csv
+
+    question : str
+        a yes or no question about each listing
+
+    batch_size : int
+        amount of listings in each batched prompt
+
+    api_base : str
+        if not None, sends the requests to this url (e.g. a local fake server) instead of openai's
+
+    Returns
+    -------
+    dict
+        the results of each mode (seconds, requests, requests per second) and the agreement between them
+    """
+    bot = utils.create_bot(csv_path=csv_path)
+    try:
+        prompts = bot.create_prompts(question)
+        batches = bot.create_batched_prompts(question, batch_size)
+    finally:
+        bot.quit()
+
+    single = bookingai_cgpt.GPThelper(api_base=api_base, use_cache=False)
+    start = time.perf_counter()
+    single.query_list(prompts)
+    single_time = time.perf_counter() - start
+
+    batched = bookingai_cgpt.GPThelper(api_base=api_base, use_cache=False)
+    start = time.perf_counter()
+    batched.query_batched(batches, prompts)
+    batched_time = time.perf_counter() - start
+
+    agreeing = sum(a == b for a, b in zip(single.answers, batched.answers))
+    batched_requests = len(batches) + batched.batch_fallbacks
+
+    return {
+        'listings': len(prompts),
+        'per_listing': {'seconds': single_time, 'requests': len(prompts),
+                        'listings_per_second': len(prompts) / single_time},
+        'batched': {'seconds': batched_time, 'requests': batched_requests, 'fallbacks': batched.batch_fallbacks,
+                    'listings_per_second': len(prompts) / batched_time},
+        'agreement': agreeing / len(prompts),
+    }
+
+
+STARTUP_SCRIPT = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import bookingai_utils
+bot = bookingai_utils.create_bot(csv_path=sys.argv[1])
+bot.create_prompts('does this room have a kettle?')
+seconds = time.perf_counter() - start
+print(json.dumps({
+    'seconds': seconds,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'browser_started': bot.has_browser(),
+    'heavy_modules': [m for m in ('selenium', 'openai', 'requests', 'lxml') if m in sys.modules],
+}))
+'''
+
+
+def startup_benchmark(csv_path, runs=5):
+    """measures the startup of a csv only session (load the data and create prompts, no scraping), each run in a
+    fresh python process so imports are measured too
+
+    Parameters
+    ----------
+    csv_path : str
+        path to a csv with listings data, like inputs_outputs/results.csv
+
+    runs : int
+        amount of processes to start, the median is reported
+
+    Returns
+    -------
+    dict
+        median seconds from the first import to the prompts being ready, median process wall time (including the
+        interpreter startup), max memory, whether a browser was started and which heavy modules were imported
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    wall_times = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, os.path.abspath(csv_path)], cwd=repo_dir,
+                             capture_output=True, text=True, check=True).stdout
+        wall_times.append(time.perf_counter() - start)
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    return {
+        'seconds': statistics.median(r['seconds'] for r in results),
+        'process_seconds': statistics.median(wall_times),
+        'max_rss_mb': max(r['max_rss_mb'] for r in results),
+        'browser_started': any(r['browser_started'] for r in results),
+        'heavy_modules': results[-1]['heavy_modules'],
+    }
+
+
+DATASET_SCRIPT = '''
+import json, sys, time
+import bookingai_bot
+start = time.perf_counter()
+bot = bookingai_bot.BookingBot(data_csv_path=sys.argv[1])
+repr(bot.summary())
+seconds = time.perf_counter() - start
+# VmHWM rather than ru_maxrss, which keeps the peak of the parent process across exec
+peak_kb = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmHWM'))
+print(json.dumps({'seconds': seconds, 'peak_rss_mb': peak_kb / 1024}))
+'''
+
+
+def synthetic_dataset(csv_path, size):
+    """returns a dataset of size listings made by repeating the listings of a csv, with unique names and links"""
+    data = bookingai_data.load_frame(csv_path)
+    data = data.iloc[[i % len(data) for i in range(size)]].reset_index(drop=True)
+    data['name'] = data['name'] + ' #' + data.index.astype(str)
+    data['link'] = data['link'] + '?row=' + data.index.astype(str)
+    return data
+
+
+def dataset_benchmark(csv_path, sizes=(1000, 10000, 50000)):
+    """measures loading a dataset for display (the summary, without descriptions) from csv, parquet and arrow files
+    of growing sizes, each load in a fresh python process
+
+    Parameters
+    ----------
+    csv_path : str
+        path to a csv with listings data, repeated to make the bigger datasets
+
+    sizes : tuple
+        amounts of listings to measure
+
+    Returns
+    -------
+    dict
+        format to a dict of size to the load seconds, the peak memory of the process (mb) and the file size (mb)
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            data = synthetic_dataset(csv_path, size)
+
+            for extension in ('csv', 'parquet', 'arrow'):
+                path = os.path.join(tmp_dir, f'listings_{size}.{extension}')
+                bookingai_data.save_frame(data, path)
+
+                out = subprocess.run([sys.executable, '-c', DATASET_SCRIPT, path], cwd=repo_dir,
+                                     capture_output=True, text=True, check=True).stdout
+                result = json.loads(out.strip().splitlines()[-1])
+                result['file_mb'] = os.path.getsize(path) / 2 ** 20
+                results.setdefault(extension, {})[size] = result
+
+    return results
+
+
+STREAM_SCRIPT = '''
+import json, sys, time
+import bookingai_bot, bookingai_cgpt, bookingai_fakes, bookingai_stream
+path, mode, chunksize, question = sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4]
+with bookingai_fakes.FakeChatServer(latency=0) as chat:
+    helper = bookingai_cgpt.GPThelper(max_workers=16, requests_per_minute=10 ** 7, tokens_per_minute=10 ** 9,
+                                      api_base=chat.api_base, use_cache=False)
+    start = time.perf_counter()
+    if mode == 'memory':
+        bot = bookingai_bot.BookingBot(data_csv_path=path)
+        helper.query_list(bot.create_prompts(question))
+        yes = sum(helper.answers)
+    else:
+        result = bookingai_stream.answer_in_chunks(path, [question], path + '.answers.csv', chunksize, helper,
+                                                   restart=True, log=None)
+        yes = result['matches'][question]
+    seconds = time.perf_counter() - start
+peak_kb = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmHWM'))
+print(json.dumps({'seconds': seconds, 'peak_rss_mb': peak_kb / 1024, 'matches': yes}))
+'''
+
+
+def stream_benchmark(csv_path, sizes=(2000, 10000), chunksize=500, question='does this room have a kettle?'):
+    """measures asking a question about every listing of growing csv datasets, loading the whole dataset (create_prompts
+    and query_list) against going over it a chunk at a time (bookingai_stream), each run in a fresh python process
+    with a local fake chatgpt that answers at once, so the memory of the data, prompts and answers is what grows
+
+    Parameters
+    ----------
+    csv_path : str
+        path to a csv with listings data, repeated to make the bigger datasets
+
+    sizes : tuple
+        amounts of listings to measure
+
+    chunksize : int
+        rows asked about at once in the chunked mode
+
+    question : str
+        a yes or no question about each listing
+
+    Returns
+    -------
+    dict
+        mode ('memory' or 'chunks') to a dict of size to the seconds, the peak memory of the process (mb) and the
+        amount of matches
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            path = os.path.join(tmp_dir, f'listings_{size}.csv')
+            bookingai_data.save_frame(synthetic_dataset(csv_path, size), path)
+
+            for mode in ('memory', 'chunks'):
+                out = subprocess.run([sys.executable, '-c', STREAM_SCRIPT, path, mode, str(chunksize), question],
+                                     cwd=repo_dir, capture_output=True, text=True, check=True).stdout
+                results.setdefault(mode, {})[size] = json.loads(out.strip().splitlines()[-1])
+
+    return results
+
+
+def peak_rss_mb(reset=False):
+    """returns the peak memory of this process in mb (VmHWM, linux only), None where it can not be read
+    with reset=True, the peak is then reset to the current memory, so the next call measures only what came after
+
+    Parameters
+    ----------
+    reset : bool
+        if True, resets the peak after reading it
+    """
+    try:
+        with open('/proc/self/status') as f:
+            peak = next(int(line.split()[1]) for line in f if line.startswith('VmHWM')) / 1024
+        if reset:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+        return peak
+    except (OSError, StopIteration):
+        return None
+
+
+def run_scenario(listings, question='does this room have a kettle?', chat_latency=0.05, page_latency=0.02,
+                 requests_per_minute=0, rate_limit_every=0, max_workers=8, tokens_per_minute=1000000):
+    """runs an end to end session against a local fake booking.com and a local fake chatgpt, with no network, and
+    measures each stage: scraping (search result pages and listing pages, over http with the DetailFetcher and
+    BookingBot.parse_search_page, since a browser is not needed for the fake pages), prompt building and querying
+
+    Parameters
+    ----------
+    listings : int
+        amount of listings in the fake search results
+
+    question : str
+        a yes or no question about each listing
+
+    chat_latency : float
+        seconds each request to the fake chatgpt takes
+
+    page_latency : float
+        seconds each request to the fake booking.com takes
+
+    requests_per_minute : int
+        if not 0, the fake chatgpt answers requests over this limit with a 429 error
+
+    rate_limit_every : int
+        if not 0, the fake chatgpt answers every n-th request with a 429 error
+
+    max_workers : int
+        concurrent page fetches and concurrent chatgpt requests
+
+    tokens_per_minute : int
+        tokens per minute limit of the GPThelper, high by default so the code is measured and not the client side
+        limit (requests_per_minute sets a limit on the fake server side)
+
+    Returns
+    -------
+    dict
+        for each stage (scraping, prompts, querying): seconds, requests, requests per second and the peak memory of the
+        process during the stage (mb), with the seconds until the first answer for querying, and the total seconds
+    """
+    results = {'listings': listings}
+    metrics = bookingai_metrics.Metrics()
+    session_start = time.perf_counter()
+
+    site = bookingai_fakes.FakeBookingServer(bookingai_fakes.synthetic_listings(listings), latency=page_latency)
+    chat = bookingai_fakes.FakeChatServer(latency=chat_latency, requests_per_minute=requests_per_minute,
+                                          rate_limit_every=rate_limit_every)
+
+    with site, chat:
+        # scraping: the search result pages one after the other, then the listing pages concurrently
+        peak_rss_mb(reset=True)
+        start = time.perf_counter()
+        fetcher = bookingai_fetch.DetailFetcher(max_workers=max_workers, max_per_host=max_workers, host_delay=0,
+                                                metrics=metrics)
+        pages = []
+        url = site.search_url
+        while url is not None:
+            response = fetcher.session.get(url)
+            pages.append(bookingai_bot.BookingBot.parse_search_page(response.text, response.url))
+            next_href = lxml.html.fromstring(response.text).xpath("//button[@aria-label='Next page']"
+                                                                  "[not(@disabled)]/@data-href")
+            url = site.base_url + next_href[0] if next_href else None
+
+        cards = bookingai_bot.BookingBot.parse_cards(pd.concat(pages, ignore_index=True))
+        cards['text'] = fetcher.fetch_all(list(cards['link']))
+        fetcher.close()
+        seconds = time.perf_counter() - start
+        results['scraping'] = {'seconds': seconds, 'requests': site.request_count,
+                               'requests_per_second': site.request_count / seconds, 'peak_rss_mb': peak_rss_mb(True),
+                               'missing_descriptions': int(cards['text'].isna().sum())}
+
+        # prompt building
+        start = time.perf_counter()
+        bot = bookingai_bot.BookingBot(metrics=metrics)
+        bot.data = cards[bookingai_data.DATA_COLUMNS]
+        prompts = bot.create_prompts(question)
+        seconds = time.perf_counter() - start
+        results['prompts'] = {'seconds': seconds, 'requests': 0, 'requests_per_second': None,
+                              'peak_rss_mb': peak_rss_mb(True)}
+
+        # querying: each answer is timed as it comes back
+        start = time.perf_counter()
+        helper = bookingai_cgpt.GPThelper(max_workers=max_workers, tokens_per_minute=tokens_per_minute,
+                                          api_base=chat.api_base, use_cache=False, metrics=metrics)
+        first_answer = None
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for future in as_completed([executor.submit(helper.query_listing, prompt) for prompt in prompts]):
+                future.result()
+                if first_answer is None:
+                    first_answer = time.perf_counter() - start
+        seconds = time.perf_counter() - start
+        results['querying'] = {'seconds': seconds, 'requests': chat.request_count,
+                               'requests_per_second': chat.request_count / seconds, 'peak_rss_mb': peak_rss_mb(True),
+                               'first_answer_seconds': first_answer, 'rate_limited': chat.rate_limited_count,
+                               'retries': metrics.total('gpt_retries_total')}
+
+    results['total_seconds'] = time.perf_counter() - session_start
+    return results
+
+
+def end_to_end_benchmark(sizes=(10, 100, 1000), **scenario_args):
+    """runs the offline end to end scenario (see run_scenario) for each amount of listings, each in a fresh python
+    process so the memory of one scenario does not count in the next
+
+    Parameters
+    ----------
+    sizes : tuple
+        amounts of listings, one scenario for each
+
+    scenario_args : dict
+        passed on to run_scenario (question, chat_latency, page_latency, requests_per_minute, rate_limit_every,
+        max_workers, tokens_per_minute)
+
+    Returns
+    -------
+    dict
+        amount of listings to the results of its scenario
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+
+    for size in sizes:
+        script = ('import bookingai_bench, json, sys; '
+                  'print(json.dumps(bookingai_bench.run_scenario(int(sys.argv[1]), **json.loads(sys.argv[2]))))')
+        out = subprocess.run([sys.executable, '-c', script, str(size), json.dumps(scenario_args)], cwd=repo_dir,
+                             capture_output=True, text=True, check=True).stdout
+        results[size] = json.loads(out.strip().splitlines()[-1])
+
+    return results
+
+
+def answer_mode_benchmark(csv_path, question='does this room have a kettle?', listings=50, latency=0.2,
+                          token_latency=0.02, max_workers=8, min_confidence=0.9):
+    """measures free text answers (max_tokens=100) against single token yes or no answers (GPThelper single_token,
+    with logprobs), against a local fake chatgpt that answers in full sentences and takes token_latency seconds to
+    generate each answer token, as a real model does
+
+    Parameters
+    ----------
+    csv_path : str
+        path to a csv with listings data, repeated to make listings prompts
+
+    question : str
+        a yes or no question about each listing
+
+    listings : int
+        amount of listings to ask about
+
+    latency : float
+        seconds each request takes before its first token
+
+    token_latency : float
+        seconds each answer token takes
+
+    max_workers : int
+        concurrent requests
+
+    min_confidence : float
+        answers under this confidence are counted as uncertain
+
+    Returns
+    -------
+    dict
+        mode ('text' or 'single_token') to the seconds, mean and p95 request seconds, completion tokens, matches and
+        uncertain answers (single_token only), with the agreement between the two modes
+    """
+    bot = bookingai_bot.BookingBot()
+    bot.data = synthetic_dataset(csv_path, listings)
+    prompts = bot.create_prompts(question)
+    results = {}
+    answers = {}
+
+    with bookingai_fakes.FakeChatServer(latency=latency, token_latency=token_latency, verbose=True) as chat:
+        for mode in ('text', 'single_token'):
+            metrics = bookingai_metrics.Metrics()
+            single = mode == 'single_token'
+            helper = bookingai_cgpt.GPThelper(max_workers=max_workers, tokens_per_minute=10 ** 9,
+                                              api_base=chat.api_base, use_cache=False, metrics=metrics,
+                                              single_token=single, logprobs=single, min_confidence=min_confidence)
+            tokens_before = chat.completion_tokens
+
+            start = time.perf_counter()
+            helper.query_list(prompts)
+            seconds = time.perf_counter() - start
+
+            latencies = [h for (name, _), h in metrics.histograms.items() if name == 'gpt_request_seconds'][0]
+            answers[mode] = helper.answers
+            results[mode] = {'seconds': seconds, 'mean_request_seconds': latencies.sum / latencies.count,
+                             'p95_request_seconds': latencies.quantile(0.95),
+                             'completion_tokens': chat.completion_tokens - tokens_before,
+                             'matches': sum(helper.answers),
+                             'uncertain': len(helper.uncertain()) if single else None}
+
+    results['agreement'] = statistics.mean(a == b for a, b in zip(answers['text'], answers['single_token']))
+    return results
+
+
+def endpoints_benchmark(csv_path, question='does this room have a kettle?', listings=200, counts=(1, 2, 4),
+                        latency=0.1, max_concurrency=4, max_workers=16, throttled=True):
+    """measures the throughput of GPThelper spread over several endpoints (see bookingai_cgpt.EndpointPool), each a
+    local fake chatgpt that takes max_concurrency requests at once and answers the rest with 429 errors
+
+    Parameters
+    ----------
+    csv_path : str
+        path to a csv with listings data, repeated to make listings prompts
+
+    question : str
+        a yes or no question about each listing
+
+    listings : int
+        amount of listings to ask about
+
+    counts : tuple
+        amounts of endpoints to measure
+
+    latency : float
+        seconds each request to a fake takes
+
+    max_concurrency : int
+        requests each fake takes at once, also the max_in_flight of each endpoint
+
+    max_workers : int
+        concurrent requests of the helper
+
+    throttled : bool
+        if True, also measures two endpoints of which one answers every other request with a 429 error and does not
+        limit its in flight requests, to show it being ejected
+
+    Returns
+    -------
+    dict
+        name of the run to the seconds, requests per second, 429 errors, ejections and the stats of each endpoint
+    """
+    bot = bookingai_bot.BookingBot()
+    bot.data = synthetic_dataset(csv_path, listings)
+    prompts = bot.create_prompts(question)
+
+    def run(servers, endpoints):
+        metrics = bookingai_metrics.Metrics()
+        helper = bookingai_cgpt.GPThelper(max_workers=max_workers, use_cache=False, metrics=metrics,
+                                          endpoints=endpoints)
+        start = time.perf_counter()
+        helper.query_list(prompts)
+        seconds = time.perf_counter() - start
+        return {'seconds': seconds, 'requests_per_second': len(prompts) / seconds,
+                'rate_limited': sum(server.rate_limited_count for server in servers),
+                'ejections': metrics.total('gpt_endpoint_ejections_total'), 'endpoints': helper.pool.stats(),
+                'matches': sum(helper.answers)}
+
+    results = {}
+    for count in counts:
+        servers = [bookingai_fakes.FakeChatServer(latency=latency, max_concurrency=max_concurrency).start()
+                   for _ in range(count)]
+        try:
+            endpoints = [{'api_base': server.api_base, 'requests_per_minute': 10 ** 6, 'tokens_per_minute': 10 ** 9,
+                          'max_in_flight': max_concurrency, 'name': f'fake{i}'} for i, server in enumerate(servers)]
+            results[f'{count} endpoints'] = run(servers, endpoints)
+        finally:
+            for server in servers:
+                server.stop()
+
+    if throttled:
+        servers = [bookingai_fakes.FakeChatServer(latency=latency, max_concurrency=max_concurrency).start(),
+                   bookingai_fakes.FakeChatServer(latency=latency, rate_limit_every=2).start()]
+        try:
+            endpoints = [{'api_base': servers[0].api_base, 'requests_per_minute': 10 ** 6,
+                          'tokens_per_minute': 10 ** 9, 'max_in_flight': max_concurrency, 'name': 'healthy'},
+                         {'api_base': servers[1].api_base, 'requests_per_minute': 10 ** 6,
+                          'tokens_per_minute': 10 ** 9, 'name': 'throttled'}]
+            results['healthy and throttled'] = run(servers, endpoints)
+        finally:
+            for server in servers:
+                server.stop()
+
+    return results
+
+
+def browser_benchmark(profiles=('headless', 'fast'), pages=10, assets=20, page_latency=0.05, live=False,
+                      csv_path='inputs_outputs/results.csv'):
+    """loads the search page and listing pages in chrome with each browser profile (see bookingai_browser), and
+    measures how long each page load blocks the bot and how much memory the browser takes
+    by default the pages come from a local fake booking.com whose pages show assets images and a web font, with live
+    the real booking.com home page and the listing links of csv_path are loaded instead (trackers are only blocked
+    there)
+
+    Parameters
+    ----------
+    profiles : tuple
+        browser profiles to measure, 'default' needs a display
+
+    pages : int
+        amount of listing pages to load
+
+    assets : int
+        amount of images in each fake page
+
+    page_latency : float
+        seconds each request to the fake booking.com takes, including each asset
+
+    live : bool
+        if True, loads the real booking.com pages
+
+    csv_path : str
+        csv of listings, served by the fake booking.com or, with live, whose links are loaded
+
+    Returns
+    -------
+    dict
+        profile to a dict with startup_seconds, search_page and listing_pages (each with the mean seconds the page load
+        blocked the bot, its mean dom_content_loaded and load seconds, resources and transfer_kb, see
+        bookingai_browser.page_timing) and peak_memory_mb (of all the chrome processes)
+    """
+    site = None
+    if live:
+        search_url = bookingai_bot.BookingBot().BASE_URL
+        links = list(pd.read_csv(csv_path)['link'])[:pages]
+    else:
+        site = bookingai_fakes.FakeBookingServer(bookingai_fakes.listings_from_csv(csv_path), latency=page_latency,
+                                                 assets=assets).start()
+        search_url = site.search_url
+        links = site.links[:pages]
+
+    def load(browser, url):
+        start = time.perf_counter()
+        browser.get(url)
+        blocked = time.perf_counter() - start
+        return dict(bookingai_browser.page_timing(browser), seconds=blocked)
+
+    def mean(loads):
+        keys = ('seconds', 'dom_content_loaded', 'load', 'resources', 'transfer_kb')
+        return {k: statistics.mean(r[k] for r in loads) if all(r[k] is not None for r in loads) else None
+                for k in keys}
+
+    results = {}
+    try:
+        for profile in profiles:
+            start = time.perf_counter()
+            browser = bookingai_browser.start_browser(profile)
+            startup = time.perf_counter() - start
+            try:
+                memory = [bookingai_browser.browser_memory_mb(browser)]
+                search_load = load(browser, search_url)
+                memory.append(bookingai_browser.browser_memory_mb(browser))
+
+                listing_loads = []
+                for link in links:
+                    listing_loads.append(load(browser, link))
+                    memory.append(bookingai_browser.browser_memory_mb(browser))
+            finally:
+                browser.quit()
+
+            results[profile] = {'startup_seconds': startup, 'search_page': mean([search_load]),
+                                'listing_pages': mean(listing_loads),
+                                'peak_memory_mb': max(memory) if None not in memory else None}
+    finally:
+        if site is not None:
+            site.stop()
+
+    return results
+
+
+def varied_dataset(csv_path, size, seed=0):
+    """returns a dataset of size listings whose descriptions are made of sentences sampled from the descriptions of a
+    csv, so no two descriptions are the same (unlike synthetic_dataset, which repeats them)"""
+    data = synthetic_dataset(csv_path, size)
+    sentences = [sentence.strip() for text in data['text'].dropna().unique()
+                 for sentence in re.split(r'(?<=[.!?])\s+', str(text)) if sentence.strip()]
+    rng = random.Random(seed)
+    data['text'] = [' '.join(rng.sample(sentences, rng.randint(3, 12))) for _ in range(size)]
+    return data
+
+
+def cascade_benchmark(csv_path, question='does this room have a kettle?', train=1000, test=500, latency=0.05,
+                      min_confidence=0.9):
+    """measures a cascade (bookingai_cascade) trained on the fake chatgpt's answers about train listings: its
+    escalation rate and agreement at each threshold on held out answers, then a ListingQuery over test new listings
+    against the fake, with and without the cascade
+    the fake answers by keywords (bookingai_fakes.keyword_answer), which a word model learns more easily than real gpt
+    answers, so the agreement here is an upper bound
+
+    Parameters
+    ----------
+    csv_path : str
+        path to a csv with listings data, whose sentences make up the descriptions
+
+    question : str
+        a yes or no question about each listing
+
+    train : int
+        amount of listings whose answers the cascade is trained on
+
+    test : int
+        amount of new listings the query is run over
+
+    latency : float
+        seconds each request to the fake chatgpt takes
+
+    min_confidence : float
+        threshold of the cascade in the query
+
+    Returns
+    -------
+    dict
+        evaluation (see CascadeClassifier.evaluate), and for the query with and without the cascade: seconds, prompts,
+        answered_locally and matches, with the agreement between the two
+    """
+    data = varied_dataset(csv_path, train + test)
+    bot = bookingai_bot.BookingBot()
+    builder = bot.get_prompt_builder()
+    texts = data['text'][:train]
+    labels = [bookingai_fakes.keyword_answer(builder.build(text, question)[0]) == 'yes' for text in texts]
+
+    cascade = bookingai_cascade.CascadeClassifier(min_confidence)
+    results = {'evaluation': cascade.evaluate(question, list(texts), labels)}
+
+    bot.data = data[train:].reset_index(drop=True)
+    answers = {}
+    with bookingai_fakes.FakeChatServer(latency=latency) as chat:
+        for mode, local in (('gpt', None), ('cascade', cascade)):
+            helper = bookingai_cgpt.GPThelper(tokens_per_minute=10 ** 9, api_base=chat.api_base, use_cache=False,
+                                              metrics=bookingai_metrics.Metrics())
+            query = bookingai_query.ListingQuery(bot, helper, local).ask(question)
+
+            start = time.perf_counter()
+            answers[mode] = query.run()[question]
+            results[mode] = {'seconds': time.perf_counter() - start, 'prompts': query.stats['prompts'],
+                             'answered_locally': query.stats['answered_locally'][question],
+                             'matches': int(answers[mode].sum())}
+
+    results['agreement'] = float((answers['gpt'] == answers['cascade']).mean())
+    return results
+
+
+def chain_dataset(csv_path, size, duplicate_share=0.5, seed=0):
+    """returns a dataset of size listings like varied_dataset, in which duplicate_share of the listings are copies of
+    an earlier listing with other distances in their description, as the listings of a hotel chain in other cities"""
+    data = varied_dataset(csv_path, size, seed)
+    rng = random.Random(seed)
+    texts = list(data['text'])
+    for i in range(1, size):
+        if rng.random() < duplicate_share:
+            texts[i] = re.sub(r'\d+(?:\.\d+)?', lambda m: str(round(rng.uniform(0.1, 20), 1)), texts[rng.randrange(i)])
+    data['text'] = texts
+    return data
+
+
+def dedup_benchmark(csv_path, sizes=(1000, 10000, 50000), question='does this room have a kettle?', listings=500,
+                    latency=0.05, threshold=0.9):
+    """measures grouping near duplicate descriptions (bookingai_dedup) over growing datasets in which half of the
+    listings are chain copies of others, then a ListingQuery over listings of them against a local fake chatgpt, with
+    and without dedup
+
+    Parameters
+    ----------
+    csv_path : str
+        path to a csv with listings data, whose sentences make up the descriptions
+
+    sizes : tuple
+        amounts of listings to group
+
+    question : str
+        a yes or no question about each listing
+
+    listings : int
+        amount of listings the query is run over
+
+    latency : float
+        seconds each request to the fake chatgpt takes
+
+    threshold : float
+        least similarity of near duplicates
+
+    Returns
+    -------
+    dict
+        grouping: size to the seconds it took and the amount of groups, and for the query with and without dedup:
+        seconds, prompts, duplicates_skipped and matches, with the agreement between the two
+    """
+    results = {'grouping': {}}
+    for size in sizes:
+        data = chain_dataset(csv_path, size)
+        start = time.perf_counter()
+        duplicates = bookingai_dedup.NearDuplicates(data['text'], data['name'], threshold)
+        results['grouping'][size] = {'seconds': time.perf_counter() - start,
+                                     'asked': int(duplicates.representatives.nunique())}
+
+    bot = bookingai_bot.BookingBot()
+    bot.data = chain_dataset(csv_path, listings)
+    answers = {}
+    with bookingai_fakes.FakeChatServer(latency=latency) as chat:
+        for mode, dedup in (('all', None), ('dedup', threshold)):
+            helper = bookingai_cgpt.GPThelper(tokens_per_minute=10 ** 9, api_base=chat.api_base, use_cache=False,
+                                              metrics=bookingai_metrics.Metrics())
+            query = bookingai_query.ListingQuery(bot, helper).ask(question).dedup(dedup)
+
+            start = time.perf_counter()
+            answers[mode] = query.run()[question]
+            results[mode] = {'seconds': time.perf_counter() - start, 'prompts': query.stats['prompts'],
+                             'duplicates_skipped': query.stats['duplicates_skipped'][question],
+                             'matches': int(answers[mode].sum())}
+
+    results['agreement'] = float((answers['all'] == answers['dedup']).mean())
+    return results
+
+
+def bulk_benchmark(csv_path, question='does this room have a kettle?', listings=2000, requests_per_minute=3500,
+                   latency=0.05, batch_delay=1.0, poll_seconds=0.5):
+    """measures asking about listings with a request each (query_list, under a requests per minute limit) against an
+    offline bulk job (query_bulk), both against a local fake chatgpt with a batch api, and collecting a bulk job again
+    from its state file
+
+    Parameters
+    ----------
+    csv_path : str
+        path to a csv with listings data, repeated to make listings prompts
+
+    question : str
+        a yes or no question about each listing
+
+    listings : int
+        amount of listings to ask about
+
+    requests_per_minute : int
+        limit of the requests sent one by one, openai's default for the account
+
+    latency : float
+        seconds each request takes
+
+    batch_delay : float
+        seconds a batch waits before it runs
+
+    poll_seconds : float
+        seconds between checks of a batch
+
+    Returns
+    -------
+    dict
+        mode ('online' or 'bulk') to the seconds, http requests made to the server and estimated cost, with the
+        agreement between the two and the http requests of collecting the bulk job again
+    """
+    bot = bookingai_bot.BookingBot()
+    bot.data = synthetic_dataset(csv_path, listings)
+    prompts = bot.create_prompts(question)
+    results = {}
+    answers = {}
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            bookingai_fakes.FakeBatchServer(latency=latency, batch_delay=batch_delay) as server:
+        for mode in ('online', 'bulk', 'collect'):
+            metrics = bookingai_metrics.Metrics()
+            helper = bookingai_cgpt.GPThelper(requests_per_minute=requests_per_minute, tokens_per_minute=10 ** 9,
+                                              api_base=server.api_base, use_cache=False, metrics=metrics)
+            requests_before = server.request_count
+
+            start = time.perf_counter()
+            if mode == 'online':
+                helper.query_list(prompts)
+            else:
+                helper.query_bulk(prompts, os.path.join(tmp, 'job.jsonl'), poll_seconds)
+            seconds = time.perf_counter() - start
+
+            answers[mode] = helper.answers
+            results[mode] = {'seconds': seconds, 'http_requests': server.request_count - requests_before,
+                             'cost': metrics.total('gpt_cost_dollars_total')}
+
+    results['agreement'] = statistics.mean(a == b for a, b in zip(answers['online'], answers['bulk']))
+    results['collect']['agreement'] = statistics.mean(a == b for a, b in zip(answers['bulk'], answers['collect']))
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='bookingai benchmarks')
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+
+    batch_parser = commands.add_parser('batch', help='compare the batched prompt mode with the per listing mode')
+    batch_parser.add_argument('--csv', default='inputs_outputs/results.csv')
+    batch_parser.add_argument('--question', default='does this room have a kettle?')
+    batch_parser.add_argument('--batch-size', type=int, default=5)
+    batch_parser.add_argument('--fake', action='store_true', help='use a local fake chatgpt instead of openai')
+    batch_parser.add_argument('--fake-latency', type=float, default=0.5)
+
+    startup_parser = commands.add_parser('startup', help='measure the startup of a csv only session')
+    startup_parser.add_argument('--csv', default='inputs_outputs/results.csv')
+    startup_parser.add_argument('--runs', type=int, default=5)
+
+    dataset_parser = commands.add_parser('dataset', help='measure loading csv, parquet and arrow datasets')
+    dataset_parser.add_argument('--csv', default='inputs_outputs/results.csv')
+    dataset_parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+
+    e2e_parser = commands.add_parser('e2e', help='end to end scenarios against local fake booking.com and chatgpt')
+    e2e_parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    e2e_parser.add_argument('--question', default='does this room have a kettle?')
+    e2e_parser.add_argument('--chat-latency', type=float, default=0.05)
+    e2e_parser.add_argument('--page-latency', type=float, default=0.02)
+    e2e_parser.add_argument('--requests-per-minute', type=int, default=0)
+    e2e_parser.add_argument('--rate-limit-every', type=int, default=0)
+    e2e_parser.add_argument('--max-workers', type=int, default=8)
+    e2e_parser.add_argument('--tokens-per-minute', type=int, default=1000000)
+
+    stream_parser = commands.add_parser('stream', help='measure asking about a whole dataset against a chunk at a time')
+    stream_parser.add_argument('--csv', default='inputs_outputs/results.csv')
+    stream_parser.add_argument('--sizes', type=int, nargs='+', default=[2000, 10000])
+    stream_parser.add_argument('--chunksize', type=int, default=500)
+    stream_parser.add_argument('--question', default='does this room have a kettle?')
+
+    answers_parser = commands.add_parser('answers', help='compare free text answers with single token answers')
+    answers_parser.add_argument('--csv', default='inputs_outputs/results.csv')
+    answers_parser.add_argument('--question', default='does this room have a kettle?')
+    answers_parser.add_argument('--listings', type=int, default=50)
+    answers_parser.add_argument('--latency', type=float, default=0.2)
+    answers_parser.add_argument('--token-latency', type=float, default=0.02)
+
+    endpoints_parser = commands.add_parser('endpoints', help='measure throughput spread over several endpoints')
+    endpoints_parser.add_argument('--csv', default='inputs_outputs/results.csv')
+    endpoints_parser.add_argument('--listings', type=int, default=200)
+    endpoints_parser.add_argument('--counts', type=int, nargs='+', default=[1, 2, 4])
+    endpoints_parser.add_argument('--latency', type=float, default=0.1)
+    endpoints_parser.add_argument('--max-concurrency', type=int, default=4)
+
+    browser_parser = commands.add_parser('browser', help='measure page loads and memory of the browser profiles')
+    browser_parser.add_argument('--profiles', nargs='+', default=['headless', 'fast'],
+                                choices=['default', 'headless', 'fast'])
+    browser_parser.add_argument('--pages', type=int, default=10)
+    browser_parser.add_argument('--assets', type=int, default=20)
+    browser_parser.add_argument('--page-latency', type=float, default=0.05)
+    browser_parser.add_argument('--live', action='store_true', help='load the real booking.com pages')
+    browser_parser.add_argument('--csv', default='inputs_outputs/results.csv')
+
+    cascade_parser = commands.add_parser('cascade', help='measure a local model answering before chatgpt')
+    cascade_parser.add_argument('--csv', default='inputs_outputs/results.csv')
+    cascade_parser.add_argument('--question', default='does this room have a kettle?')
+    cascade_parser.add_argument('--train', type=int, default=1000)
+    cascade_parser.add_argument('--test', type=int, default=500)
+    cascade_parser.add_argument('--min-confidence', type=float, default=0.9)
+
+    dedup_parser = commands.add_parser('dedup', help='measure asking once about near duplicate descriptions')
+    dedup_parser.add_argument('--csv', default='inputs_outputs/results.csv')
+    dedup_parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    dedup_parser.add_argument('--question', default='does this room have a kettle?')
+    dedup_parser.add_argument('--listings', type=int, default=500)
+    dedup_parser.add_argument('--threshold', type=float, default=0.9)
+
+    bulk_parser = commands.add_parser('bulk', help='compare a request each with an offline bulk job')
+    bulk_parser.add_argument('--csv', default='inputs_outputs/results.csv')
+    bulk_parser.add_argument('--question', default='does this room have a kettle?')
+    bulk_parser.add_argument('--listings', type=int, default=2000)
+    bulk_parser.add_argument('--requests-per-minute', type=int, default=3500)
+
+    args = arg_parser.parse_args()
+
+    if args.command == 'batch':
+        if args.fake:
+            with bookingai_fakes.FakeChatServer(latency=args.fake_latency) as server:
+                results = compare_batch_mode(args.csv, args.question, args.batch_size, api_base=server.api_base)
+        else:
+            results = compare_batch_mode(args.csv, args.question, args.batch_size)
+        pprint.pprint(results)
+    elif args.command == 'startup':
+        pprint.pprint(startup_benchmark(args.csv, args.runs))
+    elif args.command == 'dataset':
+        pprint.pprint(dataset_benchmark(args.csv, args.sizes))
+    elif args.command == 'e2e':
+        pprint.pprint(end_to_end_benchmark(args.sizes, question=args.question, chat_latency=args.chat_latency,
+                                           page_latency=args.page_latency,
+                                           requests_per_minute=args.requests_per_minute,
+                                           rate_limit_every=args.rate_limit_every, max_workers=args.max_workers,
+                                           tokens_per_minute=args.tokens_per_minute))
+    elif args.command == 'stream':
+        pprint.pprint(stream_benchmark(args.csv, args.sizes, args.chunksize, args.question))
+    elif args.command == 'answers':
+        pprint.pprint(answer_mode_benchmark(args.csv, args.question, args.listings, args.latency, args.token_latency))
+    elif args.command == 'endpoints':
+        pprint.pprint(endpoints_benchmark(args.csv, listings=args.listings, counts=args.counts, latency=args.latency,
+                                          max_concurrency=args.max_concurrency))
+    elif args.command == 'browser':
+        pprint.pprint(browser_benchmark(args.profiles, args.pages, args.assets, args.page_latency, args.live, args.csv))
+    elif args.command == 'cascade':
+        pprint.pprint(cascade_benchmark(args.csv, args.question, args.train, args.test,
+                                        min_confidence=args.min_confidence))
+    elif args.command == 'dedup':
+        pprint.pprint(dedup_benchmark(args.csv, args.sizes, args.question, args.listings, threshold=args.threshold))
+    elif args.command == 'bulk':
+        pprint.pprint(bulk_benchmark(args.csv, args.question, args.listings, args.requests_per_minute))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,38 +1,81 @@
+import bookingai_browser
+import bookingai_data
+import bookingai_dedup
+import bookingai_index
+import bookingai_metrics
+import bookingai_prompts
+import bookingai_store
 import bookingai_utils
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.keys import Keys
+from concurrent.futures import ThreadPoolExecutor
+import json
 import pandas as pd
 import time
+import urllib.parse
 
 
-class BookingBot(webdriver.Chrome):
+class BookingBot:
     """
     a class used to surf through booking.com, search accommodations by given parameters, scrape and save the results
-    inherits from selenium.webdriver.Chrome to enable use of builtin scraping funcs
+    drives a selenium.webdriver.Chrome browser, which is only started (and selenium only imported) the first time it is
+    needed, so a bot that only loads data from a csv never launches chrome
 
     Parameters
     ----------
     imp_wait_time : int
-        time for implicit wait by selenium
+        max time to wait for each step of the search (the bot waits for conditions, not fixed times)
 
     data_csv_path : str
-        if not None, loads data from a previously created csv and skips need to scrape again
+        if not None, loads data from a previously created dataset (csv, parquet or arrow) and skips need to scrape again
 
     stats_dict : dict
         if not None, loads search params from an existing dict instead of from a txt file, skips need to parse txt
 
+    max_prompt_tokens : int
+        max amount of tokens in a single prompt to chatgpt
+
+    prompt_overflow : str
+        what to do with descriptions that go over max_prompt_tokens, 'chunk' or 'truncate' (see PromptBuilder)
+
+    browser : selenium.webdriver.Chrome
+        if not None, an already running browser to use (e.g. to reuse one browser for several bots)
+
+    browser_profile : str
+        profile the browser is started with, 'default', 'headless' or 'fast' (headless, without images, fonts, media
+        and trackers), see bookingai_browser.chrome_options
+
+    user_data_dir : str
+        if not None, a folder the browser keeps its profile (cookies, cache) in between runs
+
+    store_path : str
+        if not None, path to a listing store (sqlite), so scraping the same destination again only fetches the pages of
+        new or changed listings
+
     Attributes
     ----------
     TXT_PATH : str
         path to txt file with the phrasing of the chatgpt prompt
 
+    BATCH_TXT_PATH : str
+        path to txt file with the phrasing of a chatgpt prompt about several listings at once
+
+    CARDS_JS : str
+        script that collects the listing cards of a search page and returns them as a json string
+
     BASE_URL : str
         booking homepage url
 
     imp_time : int
-        implicit time as described above
+        max wait time as described above
+
+    browser : selenium.webdriver.Chrome
+        the browser, started on first use with browser_profile. the bot is no longer a webdriver.Chrome itself, but
+        webdriver methods and attributes it does not have are forwarded to the browser (e.g. bot.get(url) still works)
+
+    browser_profile : str
+        profile the browser is started with, see bookingai_browser.PROFILES
+
+    waiter : bookingai_wait.StepWaiter
+        waits for conditions in the page and records how long each step of the search waited, made on first use
 
     data : dataframe
         results of search, organized as a dataframe with the columns: name,price,score,link,text
@@ -40,14 +83,47 @@ class BookingBot(webdriver.Chrome):
         name - name of accommodation
         price - price as seen in the site
         score - score by reviews
-        link - url leading to the accommodation page
+        link - url leading to the accommodation page, as scraped (with its dates and search parameters)
         text - str of the description of the accommodations in its page
 
+        when loaded from a columnar dataset (parquet or arrow), the text column is left out and read from the file
+        only when needed (see get_texts)
+
+    data_path : str
+        path of the columnar dataset the data was loaded from, None otherwise
+
+    dataset_path : str
+        path of the dataset (of any format) the data was last loaded from or saved to, None if it was not
+
     stats_dict : dict
         dictionary with search parameters for booking.com
 
+    prompt_builder : bookingai_prompts.PromptBuilder
+        creates the prompts from the format in TXT_PATH, made on first use
+
+    detail_fetcher : bookingai_fetch.DetailFetcher
+        fetches listing pages over http instead of with the browser, made on first use
+
+    listing_store : bookingai_store.ListingStore
+        the listing store, None if store_path is None
+
+    text_index : bookingai_index.TextIndex
+        inverted index over the descriptions in data, made on first use and dropped whenever data changes
+
+    duplicates : bookingai_dedup.NearDuplicates
+        groups of listings with near duplicate descriptions, made on first use and dropped whenever data changes
+
+    metrics : bookingai_metrics.Metrics
+        registry the time of each stage (page loads, waits, detail fetches) is reported to
+
     Methods
     -------
+    has_browser()
+        returns True if the browser was already started
+
+    quit()
+        closes the browser if it was started, it is started again if needed later
+
     go_to_home_page()
         opens up a Chrome window and goes to BASE_URL (booking homepage)
         closes a popup window that tends to appear
@@ -68,67 +144,224 @@ class BookingBot(webdriver.Chrome):
         star choice (e.g. 4)
         iterates over the dict and clicks all the star buttons of stars equal or above the choice (e.g. 4, 5)
 
-    save_search_data(amount=10, save_csv=False, csv_path=None)
+    save_search_data(amount=10, csv_path=None, fetch_with_browser=False, extract_with_js=True)
         saves the first "amount" entries from the search results into the attribute data (dataframe)
         can save an external csv file of the data if needed
 
+    scrape_cards(amount=10)
+        reads name, price, score and link of all listing cards in the search page with a single script
+
+    parse_search_page(page, base_url)
+        static method
+        reads the listing cards out of the html of a search results page, without a browser
+
+    parse_cards(cards)
+        static method
+        turns the price and score columns of scraped cards into numbers
+
+    iter_search_data(amount=10)
+        generator, yields listings one by one as soon as they are scraped, going through several result pages if needed
+
+    go_to_next_results_page()
+        starts loading the next page of search results
+
+    describe_cards(cards, fetch_with_browser=False)
+        returns the descriptions of scraped cards, taken from the listing store or fetched
+
+    fetch_descriptions(links)
+        returns the descriptions of listing pages, fetched concurrently over http
+
+    fetch_description_with_browser(link)
+        opens a listing page in the browser and returns its description
+
     load_data_from_csv(csv_path)
         loads a dataframe from an external csv file and populate the attribute data
 
+    load_data(path)
+        loads a dataframe from a csv, parquet or arrow file, without the descriptions if the file is columnar
+
+    save_data(path)
+        saves the data attribute as a csv, parquet or arrow file, by the extension of path
+
+    get_texts()
+        returns the descriptions of the listings, reading them from the dataset file if they were not loaded
+
+    summary()
+        returns the data without the descriptions
+
+    get_text_index()
+        returns the inverted index over the descriptions, building it the first time
+
+    get_duplicates(threshold=0.9)
+        returns the groups of listings with near duplicate descriptions, building them the first time
+
+    rank_listings(question)
+        returns the bm25 relevance of each listing's description to a question
+
     create_prompt(description, question)
         takes in a room/accommodation description and a yes or no question, and returns a prompt around them
         to send to chatgpt
 
     create_prompts(self, question)
         takes in a question about an accommodation, iterates over the data attribute and creates a list of prompts using
-        room descriptions and that question
+        room descriptions and that question, descriptions too long for a single prompt get a list of prompts
+
+    estimate_prompts(question)
+        returns the amount of prompts, tokens and the estimated cost of asking a question about all listings
+
+    create_batched_prompts(question, batch_size=5)
+        like create_prompts, but packs batch_size descriptions into each prompt and asks for a json array of answers
+    """
+
+    CARDS_JS = """
+        const offset = arguments[1] || 0;
+        const cards = Array.from(document.querySelectorAll("div[data-testid='property-card']"))
+            .slice(offset, offset + arguments[0]);
+        const text = (card, selector) => {
+            const element = card.querySelector(selector);
+            return element ? element.innerText : null;
+        };
+        return JSON.stringify(cards.map(card => {
+            const link = card.querySelector("a[data-testid='title-link']");
+            return {
+                name: link ? link.innerText.split('\\n')[0].trim() : null,
+                link: link ? link.href : null,
+                price: text(card, "span[data-testid='price-and-discounted-price']"),
+                score: text(card, "div[class='a3b8729ab1 d86cee9b25']"),
+            };
+        }));
     """
 
-    def __init__(self, imp_wait_time=10, data_csv_path=None, stats_dict=None):
+    def __init__(self, imp_wait_time=10, data_csv_path=None, stats_dict=None, max_prompt_tokens=3000,
+                 prompt_overflow='chunk', browser=None, store_path=None, metrics=None, browser_profile='default',
+                 user_data_dir=None):
         """
         Parameters
         ----------
         imp_wait_time : int
-            time for implicit wait by selenium
+            max time to wait for each step of the search
 
         data_csv_path : str
-            if not None, loads data from a previously created csv and skips need to scrape again
+            if not None, loads data from a previously created dataset (csv, parquet or arrow)
 
         stats_dict : dict
             if not None, loads search params from an existing dict instead of from a txt file, skips need to parse txt
+
+        max_prompt_tokens : int
+            max amount of tokens in a single prompt to chatgpt
+
+        prompt_overflow : str
+            what to do with descriptions that go over max_prompt_tokens, 'chunk' or 'truncate'
+
+        browser : selenium.webdriver.Chrome
+            if not None, an already running browser to use instead of starting a new one
+
+        browser_profile : str
+            profile the browser is started with, 'default', 'headless' or 'fast'
+
+        user_data_dir : str
+            if not None, a folder the browser keeps its profile in between runs
+
+        store_path : str
+            if not None, path to a listing store (sqlite) to reuse descriptions of unchanged listings from
+
+        metrics : bookingai_metrics.Metrics
+            registry to report the time of each stage to, the shared bookingai_metrics.METRICS if None
         """
 
         self.TXT_PATH = r'prompt_format.txt'
+        self.BATCH_TXT_PATH = r'prompt_format_batch.txt'
         self.BASE_URL = r"https://www.booking.com"
         self.imp_time = imp_wait_time
+        self.metrics = metrics if metrics is not None else bookingai_metrics.METRICS
+
+        self.max_prompt_tokens = max_prompt_tokens
+        self.prompt_overflow = prompt_overflow
+        self.prompt_builder = None
+        self.detail_fetcher = None
+
+        self.listing_store = None
+        if store_path is not None:
+            self.listing_store = bookingai_store.ListingStore(store_path)
 
         self.data = None
+        self.data_path = None
+        self.dataset_path = None
+        self.text_index = None
+        self.duplicates = None
         if data_csv_path is not None:
-            self.load_data_from_csv(data_csv_path)
+            self.load_data(data_csv_path)
 
         self.stats_dict = {}
         if stats_dict is not None:
             self.stats_dict = stats_dict
 
-        super().__init__()
-
+        if browser_profile not in bookingai_browser.PROFILES:
+            raise ValueError(f'browser_profile must be one of {", ".join(bookingai_browser.PROFILES)}')
+        self.browser_profile = browser_profile
+        self.user_data_dir = user_data_dir
+
+        self._browser = browser
+        self._waiter = None
+
+    @property
+    def browser(self):
+        """the chrome browser driven by the bot, started the first time it is used"""
+        if self._browser is None:
+            self._browser = bookingai_browser.start_browser(self.browser_profile, self.user_data_dir)
+        return self._browser
+
+    @property
+    def waiter(self):
+        """the step waiter of the browser, made the first time it is used"""
+        if self._waiter is None:
+            import bookingai_wait
+            self._waiter = bookingai_wait.StepWaiter(self.browser, default_timeout=self.imp_time, metrics=self.metrics)
+        return self._waiter
+
+    def __getattr__(self, name):
+        """forwards the attributes the bot does not have to the browser (e.g. bot.get(url), bot.find_elements(...)),
+        so code written when the bot was itself a webdriver.Chrome keeps working. starts the browser if needed"""
+        # private names are never forwarded, they are looked up before __init__ has set them (e.g. by copy and pickle)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.browser, name)
+
+    def has_browser(self):
+        """returns True if the browser was already started"""
+        return self._browser is not None
+
+    def quit(self):
+        """closes the browser if it was started, a later step that needs it starts a new one"""
+        if self._browser is not None:
+            self._browser.quit()
+        self._browser = None
+        self._waiter = None
+        self.detail_fetcher = None
+
+    @bookingai_metrics.timed('home_page')
     def go_to_home_page(self):
         """goes to booking home page and closes a common popup"""
-
-        self.get(self.BASE_URL)
-        self.implicitly_wait(self.imp_time)
-        self.maximize_window()
-
-        # get rid of popup at homepage
-        try:
-            x_button = self.find_element(By.XPATH, "//button[@aria-label='Dismiss sign-in info.']")
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.common.action_chains import ActionChains
+        from selenium.webdriver.common.keys import Keys
+
+        self.browser.get(self.BASE_URL)
+        if self.browser_profile == 'default':
+            # headless profiles already start with a full size window
+            self.browser.maximize_window()
+        self.waiter.page_loaded('home page')
+
+        # get rid of popup at homepage, it does not always show up
+        x_button = self.waiter.clickable('sign-in popup', (By.XPATH, "//button[@aria-label='Dismiss sign-in info.']"),
+                                         timeout=2, required=False)
+        if x_button is not None:
             x_button.click()
-        except:
-            pass
 
-        actions = ActionChains(self)
+        actions = ActionChains(self.browser)
         actions.send_keys(Keys.END).perform()
 
+    @bookingai_metrics.timed('change_currency')
     def change_currency(self, currency):
         """changes the currency displayed on the booking page
 
@@ -137,12 +370,16 @@ class BookingBot(webdriver.Chrome):
         currency : str
           the wanted currency, needs to be called as it would show on booking's html
         """
-        currency_button = self.find_element(By.XPATH, "//button[@data-testid='header-currency-picker-trigger']")
+        from selenium.webdriver.common.by import By
+
+        currency_button = self.waiter.clickable('currency picker',
+                                                (By.XPATH, "//button[@data-testid='header-currency-picker-trigger']"))
         currency_button.click()
 
-        my_cur_button = self.find_element(By.XPATH, f"//span[text()='{currency}']").find_element(By.XPATH, "../../..")
+        my_cur_button = self.waiter.clickable('currency', (By.XPATH, f"//span[text()='{currency}']/../../.."))
         my_cur_button.click()
 
+    @bookingai_metrics.timed('search')
     def search_vacation(self):
         """searches for a vacation by a given set of parameters from the attribute stats_data
         stops on search page after filters have been applied
@@ -154,9 +391,9 @@ class BookingBot(webdriver.Chrome):
         adults - number of adults to book, no support of children yet
         min_stars - number of stars to show listings from (e.g. 3 would min showing listings with 3,4,5), min is 2
         """
+        from selenium.webdriver.common.by import By
 
         self.go_to_home_page()
-        time.sleep(2)
 
         # get params from stats_dict
         destination = self.stats_dict['destination']
@@ -166,64 +403,65 @@ class BookingBot(webdriver.Chrome):
         min_stars = int(self.stats_dict['min_stars'])
 
         # write destination in search bar
-        search_bar = self.find_element(By.XPATH, "//input[@id=':re:']")
+        search_bar = self.waiter.clickable('search bar', (By.XPATH, "//input[@id=':re:']"))
         search_bar.clear()
         search_bar.send_keys(destination)
 
-        # click the first result
-        time.sleep(1)
-        options = self.find_element(By.XPATH, "//ul[@data-testid='autocomplete-results-options']")
-        choice = options.find_element(By.CLASS_NAME, "be14df8bfb")
+        # click the first result, once the autocomplete options show up
+        choice = self.waiter.clickable('autocomplete', (By.XPATH, "//ul[@data-testid='autocomplete-results-options']"
+                                                                  "//*[contains(@class, 'be14df8bfb')]"))
         choice.click()
 
         # click dates
-        start_cell = self.find_element(By.XPATH, f"//span[@data-date='{starting_date}']").find_element(By.XPATH, '..')
+        start_cell = self.waiter.clickable('start date', (By.XPATH, f"//span[@data-date='{starting_date}']/.."))
         start_cell.click()
 
-        end_cell = self.find_element(By.XPATH, f"//span[@data-date='{ending_date}']").find_element(By.XPATH, '..')
+        end_cell = self.waiter.clickable('end date', (By.XPATH, f"//span[@data-date='{ending_date}']/.."))
         end_cell.click()
 
         # input number of adults
-        occupancy_button = self.find_element(By.XPATH, "//button[@data-testid='occupancy-config']")
+        occupancy_button = self.waiter.clickable('occupancy', (By.XPATH, "//button[@data-testid='occupancy-config']"))
         occupancy_button.click()
 
-        current_adults = self.find_element(By.XPATH, "//span[@class='d723d73d5f']")
+        current_adults = self.waiter.visible('adults', (By.XPATH, "//span[@class='d723d73d5f']"))
         current_adults = int(current_adults.get_attribute('innerHTML'))
 
         clicks = adults - current_adults
 
         if clicks > 0:
-            adult_button = self.find_element(By.XPATH, "//button[@class='a83ed08757 c21c56c305 f38b6daa18 d691166b09 "
-                                                       "ab98298258 deab83296e bb803d8689 f4d78af12a']")
+            adult_button = self.browser.find_element(By.XPATH, "//button[@class='a83ed08757 c21c56c305 f38b6daa18 "
+                                                               "d691166b09 ab98298258 deab83296e bb803d8689 "
+                                                               "f4d78af12a']")
         else:
-            adult_button = self.find_element(By.XPATH, "//button[@class='a83ed08757 c21c56c305 f38b6daa18 d691166b09 "
-                                                       "ab98298258 deab83296e bb803d8689 e91c91fa93']")
+            adult_button = self.browser.find_element(By.XPATH, "//button[@class='a83ed08757 c21c56c305 f38b6daa18 "
+                                                               "d691166b09 ab98298258 deab83296e bb803d8689 "
+                                                               "e91c91fa93']")
 
         clicks = abs(clicks)
         for i in range(clicks):
             adult_button.click()
 
         # click the search button
-        search_button = self.find_element(By.XPATH, "//button[@class='a83ed08757 c21c56c305 a4c1805887 f671049264 "
-                                                    "d2529514af c082d89982 cceeb8986b']")
-        time.sleep(0.5)
+        search_button = self.waiter.clickable('search button',
+                                              (By.XPATH, "//button[@class='a83ed08757 c21c56c305 a4c1805887 f671049264 "
+                                                         "d2529514af c082d89982 cceeb8986b']"))
         search_button.click()
 
-        # find and click on all stars above the given int
-        time.sleep(3)
+        # find and click on all stars above the given int, once the results and their filters are shown
+        self.waiter.present('search results', (By.XPATH, "//div[@data-testid='property-card']"))
         stars = {}
 
         for i in range(2, 6):
-            star = self.find_element(By.XPATH, f"//div[@data-filters-item='class:class={i}']")
+            star = self.waiter.present(f'{i} stars filter', (By.XPATH, f"//div[@data-filters-item='class:class={i}']"))
 
             if 'stars' in star.text:
                 star_button = star.find_element(By.XPATH, ".//span[@class='fcd9eec8fb b27b51da7f bf9a32efa5']")
                 stars[i] = star_button
 
-        self.click_stars_above(stars, min_stars)
+        self.click_stars_above(stars, min_stars, self.waiter)
 
     @staticmethod
-    def click_stars_above(star_dict, star_choice):
+    def click_stars_above(star_dict, star_choice, waiter=None):
         """clicks on all star filter buttons given a min star value
 
         Parameters
@@ -234,13 +472,27 @@ class BookingBot(webdriver.Chrome):
 
         star_choice : int
             a choice of star to filter by itself and above (e.g. choosing 3 would filter by 3,4,5)
+
+        waiter : bookingai_wait.StepWaiter
+            if not None, waits after each click until the results list was refreshed, instead of a fixed second
         """
+        from selenium.webdriver.common.by import By
+
         for star_rating, star_button in star_dict.items():
             if star_rating >= star_choice:
+                if waiter is None:
+                    star_button.click()
+                    time.sleep(1)
+                    continue
+
+                first_card = waiter.driver.find_element(By.XPATH, "//div[@data-testid='property-card']")
                 star_button.click()
-                time.sleep(1)
+                # the results are not always rendered again (e.g. the filter did not change them)
+                waiter.refreshed(f'{star_rating} stars results', first_card, timeout=5, required=False)
+                waiter.present(f'{star_rating} stars results', (By.XPATH, "//div[@data-testid='property-card']"))
 
-    def save_search_data(self, amount=10, csv_path=None):
+    @bookingai_metrics.timed('save_search_data')
+    def save_search_data(self, amount=10, csv_path=None, fetch_with_browser=False, extract_with_js=True):
         """when the search page is open, scrapes all the listings and saves them into a dataframe in the data
         attribute
         if save_csv and csv_path are not None, saves the results as an external csv for later use
@@ -251,48 +503,345 @@ class BookingBot(webdriver.Chrome):
             amount of listings to save in the dataframe (by order shown int he page)
 
         csv_path : str
-            if not None, saves external results as a csv
+            if not None, saves external results as a csv (or parquet or arrow, by the extension, see save_data)
+
+        fetch_with_browser : bool
+            if True, opens each listing page in the browser to get its description, one after the other, instead of
+            fetching them concurrently over http
+
+        extract_with_js : bool
+            if True, reads all the listing cards with a single script run in the page, instead of several webdriver
+            calls for each card
+        """
+
+        # getting all listings in page
+        if extract_with_js:
+            cards = self.scrape_cards(amount)
+        else:
+            cards = self.scrape_cards_with_webdriver(amount)
+        cards = self.parse_cards(cards)
+
+        # going into each listing's link to scrape the full description
+        cards['text'] = self.describe_cards(cards, fetch_with_browser)
+
+        self.data = cards[bookingai_data.DATA_COLUMNS]
+        self.data_path = None
+        self.dataset_path = None
+        self.text_index = None
+        self.duplicates = None
+
+        if csv_path is not None:
+            self.save_data(csv_path)
+
+    @bookingai_metrics.timed('scrape_cards')
+    def scrape_cards(self, amount=10, offset=0):
+        """reads the listing cards in the search page with a single script run in the browser (one round trip to
+        the driver for the whole page, instead of several for each card)
+
+        Parameters
+        ----------
+        amount : int
+            amount of cards to read (by order shown in the page)
+
+        offset : int
+            amount of cards to skip from the top of the page
+
+        Returns
+        -------
+        dataframe
+            the cards as they show in the page, with str columns name, price, score, link (see parse_cards)
+        """
+        payload = self.browser.execute_script(self.CARDS_JS, amount, offset)
+        return pd.DataFrame(json.loads(payload), columns=['name', 'price', 'score', 'link'])
+
+    def scrape_cards_with_webdriver(self, amount=10):
+        """like scrape_cards, but reads each card with separate webdriver calls
+
+        Parameters
+        ----------
+        amount : int
+            amount of cards to read (by order shown in the page)
+
+        Returns
+        -------
+        dataframe
+            the cards as they show in the page, with str columns name, price, score, link (see parse_cards)
         """
+        from selenium.webdriver.common.by import By
 
         # creating dict to populate and convert to dataframe
-        d = {'name': [], 'price': [], 'score': [], 'link': [], 'text': []}
+        d = {'name': [], 'price': [], 'score': [], 'link': []}
 
-        # getting all listings in page
-        properties = self.find_elements(By.XPATH, "//div[@data-testid='property-card']")[:amount]
+        properties = self.browser.find_elements(By.XPATH, "//div[@data-testid='property-card']")[:amount]
 
         for prop in properties:
             # scraping data from each listing
             title_and_link = prop.find_element(By.XPATH, './/a[@data-testid="title-link"]')
-            title = title_and_link.text.splitlines()[0].strip()
-            link = title_and_link.get_attribute('href')
+            d['name'].append(title_and_link.text.splitlines()[0].strip())
+            d['link'].append(title_and_link.get_attribute('href'))
+            d['price'].append(prop.find_element(By.XPATH, ".//span[@data-testid='price-and-discounted-price']").text)
+            d['score'].append(prop.find_element(By.XPATH, ".//div[@class='a3b8729ab1 d86cee9b25']").text)
 
-            price = prop.find_element(By.XPATH, ".//span[@data-testid='price-and-discounted-price']").text
-            new_price = ''
-            for c in price:
-                if c.isdigit():
-                    new_price += c
-            price = int(new_price)
+        return pd.DataFrame(d)
 
-            score = float(prop.find_element(By.XPATH, ".//div[@class='a3b8729ab1 d86cee9b25']").text)
+    @staticmethod
+    def parse_search_page(page, base_url):
+        """reads the listing cards out of the html of a search results page, without a browser (e.g. a saved page, or
+        one fetched over http), with the same selectors as scrape_cards
 
-            d['name'].append(title)
-            d['price'].append(price)
-            d['score'].append(score)
-            d['link'].append(link)
+        Parameters
+        ----------
+        page : str or bytes
+            html of a search results page
 
-        # going into each listing's link to scrape the full description
-        for link in d['link']:
-            self.get(link)
-            time.sleep(1)
+        base_url : str
+            url the page came from, relative links are made absolute with it
 
-            p_container = self.find_element(By.XPATH, "//div[@class='hp-description k2-hp_main_desc--collapsed']")
-            p = p_container.find_element(By.XPATH, ".//p[@class='a53cbfa6de b3efd73f69']").text
-            d['text'].append(p)
+        Returns
+        -------
+        dataframe
+            the cards as they show in the page, with str columns name, price, score, link (see parse_cards)
+        """
+        import lxml.html
 
-        self.data = pd.DataFrame(d)
+        tree = lxml.html.fromstring(page)
+        d = {'name': [], 'price': [], 'score': [], 'link': []}
 
-        if csv_path is not None:
-            self.data.to_csv(csv_path, index=False)
+        def text(card, xpath):
+            elements = card.xpath(xpath)
+            return elements[0].text_content().strip() if elements else None
+
+        for card in tree.xpath("//div[@data-testid='property-card']"):
+            link = card.xpath(".//a[@data-testid='title-link']")
+            # the first piece of text of the link is the name, like the first line of its innerText
+            d['name'].append(next((t.strip() for t in link[0].itertext() if t.strip()), None) if link else None)
+            d['link'].append(urllib.parse.urljoin(base_url, link[0].get('href')) if link else None)
+            d['price'].append(text(card, ".//span[@data-testid='price-and-discounted-price']"))
+            d['score'].append(text(card, ".//div[@class='a3b8729ab1 d86cee9b25']"))
+
+        return pd.DataFrame(d)
+
+    @staticmethod
+    def parse_cards(cards):
+        """turns the price and score of scraped cards into numbers and gives each card a hotel id, for all the cards at
+        once
+        the price keeps only its digits (e.g. "₪ 1,200" becomes 1200), cards with no price or score get a missing value
+        the link is kept as scraped (with its dates and search parameters), and a hotel_id column is added out of it
+        (see canonical_hotel_id), listings are keyed by it
+
+        Parameters
+        ----------
+        cards : dataframe
+            cards as returned by scrape_cards
+
+        Returns
+        -------
+        dataframe
+            the cards with an int price, a float score and a hotel id
+        """
+        cards = cards.copy()
+        price = cards['price'].astype('string').str.replace(r'\D', '', regex=True)
+        cards['price'] = pd.to_numeric(price.replace('', pd.NA), errors='coerce').astype('Int64')
+        cards['score'] = pd.to_numeric(cards['score'], errors='coerce').astype(float)
+
+        links = cards['link'].astype(object)
+        has_link = links.notna()
+        cards['hotel_id'] = links.where(~has_link, links[has_link].map(bookingai_store.canonical_hotel_id))
+        return cards
+
+    @staticmethod
+    def card_records(cards):
+        """returns the rows of a cards dataframe as a list of dicts, with None for missing values"""
+        return cards.astype(object).where(cards.notna(), None).to_dict('records')
+
+    @bookingai_metrics.timed('fetch_detail_with_browser')
+    def fetch_description_with_browser(self, link):
+        """opens a listing page in the browser and returns its description
+
+        Parameters
+        ----------
+        link : str
+            url of the listing page
+        """
+        from selenium.webdriver.common.by import By
+
+        self.browser.get(link)
+
+        p = self.waiter.present('listing description', (By.XPATH, "//div[@class='hp-description "
+                                                                  "k2-hp_main_desc--collapsed']"
+                                                                  "//p[@class='a53cbfa6de b3efd73f69']"))
+        return p.text
+
+    def get_detail_fetcher(self):
+        """returns the detail fetcher, creating it the first time, with the browser's current cookies and user agent"""
+        if self.detail_fetcher is None:
+            import bookingai_fetch
+            self.detail_fetcher = bookingai_fetch.DetailFetcher(metrics=self.metrics)
+            self.detail_fetcher.set_user_agent(self.browser.execute_script('return navigator.userAgent'))
+        self.detail_fetcher.set_cookies(self.browser.get_cookies())
+        return self.detail_fetcher
+
+    def go_to_next_results_page(self):
+        """starts loading more search results, without waiting for them
+        clicks the next page button, or the load more results button if the results are one long list
+
+        Returns
+        -------
+        str
+            'page' if a new page is loading, 'more' if more results are being added to the current page, None if there
+            are no more results
+        """
+        from selenium.webdriver.common.by import By
+
+        next_buttons = self.browser.find_elements(By.XPATH, "//button[@aria-label='Next page']")
+        if next_buttons and next_buttons[0].is_enabled():
+            self.browser.execute_script('arguments[0].click();', next_buttons[0])
+            return 'page'
+
+        more_buttons = self.browser.find_elements(By.XPATH, "//button[.//span[text()='Load more results']]")
+        if more_buttons and more_buttons[0].is_enabled():
+            self.browser.execute_script('arguments[0].click();', more_buttons[0])
+            return 'more'
+
+        return None
+
+    def iter_search_data(self, amount=10):
+        """when the search page is open, yields the listings one by one as soon as their card and description are
+        available, going through as many result pages as needed to reach amount
+        descriptions of a page are fetched concurrently over http, while the browser already loads the next page
+        listings whose description could not be fetched over http are opened in the browser at the end, after the
+        results pages are done with, so they come out last
+
+        Parameters
+        ----------
+        amount : int
+            amount of listings to yield
+
+        Yields
+        ------
+        dict
+            a listing with the keys index (its position in the search results), name, price, score, link, text
+        """
+        from selenium.webdriver.common.by import By
+
+        card_xpath = "//div[@data-testid='property-card']"
+        fetcher = self.get_detail_fetcher()
+        failed = []
+        index = 0
+        offset = 0
+
+        with ThreadPoolExecutor(max_workers=fetcher.max_workers) as executor:
+            while index < amount:
+                cards = self.parse_cards(self.scrape_cards(amount - index, offset))
+                seen = offset + len(cards)
+                cards = cards[cards['link'].notna()]
+                if cards.empty:
+                    break
+
+                # listings already in the store with the same card are not fetched again
+                records = self.card_records(cards)
+                fetch = [True] * len(records)
+                if self.listing_store is not None:
+                    fetch = self.listing_store.needs_fetch(records)
+                    stored = self.listing_store.get_texts([r['hotel_id'] for r, f in zip(records, fetch) if not f])
+
+                futures = [executor.submit(fetcher.fetch, r['link']) if f else stored[r['hotel_id']]
+                           for r, f in zip(records, fetch)]
+
+                # prefetch the next page in the browser while this one's descriptions are fetched and processed
+                first_card = self.browser.find_elements(By.XPATH, card_xpath)[:1]
+                more = None
+                if index + len(cards) < amount:
+                    more = self.go_to_next_results_page()
+
+                for card, future, fetched in zip(records, futures, fetch):
+                    listing = dict(card, index=index, text=future.result() if fetched else future)
+                    index += 1
+
+                    if listing['text'] is None:
+                        failed.append(listing)
+                        continue
+
+                    if fetched and self.listing_store is not None:
+                        self.listing_store.upsert([listing])
+                    yield listing
+
+                if more == 'page':
+                    offset = 0
+                    if first_card:
+                        self.waiter.refreshed('next results page', first_card[0])
+                    self.waiter.present('next results page', (By.XPATH, card_xpath))
+                elif more == 'more':
+                    offset = seen
+                    self.waiter.wait('more results', lambda d: len(d.find_elements(By.XPATH, card_xpath)) > seen)
+                else:
+                    break
+
+        for listing in failed:
+            listing['text'] = self.fetch_description_with_browser(listing['link'])
+            if self.listing_store is not None:
+                self.listing_store.upsert([listing])
+            yield listing
+
+    @bookingai_metrics.timed('describe_cards')
+    def describe_cards(self, cards, fetch_with_browser=False):
+        """returns the descriptions of scraped cards
+        if there is a listing store, descriptions of listings stored with the same card are taken from it, the rest are
+        fetched and then stored
+
+        Parameters
+        ----------
+        cards : dataframe
+            cards as returned by parse_cards
+
+        fetch_with_browser : bool
+            if True, opens each listing page in the browser instead of fetching them concurrently over http
+
+        Returns
+        -------
+        list
+            the descriptions by the order of the cards
+        """
+        records = self.card_records(cards)
+        fetch = [True] * len(records)
+        texts = [None] * len(records)
+
+        if self.listing_store is not None:
+            fetch = self.listing_store.needs_fetch(records)
+            stored = self.listing_store.get_texts([r['hotel_id'] for r, f in zip(records, fetch) if not f])
+            texts = [None if f else stored[r['hotel_id']] for r, f in zip(records, fetch)]
+
+        links = [r['link'] for r, f in zip(records, fetch) if f]
+        if fetch_with_browser:
+            fetched = iter([self.fetch_description_with_browser(link) for link in links])
+        else:
+            fetched = iter(self.fetch_descriptions(links))
+        texts = [next(fetched) if f else text for f, text in zip(fetch, texts)]
+
+        if self.listing_store is not None:
+            self.listing_store.upsert([dict(r, text=text) for r, f, text in zip(records, fetch, texts) if f])
+
+        return texts
+
+    @bookingai_metrics.timed('fetch_details')
+    def fetch_descriptions(self, links):
+        """returns the descriptions of listing pages, fetched concurrently over http with the browser's cookies and
+        user agent, pages that could not be fetched or parsed this way are opened in the browser instead
+
+        Parameters
+        ----------
+        links : list
+            urls of listing pages
+
+        Returns
+        -------
+        list
+            the descriptions by the order of links
+        """
+        texts = self.get_detail_fetcher().fetch_all(links)
+
+        return [text if text is not None else self.fetch_description_with_browser(link)
+                for link, text in zip(links, texts)]
 
     def load_data_from_csv(self, csv_path):
         """loads data from an external csv to the data attribute
@@ -303,6 +852,130 @@ class BookingBot(webdriver.Chrome):
             path to the csv to load the data from
         """
         self.data = pd.read_csv(csv_path)
+        self.data_path = None
+        self.dataset_path = csv_path
+        self.text_index = None
+        self.duplicates = None
+
+    def load_data(self, path):
+        """loads data from an external dataset to the data attribute, by the extension of path
+        a csv is loaded in full, a parquet or arrow file is memory mapped and loaded without the text column, which is
+        only read when prompts are created (see get_texts)
+
+        Parameters
+        ----------
+        path : str
+            path to a csv, parquet (.parquet) or arrow ipc (.arrow, .feather) file
+        """
+        if not bookingai_data.is_columnar(path):
+            self.load_data_from_csv(path)
+            return
+
+        self.data = bookingai_data.load_frame(path, bookingai_data.SUMMARY_COLUMNS)
+        self.data_path = path
+        self.dataset_path = path
+        self.text_index = None
+        self.duplicates = None
+
+    def save_data(self, path):
+        """saves the data attribute as a csv, parquet (.parquet) or arrow ipc (.arrow, .feather) file, by the
+        extension of path. columnar files keep explicit column types
+
+        Parameters
+        ----------
+        path : str
+            path to save the data in
+        """
+        data = self.data
+        if 'text' not in data.columns:
+            data = data.assign(text=self.get_texts())
+        bookingai_data.save_frame(data, path)
+        self.dataset_path = path
+
+    def get_texts(self):
+        """returns the descriptions of the listings in data, reading only the text column of the dataset file if
+        the data was loaded without it. the descriptions are not kept in memory afterwards
+
+        Raises
+        ------
+        ValueError
+            if the data attribute is empty (no data has been scraped or loaded)
+
+        Returns
+        -------
+        series
+            the descriptions by the order of data
+        """
+        if self.data is None:
+            raise ValueError('no data')
+
+        if 'text' in self.data.columns:
+            return self.data['text']
+
+        texts = bookingai_data.load_frame(self.data_path, ['text'])['text']
+        texts.index = self.data.index
+        return texts
+
+    def summary(self):
+        """returns the data attribute without the text column, for display"""
+        columns = [c for c in self.data.columns if c != 'text']
+        return self.data[columns]
+
+    def get_text_index(self):
+        """returns the inverted index over the descriptions in data, building it the first time (one pass over the
+        descriptions, much cheaper than a single request to chatgpt)
+
+        Raises
+        ------
+        ValueError
+            if the data attribute is empty (no data has been scraped or loaded)
+        """
+        if self.text_index is None:
+            self.text_index = bookingai_index.TextIndex(self.get_texts())
+        return self.text_index
+
+    def get_duplicates(self, threshold=0.9):
+        """returns the groups of listings whose descriptions are near duplicates (e.g. listings of a hotel chain),
+        building them the first time or when threshold changes (about linear time in the amount of listings)
+
+        Parameters
+        ----------
+        threshold : float
+            least similarity of two descriptions in the same group, see bookingai_dedup.NearDuplicates
+
+        Raises
+        ------
+        ValueError
+            if the data attribute is empty (no data has been scraped or loaded)
+        """
+        if self.duplicates is None or self.duplicates.threshold != threshold:
+            texts = self.get_texts()
+            names = self.data['name'] if 'name' in self.data.columns else None
+            self.duplicates = bookingai_dedup.NearDuplicates(texts, names, threshold)
+        return self.duplicates
+
+    def rank_listings(self, question):
+        """returns how relevant each listing's description is to a question, by the words of the question (and their
+        synonyms) that show in it. a listing with a score of 0 never mentions what the question is about
+
+        Parameters
+        ----------
+        question : str
+            a yes or no question about a single listing
+
+        Returns
+        -------
+        series
+            bm25 scores aligned with the index of data
+        """
+        return self.get_text_index().scores(question)
+
+    def get_prompt_builder(self):
+        """returns the prompt builder, creating it the first time (reads and compiles the format in TXT_PATH once)"""
+        if self.prompt_builder is None:
+            self.prompt_builder = bookingai_prompts.PromptBuilder(self.TXT_PATH, self.max_prompt_tokens,
+                                                                  self.prompt_overflow)
+        return self.prompt_builder
 
     def create_prompt(self, description, question):
         """returns a prompt containing a room description and a question for chatgpt
@@ -316,13 +989,12 @@ class BookingBot(webdriver.Chrome):
         question : str
             question about the room
         """
-        with open(self.TXT_PATH, 'r') as f:
-            s = f.read()
-
-        return s.replace('@@@@@', description).replace('&&&&&', question)
+        return self.get_prompt_builder().render(description, question)
 
     def create_prompts(self, question):
         """returns a list of prompts containing a room description and the same question, for chatgpt
+        a description that makes the prompt go over max_prompt_tokens is truncated, or split into chunks in which case
+        its item in the list is a list of prompts, one per chunk (see GPThelper.query_list)
 
         Parameters
         ----------
@@ -335,6 +1007,77 @@ class BookingBot(webdriver.Chrome):
             if the data attribute is empty (no data has been scraped or loaded)
         """
         if self.data is not None:
-            return [self.create_prompt(des, question) for des in self.data['text']]
+            builder = self.get_prompt_builder()
+            prompts = []
+
+            for des in self.get_texts():
+                chunks = builder.build(des, question)
+                prompts.append(chunks[0] if len(chunks) == 1 else chunks)
+
+            return prompts
         else:
             raise ValueError('no data')
+
+    def estimate_prompts(self, question):
+        """returns an estimate of the prompts, tokens and cost of asking a question about all the listings in data,
+        without sending anything
+
+        Parameters
+        ----------
+        question : str
+            question about the rooms
+
+        Raises
+        ------
+        ValueError
+            if the data attribute is empty (no data has been scraped or loaded)
+
+        Returns
+        -------
+        dict
+            see PromptBuilder.estimate
+        """
+        if self.data is None:
+            raise ValueError('no data')
+
+        return self.get_prompt_builder().estimate(self.get_texts(), question)
+
+    def create_batched_prompts(self, question, batch_size=5):
+        """returns a list of prompts, each one containing batch_size room descriptions and the same question
+        the descriptions are marked with their index in the data attribute, and chatgpt is asked to answer with a json
+        array of yes or no answers keyed by that index
+        prompt format comes from a txt file, the path of which is saved in the attribute BATCH_TXT_PATH
+
+        Parameters
+        ----------
+        question : str
+            question about the rooms (asked about each room in the batch)
+
+        batch_size : int
+            amount of descriptions in each prompt
+
+        Raises
+        ------
+        ValueError
+            if the data attribute is empty (no data has been scraped or loaded)
+
+        Returns
+        -------
+        list
+            a list of (indices, prompt) tuples, indices being the list of listing indices found in the prompt
+        """
+        if self.data is None:
+            raise ValueError('no data')
+
+        with open(self.BATCH_TXT_PATH, 'r') as f:
+            s = f.read()
+
+        texts = list(self.get_texts())
+        batches = []
+
+        for start in range(0, len(texts), batch_size):
+            indices = list(range(start, min(start + batch_size, len(texts))))
+            descriptions = '\n\n'.join(f'listing {i}:\n{texts[i]}' for i in indices)
+            batches.append((indices, s.replace('@@@@@', descriptions).replace('&&&&&', question)))
+
+        return batches
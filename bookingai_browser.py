@@ -0,0 +1,178 @@
+import json
+import os
+
+
+# browser profiles a bot can start chrome with, see start_browser
+PROFILES = ('default', 'headless', 'fast')
+
+# resources the fast profile never downloads, the bot only reads the text of the pages
+BLOCKED_RESOURCES = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.svg', '.ico', '.bmp',
+                     '.woff', '.woff2', '.ttf', '.otf', '.eot',
+                     '.mp4', '.webm', '.ogg', '.mp3', '.m3u8')
+
+# third party ads, analytics and trackers loaded by booking.com pages
+BLOCKED_DOMAINS = ('googletagmanager.com', 'google-analytics.com', 'googleadservices.com', 'doubleclick.net',
+                   'googlesyndication.com', 'facebook.net', 'connect.facebook.com', 'bat.bing.com', 'hotjar.com',
+                   'criteo.com', 'criteo.net', 'adnxs.com', 'taboola.com', 'outbrain.com', 'tiktok.com',
+                   'analytics.twitter.com', 'ads-twitter.com', 'pinterest.com', 'snapchat.com', 'quantserve.com',
+                   'scorecardresearch.com')
+
+PAGE_TIMING_JS = '''
+const nav = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+let transfer = nav ? nav.transferSize : 0;
+for (const r of resources) transfer += r.transferSize;
+return JSON.stringify({
+    dom_content_loaded: nav ? nav.domContentLoadedEventEnd / 1000 : null,
+    load: nav && nav.loadEventEnd ? nav.loadEventEnd / 1000 : null,
+    resources: resources.length,
+    transfer_kb: transfer / 1024,
+});
+'''
+
+
+def blocked_url_patterns():
+    """returns the url patterns the fast profile blocks, in the wildcard form of chrome's Network.setBlockedURLs
+    resources are matched with or without a query string, domains with any subdomain"""
+    patterns = []
+    for extension in BLOCKED_RESOURCES:
+        patterns.extend([f'*{extension}', f'*{extension}?*'])
+    for domain in BLOCKED_DOMAINS:
+        patterns.append(f'*://*{domain}/*')
+    return patterns
+
+
+def chrome_options(profile='default', user_data_dir=None, no_sandbox=None):
+    """returns the chrome options of a browser profile
+
+    Parameters
+    ----------
+    profile : str
+        'default' - a visible chrome, as it comes
+        'headless' - a headless chrome with a 1920x1080 window, for runs with nobody watching
+        'fast' - headless, without images, fonts, media and third party trackers, and returns from page loads as
+                 soon as the html is parsed (the bot waits for the elements it needs anyway)
+
+    user_data_dir : str
+        if not None, a folder chrome keeps its profile in (cookies, cache), reused by the next browser started with it.
+        only one running chrome can use a folder at a time
+
+    no_sandbox : bool
+        if True, chrome runs without its sandbox, which it refuses to start as root without (e.g. in a docker
+        container). None turns the sandbox off only when running as root
+
+    Raises
+    ------
+    ValueError
+        if profile is not one of the above
+
+    Returns
+    -------
+    selenium.webdriver.ChromeOptions
+        the options
+    """
+    from selenium import webdriver
+
+    if profile not in PROFILES:
+        raise ValueError(f'profile must be one of {", ".join(PROFILES)}')
+
+    options = webdriver.ChromeOptions()
+    if profile != 'default':
+        options.add_argument('--headless=new')
+        options.add_argument('--window-size=1920,1080')
+        options.add_argument('--disable-gpu')
+        options.add_argument('--disable-dev-shm-usage')
+
+    if no_sandbox is None:
+        no_sandbox = hasattr(os, 'geteuid') and os.geteuid() == 0
+    if no_sandbox:
+        options.add_argument('--no-sandbox')
+
+    if profile == 'fast':
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_argument('--disable-extensions')
+        options.add_argument('--mute-audio')
+        options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+            'profile.managed_default_content_settings.media_stream': 2,
+            'profile.default_content_setting_values.notifications': 2,
+        })
+        options.page_load_strategy = 'eager'
+
+    if user_data_dir is not None:
+        options.add_argument(f'--user-data-dir={os.path.abspath(user_data_dir)}')
+
+    return options
+
+
+def start_browser(profile='default', user_data_dir=None, no_sandbox=None):
+    """starts a chrome with a browser profile, see chrome_options
+    in the fast profile the blocked resources (blocked_url_patterns) are also blocked at the network level, so fonts,
+    media and trackers are never requested
+
+    Parameters
+    ----------
+    profile : str
+        'default', 'headless' or 'fast'
+
+    user_data_dir : str
+        if not None, a folder chrome keeps its profile in
+
+    no_sandbox : bool
+        if True, chrome runs without its sandbox, None only when running as root
+
+    Returns
+    -------
+    selenium.webdriver.Chrome
+        the started browser
+    """
+    from selenium import webdriver
+
+    browser = webdriver.Chrome(options=chrome_options(profile, user_data_dir, no_sandbox))
+    if profile == 'fast':
+        browser.execute_cdp_cmd('Network.enable', {})
+        browser.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked_url_patterns()})
+    return browser
+
+
+def page_timing(browser):
+    """returns the navigation timing of the page open in a browser
+
+    Returns
+    -------
+    dict
+        with the keys dom_content_loaded and load (seconds from the start of the navigation, load is None if the page
+        did not finish loading yet), resources (amount of resources loaded) and transfer_kb (kb downloaded, by the
+        page and its resources)
+    """
+    return json.loads(browser.execute_script(PAGE_TIMING_JS))
+
+
+def browser_memory_mb(browser):
+    """returns the memory of a browser in mb: the resident memory of chromedriver and all the chrome processes under
+    it (linux only, pages shared between the processes are counted in each), None where it can not be read"""
+    try:
+        root = browser.service.process.pid
+        children = {}
+        for pid in filter(str.isdigit, os.listdir('/proc')):
+            try:
+                with open(f'/proc/{pid}/stat') as f:
+                    # the name (second field) is in parentheses and may hold spaces
+                    parent = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(parent, []).append(int(pid))
+
+        total = 0
+        pending = [root]
+        while pending:
+            pid = pending.pop()
+            pending.extend(children.get(pid, []))
+            try:
+                with open(f'/proc/{pid}/status') as f:
+                    total += next((int(line.split()[1]) for line in f if line.startswith('VmRSS')), 0)
+            except OSError:
+                continue
+        return total / 1024
+    except (AttributeError, OSError):
+        return None
@@ -0,0 +1,403 @@
+import bookingai_matrix
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import pandas as pd
+import requests
+import sys
+import time
+
+
+DEFAULT_API_BASE = 'https://api.openai.com/v1'
+CHAT_URL = '/v1/chat/completions'
+
+# the batch api takes at most 50,000 requests in a batch, and charges half the price of the same requests sent one
+# by one
+MAX_REQUESTS = 50000
+PRICE_FACTOR = 0.5
+
+# statuses after which a batch does not change anymore
+FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+def state_path(job_path):
+    """returns the path of the state kept next to a job file, e.g. bookingai_bulk.jsonl.state"""
+    return job_path + '.state'
+
+
+def output_path(job_path, part):
+    """returns the path the results of a part of a job are downloaded to, e.g. bookingai_bulk.jsonl.0.out"""
+    return f'{job_path}.{part}.out'
+
+
+class BulkJob:
+    """
+    a set of prompts sent as an offline bulk job through openai's batch api instead of a request each: the requests are
+    written to a jsonl job file, uploaded, submitted as batches, polled until done and their answers read back in the
+    order of the prompts. a batch is not rate limited and costs half the price, but takes up to completion_window
+    the state of the job (the ids of the uploaded files and of the batches, their status and which results were
+    downloaded) is written next to the job file after every step, so a job stopped at any point, or submitted by one
+    run and collected by another the next morning, goes on from where it stopped without submitting anything twice
+
+    Parameters
+    ----------
+    path : str
+        path of the jsonl job file, the state is kept in path + '.state' and the results in path + '.<part>.out'
+
+    gpt_helper : bookingai_cgpt.GPThelper
+        the helper whose model_params the requests are made with, whose first endpoint they are sent to, and whose
+        cache and metrics the answers go to
+
+    max_requests : int
+        max amount of requests in a single batch, more are split into several batches (parts)
+
+    completion_window : str
+        time the batches must be done in, '24h' is the only one openai offers
+
+    poll_seconds : float
+        seconds between checks of the status of the batches
+
+    fallback : bool
+        if True, prompts the batches did not answer (failed requests, or a batch that failed or expired) are sent one
+        by one with gpt_helper.query_answer, otherwise they raise a ValueError
+
+    Attributes
+    ----------
+    state : dict
+        the state of the job, None before prepare: key (of the prompts and model_params), cached (answers found in the
+        cache, by position), parts (start and end positions in the job file, file_id, batch_id, status,
+        request_counts and output, for each part) and collected (True once results returned all the answers, the
+        next job with other prompts may then replace it)
+
+    Methods
+    -------
+    prepare(prompts)
+        writes the job file and the state, or reads the state of the same prompts written before
+
+    submit()
+        uploads and submits the parts that were not submitted yet
+
+    poll()
+        checks the status of the parts and downloads the results of the finished ones, returns True if all are
+
+    wait()
+        submits and polls until all the parts are finished
+
+    results()
+        returns the answer and confidence of each prompt
+
+    run(prompts)
+        prepares, waits and returns the results
+    """
+    def __init__(self, path, gpt_helper, max_requests=MAX_REQUESTS, completion_window='24h', poll_seconds=60,
+                 fallback=True):
+        if max_requests < 1:
+            raise ValueError('max_requests must be at least 1')
+
+        self.path = path
+        self.gpt_helper = gpt_helper
+        self.max_requests = max_requests
+        self.completion_window = completion_window
+        self.poll_seconds = poll_seconds
+        self.fallback = fallback
+        self.state = None
+
+        # the batch api is not in the openai module this project uses, it is called over http with the same key
+        endpoint = gpt_helper.pool.endpoints[0]
+        params = gpt_helper.endpoint_params(endpoint)
+        self.api_base = (params.get('api_base') or DEFAULT_API_BASE).rstrip('/')
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Bearer {params.get("api_key", "")}'
+        if 'organization' in params:
+            self.session.headers['OpenAI-Organization'] = params['organization']
+
+    def save_state(self):
+        """replaces the state file at once, a crash while writing leaves the previous one"""
+        path = state_path(self.path)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def request(self, method, url, **kwargs):
+        """sends a request to the api and returns the response, raising requests.HTTPError for an error status"""
+        response = self.session.request(method, self.api_base + url, timeout=60, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def prepare(self, prompts):
+        """writes a request for each prompt whose answer is not in the cache to the job file, in the batch api's format
+        (custom_id is the position of the prompt), and a new state. if the state of the same prompts with the same
+        model_params is already there, it is used as is, so a job is never written or submitted twice
+
+        Parameters
+        ----------
+        prompts : list
+            the prompts, each one sent alone (see GPThelper.flatten_prompts for chunks)
+
+        Raises
+        ------
+        ValueError
+            if the state next to the job file is of other prompts or model_params, and its answers were not collected
+            (see results)
+        """
+        params = self.gpt_helper.model_params
+        key = hashlib.sha256(json.dumps({'prompts': prompts, 'params': params}, sort_keys=True).encode()).hexdigest()
+
+        try:
+            with open(state_path(self.path)) as f:
+                self.state = json.load(f)
+        except FileNotFoundError:
+            self.state = None
+
+        if self.state is not None:
+            if self.state['key'] == key:
+                return
+            if not self.state.get('collected'):
+                raise ValueError(f'{state_path(self.path)} is of other prompts, collect or delete that job first')
+            # a collected job is replaced by the new one
+            for number in range(len(self.state['parts'])):
+                if os.path.exists(output_path(self.path, number)):
+                    os.remove(output_path(self.path, number))
+
+        cached = {}
+        n_lines = 0
+        with open(self.path, 'w') as f:
+            for position, prompt in enumerate(prompts):
+                if self.gpt_helper.cache is not None:
+                    value = self.gpt_helper.cache.get(prompt, params)
+                    if value is not None:
+                        cached[position] = value
+                        continue
+
+                body = dict(params, messages=[{'role': 'system', 'content': prompt}])
+                f.write(json.dumps({'custom_id': str(position), 'method': 'POST', 'url': CHAT_URL,
+                                    'body': body}) + '\n')
+                n_lines += 1
+
+        parts = [{'start': start, 'end': min(start + self.max_requests, n_lines), 'file_id': None, 'batch_id': None,
+                  'status': None, 'request_counts': None, 'output': False}
+                 for start in range(0, n_lines, self.max_requests)]
+        self.state = {'key': key, 'prompts': len(prompts), 'cached': cached, 'parts': parts, 'collected': False}
+        self.save_state()
+        self.gpt_helper.metrics.increment('gpt_cache_hits_total', len(cached))
+
+    def part_lines(self, part):
+        """returns the lines of the job file in a part, as bytes"""
+        with open(self.path, 'rb') as f:
+            return b''.join(itertools.islice(f, part['start'], part['end']))
+
+    def submit(self):
+        """uploads the job file of each part that was not uploaded yet, and creates a batch for each part that was not
+        submitted yet, saving the state after each step"""
+        for number, part in enumerate(self.state['parts']):
+            if part['file_id'] is None:
+                files = {'file': (f'{os.path.basename(self.path)}.{number}', self.part_lines(part),
+                                  'application/jsonl')}
+                response = self.request('POST', '/files', data={'purpose': 'batch'}, files=files)
+                part['file_id'] = response.json()['id']
+                self.save_state()
+
+            if part['batch_id'] is None:
+                response = self.request('POST', '/batches', json={'input_file_id': part['file_id'],
+                                                                  'endpoint': CHAT_URL,
+                                                                  'completion_window': self.completion_window})
+                batch = response.json()
+                part['batch_id'] = batch['id']
+                part['status'] = batch['status']
+                self.save_state()
+                self.gpt_helper.metrics.increment('gpt_bulk_batches_total')
+
+    def poll(self):
+        """checks the status of each submitted part that is not finished, and downloads the results (and the failed
+        requests) of the ones that finished
+
+        Returns
+        -------
+        bool
+            True if all the parts are finished and downloaded
+        """
+        done = True
+        for number, part in enumerate(self.state['parts']):
+            if part['output']:
+                continue
+            if part['batch_id'] is None:
+                done = False
+                continue
+
+            batch = self.request('GET', f'/batches/{part["batch_id"]}').json()
+            part['status'] = batch['status']
+            part['request_counts'] = batch.get('request_counts')
+
+            if part['status'] not in FINAL_STATUSES:
+                self.save_state()
+                done = False
+                continue
+
+            # an expired or cancelled batch still has the results of the requests done before it stopped
+            with open(output_path(self.path, number), 'wb') as f:
+                for file_id in (batch.get('output_file_id'), batch.get('error_file_id')):
+                    if file_id:
+                        f.write(self.request('GET', f'/files/{file_id}/content').content.rstrip(b'\n') + b'\n')
+            part['output'] = True
+            self.save_state()
+
+        return done
+
+    def wait(self):
+        """submits the parts that were not submitted and polls every poll_seconds until all of them are finished"""
+        self.submit()
+        while not self.poll():
+            time.sleep(self.poll_seconds)
+
+    def results(self):
+        """reads the answers of all the parts, puts them in the cache and returns them by the order of the prompts
+        with logprobs, the confidence of each answer comes from the logprobs in its response (see
+        GPThelper.answer_confidence)
+
+        Raises
+        ------
+        ValueError
+            if a prompt was not answered and fallback is False
+
+        Returns
+        -------
+        list
+            (answer, confidence) of each prompt, the confidence is None without logprobs
+        """
+        helper = self.gpt_helper
+        params = helper.model_params
+        results = [None] * self.state['prompts']
+        # the usage of a job collected before was already counted
+        count_usage = not self.state['collected']
+
+        for position, value in self.state['cached'].items():
+            if helper.logprobs:
+                value = json.loads(value)
+                results[int(position)] = (value['answer'], value['confidence'])
+            else:
+                results[int(position)] = (value, None)
+
+        prompts = {}
+        with open(self.path) as f:
+            for line in f:
+                request = json.loads(line)
+                prompts[int(request['custom_id'])] = request['body']['messages'][0]['content']
+
+        for number, part in enumerate(self.state['parts']):
+            if not part['output']:
+                continue
+            with open(output_path(self.path, number)) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    item = json.loads(line)
+                    response = item.get('response') or {}
+                    if response.get('status_code') != 200:
+                        continue
+
+                    body = response['body']
+                    answer = body['choices'][0]['message']['content']
+                    confidence = helper.answer_confidence(body, answer) if helper.logprobs else None
+                    position = int(item['custom_id'])
+                    results[position] = (answer, confidence)
+
+                    if count_usage:
+                        helper.metrics.increment('gpt_requests_total', status=200, endpoint='bulk')
+                        helper.metrics.record_usage(params['model'], body.get('usage'), PRICE_FACTOR)
+                    if helper.cache is not None and answer is not None:
+                        value = json.dumps({'answer': answer, 'confidence': confidence}) if helper.logprobs \
+                            else answer
+                        helper.cache.put(prompts[position], params, value)
+
+        missing = [position for position, result in enumerate(results) if result is None]
+        if missing and not self.fallback:
+            raise ValueError(f'{len(missing)} prompts were not answered by the batches')
+        for position in missing:
+            helper.metrics.increment('gpt_bulk_fallbacks_total')
+            results[position] = helper.query_answer(prompts[position])
+
+        self.state['collected'] = True
+        self.save_state()
+        return results
+
+    def run(self, prompts):
+        """sends prompts as a bulk job, or goes on with the job of the same prompts, and returns their answers
+
+        Parameters
+        ----------
+        prompts : list
+            the prompts, each one sent alone
+
+        Returns
+        -------
+        list
+            (answer, confidence) of each prompt, see results
+        """
+        self.prepare(prompts)
+        self.wait()
+        return self.results()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='asks questions about every listing of a dataset as an offline '
+                                                     'bulk job, run it again to go on with the job')
+    arg_parser.add_argument('dataset', help='csv, parquet or arrow dataset')
+    arg_parser.add_argument('--questions', nargs='+', required=True, help='yes or no questions about each listing')
+    arg_parser.add_argument('--job', help='jsonl job file, next to the dataset by default')
+    arg_parser.add_argument('--poll-seconds', type=float, default=60)
+    arg_parser.add_argument('--no-wait', action='store_true', help='submit (or check on) the job and exit')
+    args = arg_parser.parse_args()
+
+    import bookingai_bot
+    import bookingai_cgpt
+
+    if len(set(args.questions)) != len(args.questions):
+        print('questions must be unique')
+        sys.exit(1)
+
+    bot = bookingai_bot.BookingBot(data_csv_path=args.dataset)
+    helper = bookingai_cgpt.GPThelper()
+    job_path = args.job or os.path.splitext(args.dataset)[0] + '.bulk.jsonl'
+
+    prompts = []
+    for question in args.questions:
+        prompts.extend(bot.create_prompts(question))
+    flat_prompts, owners = helper.flatten_prompts(prompts)
+
+    job = BulkJob(job_path, helper, poll_seconds=args.poll_seconds)
+    try:
+        job.prepare(flat_prompts)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    if args.no_wait:
+        job.submit()
+        if not job.poll():
+            for part in job.state['parts']:
+                counts = part['request_counts'] or {'completed': 0, 'failed': 0, 'total': part['end'] - part['start']}
+                print(f'{part["batch_id"]}: {part["status"]}, {counts["completed"] + counts["failed"]} of '
+                      f'{part["end"] - part["start"]} requests done')
+            print(f'run again to collect the answers into {bookingai_matrix.matrix_path(args.dataset)}')
+            return
+    else:
+        job.wait()
+
+    helper.merge_results(len(prompts), owners, job.results())
+    n_listings = len(bot.data)
+    answers = {question: helper.answers[i * n_listings:(i + 1) * n_listings]
+               for i, question in enumerate(args.questions)}
+    matrix = bookingai_matrix.AnswerMatrix(pd.DataFrame(answers, index=bot.data.index, dtype=bool))
+    matrix.save(bookingai_matrix.matrix_path(args.dataset))
+
+    print(f'{len(flat_prompts)} prompts answered, saved to {bookingai_matrix.matrix_path(args.dataset)}')
+    for question in args.questions:
+        print(f'{question}: {int(matrix.answers[question].sum())} matches')
+
+
+if __name__ == '__main__':
+    main()
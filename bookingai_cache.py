@@ -0,0 +1,184 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+class AnswerCache:
+    """
+    a persistent cache of gpt answers kept in a sqlite file, so repeated questions over the same data cost nothing
+    answers are keyed by a hash of the prompt together with the model parameters
+
+    Parameters
+    ----------
+    path : str
+        path to the sqlite file, created if it does not exist
+
+    ttl : float
+        if not None, answers older than this amount of seconds are treated as missing and deleted
+
+    max_entries : int
+        if not None, the least recently used answers are deleted when the cache grows above this size
+
+    Attributes
+    ----------
+    hits : int
+        amount of lookups that found an answer
+
+    misses : int
+        amount of lookups that did not find an answer
+
+    Methods
+    -------
+    make_key(prompt, model_params)
+        static method
+        returns the hash used as the key of a prompt and the model parameters it was asked with
+
+    get(prompt, model_params)
+        returns the cached answer, or None if there is none
+
+    put(prompt, model_params, answer)
+        saves an answer to the cache
+
+    evict()
+        deletes expired answers and the least recently used ones above max_entries
+
+    clear()
+        deletes all answers
+
+    stats()
+        returns a dict with the size of the cache and the hit and miss counters
+    """
+    def __init__(self, path='bookingai_cache.sqlite', ttl=None, max_entries=100000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        # the connection is shared by the threads of GPThelper, the lock keeps them from using it at the same time
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS answers ('
+                          'key TEXT PRIMARY KEY, answer TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)')
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(prompt, model_params):
+        """returns a sha256 hex digest of the prompt and the model parameters
+
+        Parameters
+        ----------
+        prompt : str
+            the prompt sent to chatgpt
+
+        model_params : dict
+            the parameters the prompt is sent with (model, temperature etc.)
+        """
+        raw = json.dumps({'prompt': prompt, 'params': model_params}, sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, prompt, model_params):
+        """returns the cached answer for a prompt and model parameters
+
+        Parameters
+        ----------
+        prompt : str
+            the prompt sent to chatgpt
+
+        model_params : dict
+            the parameters the prompt is sent with
+
+        Returns
+        -------
+        str
+            the answer, or None if there is no valid answer in the cache
+        """
+        key = self.make_key(prompt, model_params)
+        now = time.time()
+
+        with self.lock:
+            row = self.conn.execute('SELECT answer, created FROM answers WHERE key = ?', (key,)).fetchone()
+
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self.conn.execute('DELETE FROM answers WHERE key = ?', (key,))
+                self.conn.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.conn.execute('UPDATE answers SET last_used = ? WHERE key = ?', (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, prompt, model_params, answer):
+        """saves an answer, replacing an older one for the same prompt and model parameters
+
+        Parameters
+        ----------
+        prompt : str
+            the prompt sent to chatgpt
+
+        model_params : dict
+            the parameters the prompt was sent with
+
+        answer : str
+            the answer from chatgpt
+        """
+        key = self.make_key(prompt, model_params)
+        now = time.time()
+
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO answers (key, answer, created, last_used) VALUES (?, ?, ?, ?)',
+                              (key, answer, now, now))
+            self.conn.commit()
+
+            if self.max_entries is not None:
+                size = self.conn.execute('SELECT COUNT(*) FROM answers').fetchone()[0]
+                if size > self.max_entries:
+                    self._evict()
+
+    def _evict(self):
+        """evict() without taking the lock"""
+        if self.ttl is not None:
+            self.conn.execute('DELETE FROM answers WHERE created < ?', (time.time() - self.ttl,))
+
+        if self.max_entries is not None:
+            self.conn.execute('DELETE FROM answers WHERE key IN '
+                              '(SELECT key FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                              (self.max_entries,))
+        self.conn.commit()
+
+    def evict(self):
+        """deletes answers older than ttl, and the least recently used answers above max_entries"""
+        with self.lock:
+            self._evict()
+
+    def clear(self):
+        """deletes all the answers in the cache"""
+        with self.lock:
+            self.conn.execute('DELETE FROM answers')
+            self.conn.commit()
+
+    def stats(self):
+        """returns a dict with the amount of cached answers, hits and misses
+
+        Returns
+        -------
+        dict
+            dictionary with the keys size, hits, misses
+        """
+        with self.lock:
+            size = self.conn.execute('SELECT COUNT(*) FROM answers').fetchone()[0]
+        return {'size': size, 'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        """closes the sqlite connection"""
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,357 @@
+import bookingai_data
+import argparse
+import os
+import pandas as pd
+import pickle
+
+
+def normalize_question(question):
+    """returns the form of a question models are kept under, so "Is there a kettle?" and "is there a kettle" match"""
+    return ' '.join(question.lower().strip(' ?.!').split())
+
+
+def cached_answers(texts, question, gpt_helper, builder):
+    """returns the answers gpt already gave about descriptions, read from the answer cache without sending anything,
+    for training a cascade on questions that were asked before
+
+    Parameters
+    ----------
+    texts : series
+        descriptions of listings
+
+    question : str
+        a yes or no question about a single listing
+
+    gpt_helper : bookingai_cgpt.GPThelper
+        the helper whose cache (and model parameters) the answers are looked up with
+
+    builder : bookingai_prompts.PromptBuilder
+        builds the prompts the way they were asked, e.g. bot.get_prompt_builder()
+
+    Returns
+    -------
+    series
+        bools aligned with texts, only for the descriptions whose answer is in the cache (descriptions asked in several
+        chunks are left out)
+    """
+    answers = {}
+    for index, text in texts.items():
+        prompts = builder.build('' if pd.isna(text) else str(text), question)
+        if len(prompts) != 1:
+            continue
+        answer = gpt_helper.cached_answer(prompts[0])
+        if answer is not None:
+            answers[index] = answer
+    return pd.Series(answers, dtype=bool)
+
+
+class CascadeClassifier:
+    """
+    a cheap local stage in front of gpt for questions asked again and again (kettle, balcony, parking...): a tf-idf
+    and logistic regression model for each question, trained on answers gpt already gave. listings the model is sure
+    about are answered locally, for free and at once, and only the rest are asked to gpt
+    requires scikit-learn
+
+    Parameters
+    ----------
+    min_confidence : float
+        listings are answered locally only if the model gives its answer at least this probability
+
+    min_examples : int
+        least amount of answers (with both yes and no among them) a question needs to get a model
+
+    Attributes
+    ----------
+    models : dict
+        normalized question to its trained sklearn pipeline
+
+    reports : dict
+        normalized question to its evaluation on held out answers, see evaluate
+
+    Methods
+    -------
+    has_model(question)
+        returns True if there is a model for the question
+
+    fit(question, texts, answers)
+        trains the model of a question
+
+    evaluate(question, texts, answers, test_size=0.25)
+        trains on a part of the answers and reports the escalation rate and agreement with gpt on the rest, at several
+        thresholds, then trains on all of them
+
+    predict(question, texts)
+        returns the model's answers and their confidence
+
+    answer(question, texts, prompts, gpt_helper)
+        answers the confident listings locally and asks gpt about the rest
+
+    save(path)
+        saves the models to a file
+
+    load(path)
+        static method
+        loads models saved with save
+    """
+    THRESHOLDS = (0.6, 0.7, 0.8, 0.9, 0.95, 0.99)
+
+    def __init__(self, min_confidence=0.9, min_examples=20):
+        self.min_confidence = min_confidence
+        self.min_examples = min_examples
+        self.models = {}
+        self.reports = {}
+
+    def has_model(self, question):
+        """returns True if there is a trained model for a question"""
+        return normalize_question(question) in self.models
+
+    @staticmethod
+    def _pipeline():
+        """returns a new untrained model: word and word pair tf-idf, then a balanced logistic regression"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+
+        return make_pipeline(TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, min_df=1),
+                             LogisticRegression(max_iter=1000, class_weight='balanced'))
+
+    def _check(self, texts, answers):
+        """returns the descriptions and answers as lists, raising ValueError if there are too few to train on"""
+        texts = ['' if pd.isna(text) else str(text) for text in texts]
+        answers = [bool(answer) for answer in answers]
+        if len(texts) != len(answers):
+            raise ValueError('texts and answers must be of the same length')
+        if len(answers) < self.min_examples or len(set(answers)) < 2:
+            raise ValueError(f'at least {self.min_examples} answers with both yes and no among them are needed')
+        return texts, answers
+
+    def fit(self, question, texts, answers):
+        """trains the model of a question on answers gpt gave, replacing an older one
+
+        Parameters
+        ----------
+        question : str
+            a yes or no question about a single listing
+
+        texts : list
+            descriptions of listings
+
+        answers : list
+            gpt's answer (bool) about each description
+
+        Raises
+        ------
+        ValueError
+            if there are less than min_examples answers, or they are all the same
+        """
+        texts, answers = self._check(texts, answers)
+        model = self._pipeline()
+        model.fit(texts, answers)
+        self.models[normalize_question(question)] = model
+
+    def evaluate(self, question, texts, answers, test_size=0.25, seed=0):
+        """trains the model of a question on a part of gpt's answers and compares its answers with gpt's on the rest,
+        for each threshold in THRESHOLDS, so min_confidence can be set by the cost (escalation rate) and the accuracy
+        (agreement) it gives. the model is then trained on all the answers
+
+        Parameters
+        ----------
+        question : str
+            a yes or no question about a single listing
+
+        texts : list
+            descriptions of listings
+
+        answers : list
+            gpt's answer (bool) about each description
+
+        test_size : float
+            part of the answers held out for the evaluation
+
+        seed : int
+            seed of the split
+
+        Raises
+        ------
+        ValueError
+            if there are less than min_examples answers, or they are all the same
+
+        Returns
+        -------
+        dict
+            train and test (amount of answers), and thresholds: threshold to escalation_rate (part of the held out
+            listings that would be asked to gpt), local_agreement (part of the locally answered ones that agree with
+            gpt) and agreement (of all the held out listings, the escalated ones being answered by gpt)
+        """
+        from sklearn.model_selection import train_test_split
+
+        texts, answers = self._check(texts, answers)
+        train_texts, test_texts, train_answers, test_answers = train_test_split(
+            texts, answers, test_size=test_size, random_state=seed, stratify=answers)
+
+        model = self._pipeline()
+        model.fit(train_texts, train_answers)
+        probabilities = model.predict_proba(test_texts)
+        yes_column = list(model.classes_).index(True)
+
+        report = {'train': len(train_texts), 'test': len(test_texts), 'thresholds': {}}
+        for threshold in self.THRESHOLDS:
+            local = agree = 0
+            for row, expected in zip(probabilities, test_answers):
+                if max(row) >= threshold:
+                    local += 1
+                    agree += int((row[yes_column] >= 0.5) == expected)
+            escalated = len(test_answers) - local
+            report['thresholds'][threshold] = {
+                'escalation_rate': escalated / len(test_answers),
+                'local_agreement': agree / local if local else None,
+                'agreement': (agree + escalated) / len(test_answers),
+            }
+
+        self.fit(question, texts, answers)
+        self.reports[normalize_question(question)] = report
+        return report
+
+    def predict(self, question, texts):
+        """returns the model's answers about descriptions, and how sure it is of each
+
+        Parameters
+        ----------
+        question : str
+            a question with a model (see has_model)
+
+        texts : series
+            descriptions of listings
+
+        Raises
+        ------
+        KeyError
+            if there is no model for the question
+
+        Returns
+        -------
+        tuple
+            two series aligned with texts: the answers (bool) and their probability (0.5 to 1)
+        """
+        model = self.models[normalize_question(question)]
+        if len(texts) == 0:
+            return pd.Series(dtype=bool, index=texts.index), pd.Series(dtype=float, index=texts.index)
+
+        probabilities = model.predict_proba(['' if pd.isna(text) else str(text) for text in texts])
+        yes = probabilities[:, list(model.classes_).index(True)]
+        return pd.Series(yes >= 0.5, index=texts.index), pd.Series(probabilities.max(axis=1), index=texts.index)
+
+    def answer(self, question, texts, prompts, gpt_helper):
+        """answers a question about listings: locally where the model is at least min_confidence sure, and with
+        gpt_helper.query_list for the rest (all of them if the question has no model)
+
+        Parameters
+        ----------
+        question : str
+            a yes or no question about a single listing
+
+        texts : series
+            descriptions of the listings
+
+        prompts : list
+            the prompt (or chunk prompts) about each listing, by the order of texts
+
+        gpt_helper : bookingai_cgpt.GPThelper
+            the helper to ask the escalated listings with
+
+        Returns
+        -------
+        tuple
+            the answers (list of bools by the order of texts) and the positions of the listings asked to gpt
+        """
+        if not self.has_model(question):
+            gpt_helper.query_list(prompts)
+            return list(gpt_helper.answers), list(range(len(prompts)))
+
+        local_answers, confidences = self.predict(question, texts)
+        confident = list(confidences >= self.min_confidence)
+        answers = list(local_answers)
+
+        escalated = [i for i, sure in enumerate(confident) if not sure]
+        if escalated:
+            gpt_helper.query_list([prompts[i] for i in escalated])
+            for i, answer in zip(escalated, gpt_helper.answers):
+                answers[i] = answer
+
+        return answers, escalated
+
+    def save(self, path):
+        """saves the models, their reports and min_confidence to a file (a pickle, only load files you made)"""
+        with open(path, 'wb') as f:
+            pickle.dump({'min_confidence': self.min_confidence, 'min_examples': self.min_examples,
+                         'models': self.models, 'reports': self.reports}, f)
+
+    @staticmethod
+    def load(path):
+        """loads a cascade saved with save
+
+        Parameters
+        ----------
+        path : str
+            path of the saved cascade
+        """
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+
+        cascade = CascadeClassifier(saved['min_confidence'], saved['min_examples'])
+        cascade.models = saved['models']
+        cascade.reports = saved['reports']
+        return cascade
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='trains a local model for each question on answers gpt already '
+                                                     'gave, and reports how many listings it would answer locally')
+    arg_parser.add_argument('datasets', nargs='+', help='csv, parquet or arrow datasets the questions were asked about')
+    arg_parser.add_argument('--questions', nargs='+', required=True)
+    arg_parser.add_argument('--out', default='bookingai_cascade.pkl', help='file to save the models to')
+    arg_parser.add_argument('--min-confidence', type=float, default=0.9)
+    args = arg_parser.parse_args()
+
+    import bookingai_bot
+    import bookingai_cgpt
+    import bookingai_matrix
+
+    helper = bookingai_cgpt.GPThelper()
+    builder = bookingai_bot.BookingBot().get_prompt_builder()
+    cascade = CascadeClassifier(args.min_confidence)
+
+    for question in args.questions:
+        texts, answers = [], []
+        for path in args.datasets:
+            data_texts = bookingai_data.load_frame(path, ['text'])['text']
+
+            # answer matrices saved next to the dataset first, then the answer cache
+            found = None
+            answers_path = bookingai_matrix.matrix_path(path)
+            if os.path.exists(answers_path):
+                matrix = bookingai_matrix.load_matrix(answers_path, data_texts.index)
+                if question in matrix.questions():
+                    found = matrix.answers[question]
+            if found is None:
+                found = cached_answers(data_texts, question, helper, builder)
+
+            texts.extend(data_texts[found.index])
+            answers.extend(found)
+
+        try:
+            report = cascade.evaluate(question, texts, answers)
+        except ValueError as e:
+            print(f'{question}: {e}, {len(answers)} answers found')
+            continue
+
+        row = report['thresholds'][min(report['thresholds'], key=lambda t: abs(t - args.min_confidence))]
+        print(f'{question}: {len(answers)} answers, {row["escalation_rate"]:.0%} of the held out listings asked to '
+              f'gpt, {row["agreement"]:.1%} agreement with gpt')
+
+    cascade.save(args.out)
+    print(f'saved {len(cascade.models)} models to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,456 @@
+import bookingai_cache
+import bookingai_metrics
 import openai
+import openai.error
+from concurrent.futures import ThreadPoolExecutor
+import json
+import math
+import random
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    a token bucket that keeps the traffic to gpt under a requests-per-minute and a tokens-per-minute limit
+    both buckets refill continuously, a request waits until both have enough room for it
+
+    Parameters
+    ----------
+    requests_per_minute : int
+        max amount of requests allowed per minute
+
+    tokens_per_minute : int
+        max amount of tokens (prompt + completion) allowed per minute
+
+    Methods
+    -------
+    acquire(n_tokens)
+        blocks until a single request of n_tokens tokens can be sent, then takes it out of the buckets
+
+    try_acquire(n_tokens)
+        takes a request of n_tokens tokens out of the buckets if there is room, returns the seconds to wait otherwise
+    """
+    def __init__(self, requests_per_minute=3500, tokens_per_minute=90000):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+        self.request_bucket = float(requests_per_minute)
+        self.token_bucket = float(tokens_per_minute)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        """adds to both buckets whatever was earned since the last refill, up to their max size"""
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+
+        self.request_bucket = min(self.requests_per_minute,
+                                  self.request_bucket + elapsed * self.requests_per_minute / 60)
+        self.token_bucket = min(self.tokens_per_minute,
+                                self.token_bucket + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, n_tokens):
+        """blocks until there is room for one more request of n_tokens tokens
+
+        Parameters
+        ----------
+        n_tokens : int
+            estimated amount of tokens the request will use
+        """
+        while True:
+            wait = self.try_acquire(n_tokens)
+            if wait == 0:
+                return
+            time.sleep(wait)
+
+    def try_acquire(self, n_tokens):
+        """takes one request of n_tokens tokens out of the buckets if both have room for it, without waiting
+
+        Parameters
+        ----------
+        n_tokens : int
+            estimated amount of tokens the request will use
+
+        Returns
+        -------
+        float
+            0 if the request was taken, otherwise the seconds until there is room for it
+        """
+        # a single request larger than the whole bucket would wait forever
+        n_tokens = min(n_tokens, self.tokens_per_minute)
+
+        with self.lock:
+            self._refill()
+            if self.request_bucket >= 1 and self.token_bucket >= n_tokens:
+                self.request_bucket -= 1
+                self.token_bucket -= n_tokens
+                return 0
+
+            return max((1 - self.request_bucket) * 60 / self.requests_per_minute,
+                       (n_tokens - self.token_bucket) * 60 / self.tokens_per_minute)
+
+
+class Endpoint:
+    """
+    an openai compatible endpoint requests can be sent to: an api key (of an organization) and a base url (openai's,
+    a proxy's or a local fake's), with its own limits and the traffic currently sent to it
+
+    Parameters
+    ----------
+    api_key : str
+        the api key, the GPThelper's openai_key if None. an endpoint with its own api_base (a proxy or a local server)
+        may need none
+
+    api_base : str
+        the base url, openai's if None
+
+    requests_per_minute : int
+        requests per minute limit of this endpoint
+
+    tokens_per_minute : int
+        tokens per minute limit of this endpoint
+
+    max_in_flight : int
+        if not None, max amount of requests sent to this endpoint at the same time
+
+    organization : str
+        if not None, the openai organization the requests are billed to
+
+    name : str
+        name of the endpoint in stats and metrics, its api_base (or "openai") if None
+
+    Attributes
+    ----------
+    rate_limiter : RateLimiter
+        token bucket of this endpoint's limits
+
+    in_flight : int
+        amount of requests sent to the endpoint and not answered yet
+
+    requests : int
+        amount of requests sent to the endpoint so far
+
+    rate_limited : int
+        amount of them answered with a 429 error
+
+    errors : int
+        amount of them that failed with any other error
+
+    ejected_until : float
+        time.monotonic() until which no requests are sent to the endpoint, after a 429 error
+
+    Methods
+    -------
+    load()
+        returns how busy the endpoint is, relative to its limit
+
+    stats()
+        returns the traffic of the endpoint as a dict
+    """
+    def __init__(self, api_key=None, api_base=None, requests_per_minute=3500, tokens_per_minute=90000,
+                 max_in_flight=None, organization=None, name=None):
+        self.api_key = api_key
+        self.api_base = api_base
+        self.organization = organization
+        self.name = name or api_base or 'openai'
+        self.max_in_flight = max_in_flight
+        self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+
+        self.in_flight = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.consecutive_rate_limits = 0
+        self.ejected_until = 0
+
+    def load(self):
+        """returns the requests in flight per request per second of the limit, so an endpoint with twice the limit
+        takes twice the requests"""
+        return self.in_flight / (self.rate_limiter.requests_per_minute / 60)
+
+    def stats(self):
+        """returns the name, in_flight, requests, rate_limited, errors and ejected (bool) of the endpoint"""
+        return {'name': self.name, 'in_flight': self.in_flight, 'requests': self.requests,
+                'rate_limited': self.rate_limited, 'errors': self.errors,
+                'ejected': self.ejected_until > time.monotonic()}
+
+
+class EndpointPool:
+    """
+    spreads requests over several endpoints (e.g. the keys of separate organizations, or an internal proxy), so the
+    throughput adds up instead of all the traffic waiting behind a single rate limit
+    each request goes to the least loaded endpoint that has room for it under its own limits, and an endpoint that
+    answers with a 429 error is left out for a while (twice as long after each 429 in a row), as long as there is
+    another endpoint to send to
+
+    Parameters
+    ----------
+    endpoints : list
+        Endpoint objects, or dicts of their parameters
+
+    eject_seconds : float
+        seconds an endpoint is left out after a 429 error, doubled for each 429 in a row up to EJECT_MAX_SECONDS
+
+    Attributes
+    ----------
+    EJECT_MAX_SECONDS : float
+        max seconds an endpoint is left out
+
+    endpoints : list
+        the endpoints
+
+    Methods
+    -------
+    acquire(n_tokens)
+        blocks until an endpoint can take a request of n_tokens tokens, and returns the least loaded one
+
+    release(endpoint, status)
+        marks a request sent with acquire as answered, ejecting the endpoint on a 429 error
+
+    available(now=None)
+        returns the endpoints that are not ejected
+
+    stats()
+        returns the traffic of each endpoint
+    """
+    EJECT_MAX_SECONDS = 60
+
+    def __init__(self, endpoints, eject_seconds=5):
+        if not endpoints:
+            raise ValueError('at least one endpoint is needed')
+
+        self.endpoints = [e if isinstance(e, Endpoint) else Endpoint(**e) for e in endpoints]
+        self.eject_seconds = eject_seconds
+        self.condition = threading.Condition()
+
+    def available(self, now=None):
+        """returns the endpoints that are not ejected right now"""
+        now = time.monotonic() if now is None else now
+        return [e for e in self.endpoints if e.ejected_until <= now]
+
+    def acquire(self, n_tokens):
+        """blocks until one of the endpoints can take a request of n_tokens tokens, under its rate limits and
+        max_in_flight, and returns the least loaded of them (the request is counted in its in_flight)
+
+        Parameters
+        ----------
+        n_tokens : int
+            estimated amount of tokens the request will use
+
+        Returns
+        -------
+        Endpoint
+            the endpoint to send the request to, release must be called once it is answered
+        """
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                candidates = self.available(now)
+                # if all of them are ejected, the first to come back is used
+                waits = [min(e.ejected_until for e in self.endpoints) - now] if not candidates else []
+
+                for endpoint in sorted(candidates, key=lambda e: (e.load(), e.requests)):
+                    if endpoint.max_in_flight is not None and endpoint.in_flight >= endpoint.max_in_flight:
+                        continue
+                    wait = endpoint.rate_limiter.try_acquire(n_tokens)
+                    if wait == 0:
+                        endpoint.in_flight += 1
+                        endpoint.requests += 1
+                        return endpoint
+                    waits.append(wait)
+
+                # woken up early when a request is released
+                self.condition.wait(min(waits) if waits else None)
+
+    def release(self, endpoint, status=200):
+        """marks a request to an endpoint as answered
+
+        Parameters
+        ----------
+        endpoint : Endpoint
+            the endpoint returned by acquire
+
+        status : int
+            the http status of the answer, None for a failure with no status (e.g. a connection error). a 429 ejects
+            the endpoint, if another one is available
+
+        Returns
+        -------
+        bool
+            True if the endpoint was ejected
+        """
+        with self.condition:
+            endpoint.in_flight -= 1
+            ejected = False
+
+            if status == 429:
+                endpoint.rate_limited += 1
+                endpoint.consecutive_rate_limits += 1
+                others = [e for e in self.available() if e is not endpoint]
+                if others:
+                    seconds = min(self.EJECT_MAX_SECONDS,
+                                  self.eject_seconds * 2 ** (endpoint.consecutive_rate_limits - 1))
+                    endpoint.ejected_until = time.monotonic() + seconds
+                    ejected = True
+            else:
+                endpoint.consecutive_rate_limits = 0
+                if status != 200:
+                    endpoint.errors += 1
+
+            self.condition.notify_all()
+            return ejected
+
+    def stats(self):
+        """returns a list of the stats of each endpoint, see Endpoint.stats"""
+        with self.condition:
+            return [endpoint.stats() for endpoint in self.endpoints]
 
 
 class GPThelper:
     """
     a class used to send prompts and get back answers from gpt's api, requires an openai key
 
+    Parameters
+    ----------
+    max_workers : int
+        max amount of prompts sent to chatgpt at the same time
+
+    requests_per_minute : int
+        requests per minute limit of the openai account
+
+    tokens_per_minute : int
+        tokens per minute limit of the openai account
+
+    max_retries : int
+        amount of times a request is retried after a rate limit (429) or a server error (5xx)
+
+    api_base : str
+        if not None, sends requests to this url instead of openai's (e.g. a local fake server for testing)
+
+    endpoints : list
+        if not None, several endpoints (Endpoint objects or dicts of their parameters) to spread the requests over, see
+        EndpointPool. requests_per_minute, tokens_per_minute and api_base are then set for each endpoint instead
+
+    use_cache : bool
+        if True, answers are saved to and read from a persistent cache, so the same prompt is only paid for once
+
+    cache_path : str
+        path to the sqlite file of the cache
+
+    cache_ttl : float
+        if not None, cached answers older than this amount of seconds are asked again
+
+    cache_max_entries : int
+        max amount of cached answers, the least recently used ones are deleted above it
+
+    metrics : bookingai_metrics.Metrics
+        registry the requests, retries, cache hits, latencies and tokens are reported to, the shared
+        bookingai_metrics.METRICS if None
+
+    single_token : bool
+        if True, each answer is a single token that can only be yes or no (max_tokens=1 and a logit bias towards the
+        YES_NO_TOKENS), which takes less time and tokens than a free text answer and can not be misread
+
+    logprobs : bool
+        if True, the log probabilities of the first answer token are requested too, and give a confidence to each
+        answer (see answer_confidence and uncertain)
+
+    min_confidence : float
+        answers with a lower confidence than this are uncertain
+
     Attributes
     ----------
+    YES_NO_TOKENS : dict
+        ids of the yes and no tokens in the cl100k_base encoding (gpt-3.5-turbo and gpt-4), the only tokens allowed in
+        single_token mode
+
     openai_key : str
         a string with your own api key for accessing chatgpt
 
     model_params : dict
         a dictionary used for the openai module
 
+    pool : EndpointPool
+        the endpoints the requests are sent to, each with its own rate limits. a single endpoint (openai_key, api_base)
+        unless endpoints were given
+
+    cache : bookingai_cache.AnswerCache
+        the answer cache, None if use_cache is False
+
+    batch_fallbacks : int
+        amount of listings that were asked again separately in the last query_batched, due to a malformed answer
+
+    confidences : list
+        how sure gpt was of each answer of the last query_list, between 0.5 and 1 (None for all if logprobs is False)
+
+    metrics : bookingai_metrics.Metrics
+        the metrics registry
+
     Methods
     -------
     query_chatgpt(prompt)
-        sends a single prompt (str) to chatgpt and returns the answer
+        sends a single prompt (str) to chatgpt and returns the answer, retrying on rate limits and server errors
+
+    query_answer(prompt)
+        same as query_chatgpt, returns the answer and its confidence
+
+    cached_answer(prompt)
+        returns the cached answer to a prompt as a bool without sending anything, None if it is not cached
 
     query_list(queries)
-        iterates over a list of prompts and sends them one by one to chatgpt, returning a list of answers
+        sends a list of prompts concurrently to chatgpt, populating the answers attribute by the order of the prompts
+
+    query_bulk(prompts, job_path='bookingai_bulk.jsonl')
+        same as query_list, through an offline bulk job of the batch api
+
+    query_listing(prompt)
+        sends the prompt (or chunk prompts) about a single listing and returns its answer as a bool
+
+    query_batched(batches, prompts)
+        sends prompts about several listings at once, falling back to single listing prompts for malformed answers
+
+    parse_batch_answer(response, indices)
+        static method
+        reads a json array of yes or no answers from a batched prompt, returns the valid ones as a dict
+
+    estimate_tokens(prompt)
+        returns a rough estimate of the amount of tokens a request with this prompt will use
+
+    is_yes(response)
+        static method
+        returns True if a single answer from gpt is yes
 
     response_to_bool(lst)
         takes a list of answers from gpt (only 'yes' or 'no') and converts is to a list of bools (True for yes)
 
+    answer_confidence(response, answer)
+        static method
+        returns how sure gpt was of a yes or no answer, out of the logprobs in its response
+
+    uncertain()
+        returns the indices of the answers of the last query_list with a confidence under min_confidence
+
     string_results()
         returns the results well worded within a string, format example: "entries 5,8,9 match your question."
     """
-    def __init__(self):
+    RETRY_BASE_DELAY = 1
+    RETRY_MAX_DELAY = 60
+
+    YES_NO_TOKENS = {'yes': 9891, 'Yes': 9642, 'no': 2201, 'No': 2822}
+
+    def __init__(self, max_workers=8, requests_per_minute=3500, tokens_per_minute=90000, max_retries=5,
+                 api_base=None, use_cache=True, cache_path='bookingai_cache.sqlite', cache_ttl=None,
+                 cache_max_entries=100000, metrics=None, single_token=False, logprobs=False, min_confidence=0.9,
+                 endpoints=None):
         self.answers = None
+        self.confidences = None
+        self.batch_fallbacks = 0
+        # the key of endpoints without their own, passed with each request (not set on the openai module, so helpers
+        # with different keys do not affect each other)
         self.openai_key = ''
-        openai.api_key = self.openai_key
+        self.api_base = api_base
 
         # model setup
         self.model_params = dict(
@@ -42,19 +462,158 @@ class GPThelper:
             presence_penalty=0
         )
 
-    def query_chatgpt(self, prompt):
+        self.single_token = single_token
+        if single_token:
+            self.model_params['max_tokens'] = 1
+            self.model_params['logit_bias'] = {str(token): 100 for token in self.YES_NO_TOKENS.values()}
+
+        self.logprobs = logprobs
+        self.min_confidence = min_confidence
+        if logprobs:
+            self.model_params['logprobs'] = True
+            self.model_params['top_logprobs'] = len(self.YES_NO_TOKENS)
+
+        # execution setup
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        if endpoints is None:
+            endpoints = [Endpoint(api_base=api_base, requests_per_minute=requests_per_minute,
+                                  tokens_per_minute=tokens_per_minute)]
+        self.pool = EndpointPool(endpoints)
+
+        # cache setup
+        self.cache = None
+        if use_cache:
+            self.cache = bookingai_cache.AnswerCache(cache_path, ttl=cache_ttl, max_entries=cache_max_entries)
+
+        self.metrics = metrics if metrics is not None else bookingai_metrics.METRICS
+
+    def estimate_tokens(self, prompt, max_tokens=None):
+        """returns a rough estimate of the tokens used by a request, about 4 characters per token plus the max answer
+
+        Parameters
+        ----------
+        prompt : str
+           a prompt to send to chatgpt
+
+        max_tokens : int
+           if not None, the max answer length used instead of the one in model_params
+
+        Returns
+        -------
+        int
+           estimated amount of tokens
+        """
+        if max_tokens is None:
+            max_tokens = self.model_params['max_tokens']
+        return len(prompt) // 4 + max_tokens
+
+    def endpoint_params(self, endpoint):
+        """returns the connection parameters of a request to an endpoint (api_key, and api_base and organization if it
+        has them), passed with the request instead of being set on the openai module
+
+        Parameters
+        ----------
+        endpoint : Endpoint
+            the endpoint the request is sent to
+        """
+        params = {}
+        api_key = endpoint.api_key or self.openai_key
+        if api_key:
+            params['api_key'] = api_key
+        elif endpoint.api_base is not None:
+            # a proxy or a local server may need no key, but the openai module will not send a request without one
+            params['api_key'] = 'none'
+
+        if endpoint.api_base is not None:
+            params['api_base'] = endpoint.api_base
+        if endpoint.organization is not None:
+            params['organization'] = endpoint.organization
+        return params
+
+    @staticmethod
+    def is_retryable(error):
+        """returns True if an error from openai is worth retrying (rate limits, timeouts and server errors)
+
+        Parameters
+        ----------
+        error : openai.error.OpenAIError
+           the error raised by the openai module
+        """
+        if isinstance(error, (openai.error.RateLimitError, openai.error.ServiceUnavailableError,
+                              openai.error.APIConnectionError, openai.error.Timeout, openai.error.TryAgain)):
+            return True
+
+        status = getattr(error, 'http_status', None)
+        return status is not None and (status == 429 or status >= 500)
+
+    def retry_delay(self, attempt):
+        """returns a random delay (full jitter) that grows exponentially with the attempt number
+
+        Parameters
+        ----------
+        attempt : int
+           number of the failed attempt, starting from 0
+        """
+        return random.uniform(0, min(self.RETRY_MAX_DELAY, self.RETRY_BASE_DELAY * 2 ** attempt))
+
+    def query_chatgpt(self, prompt, max_tokens=None):
         """sends a query to chatgpt and returns an answer
+        answers already in the cache are returned without sending anything
+        waits for the rate limiter before each attempt, and retries with a jittered backoff on 429 and 5xx errors
 
         Parameters
         ----------
         prompt : str
            a prompt to send to chatgpt
 
+        max_tokens : int
+           if not None, overrides the max answer length in model_params (e.g. for answers about several listings)
+
+        Raises
+        ------
+        openai.error.OpenAIError
+           if the error is not retryable or the request failed more than max_retries times
+
         Returns
         -------
         str
            answer from chatgpt
         """
+        return self.query_answer(prompt, max_tokens)[0]
+
+    def query_answer(self, prompt, max_tokens=None):
+        """same as query_chatgpt, but also returns how sure gpt was of a yes or no answer (see answer_confidence)
+
+        Parameters
+        ----------
+        prompt : str
+           a prompt to send to chatgpt
+
+        max_tokens : int
+           if not None, overrides the max answer length in model_params
+
+        Returns
+        -------
+        tuple
+           the answer from chatgpt and its confidence, None if logprobs is False
+        """
+        model_params = dict(self.model_params)
+        if max_tokens is not None:
+            model_params['max_tokens'] = max_tokens
+            # the logit bias only allows a yes or no, a longer answer (e.g. a json array) needs every token
+            model_params.pop('logit_bias', None)
+
+        if self.cache is not None:
+            cached = self.cache.get(prompt, model_params)
+            if cached is not None:
+                self.metrics.increment('gpt_cache_hits_total')
+                # answers with logprobs are cached with their confidence, under other model_params
+                if self.logprobs:
+                    cached = json.loads(cached)
+                    return cached['answer'], cached['confidence']
+                return cached, None
+            self.metrics.increment('gpt_cache_misses_total')
 
         messages = [
             {
@@ -62,23 +621,289 @@ class GPThelper:
                 "content": prompt
             },
         ]
-        response = openai.ChatCompletion.create(
-            messages=messages,
-            **self.model_params
-        )
-        return response['choices'][0]['message'].content
 
+        n_tokens = self.estimate_tokens(prompt, model_params['max_tokens'])
+
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            endpoint = self.pool.acquire(n_tokens)
+            self.metrics.observe('gpt_rate_limit_wait_seconds', time.perf_counter() - start)
+
+            start = time.perf_counter()
+            try:
+                response = openai.ChatCompletion.create(
+                    messages=messages,
+                    **model_params,
+                    **self.endpoint_params(endpoint)
+                )
+                answer = response['choices'][0]['message'].content
+            except openai.error.OpenAIError as e:
+                status = getattr(e, 'http_status', None)
+                ejected = self.pool.release(endpoint, status)
+                self.metrics.observe('gpt_request_seconds', time.perf_counter() - start, status=status or 'error')
+                self.metrics.increment('gpt_requests_total', status=status or 'error', endpoint=endpoint.name)
+                if attempt == self.max_retries or not self.is_retryable(e):
+                    raise
+                self.metrics.increment('gpt_retries_total')
+                if ejected:
+                    # the next attempt goes to another endpoint right away
+                    self.metrics.increment('gpt_endpoint_ejections_total', endpoint=endpoint.name)
+                else:
+                    time.sleep(self.retry_delay(attempt))
+            except Exception:
+                # any other error (e.g. a malformed response) frees the endpoint's slot too, then is raised as is
+                self.pool.release(endpoint, None)
+                self.metrics.increment('gpt_requests_total', status='error', endpoint=endpoint.name)
+                raise
+            else:
+                self.pool.release(endpoint, 200)
+                self.metrics.observe('gpt_request_seconds', time.perf_counter() - start, status=200)
+                self.metrics.increment('gpt_requests_total', status=200, endpoint=endpoint.name)
+                self.metrics.record_usage(model_params['model'], response.get('usage'))
+                break
+
+        confidence = self.answer_confidence(response, answer) if self.logprobs else None
+
+        # an answer with no text is not cached, the prompt is asked again next time
+        if self.cache is not None and answer is not None:
+            value = json.dumps({'answer': answer, 'confidence': confidence}) if self.logprobs else answer
+            self.cache.put(prompt, model_params, value)
+        return answer, confidence
+
+    def cached_answer(self, prompt):
+        """returns the answer to a prompt as a bool if it is in the cache, without sending anything (e.g. to train a
+        local model on answers already paid for, see bookingai_cascade)
+
+        Parameters
+        ----------
+        prompt : str
+           a prompt that may have been sent before, with the same model_params
+
+        Returns
+        -------
+        bool
+           True if the cached answer is a yes, None if there is no cache or the prompt is not in it
+        """
+        if self.cache is None:
+            return None
+
+        cached = self.cache.get(prompt, self.model_params)
+        if cached is None:
+            return None
+        if self.logprobs:
+            cached = json.loads(cached)['answer']
+        return self.is_yes(cached)
+
+    @bookingai_metrics.timed('gpt_query_list')
     def query_list(self, prompts):
-        """iterates over a list of queries, sending them one by one to chatgpt and populate the answers attribute with
-        a list of answers
+        """sends a list of queries concurrently to chatgpt and populates the answers attribute with a list of answers
+        at most max_workers prompts are in flight at once, answers keep the order of the prompts
         in this project the prompts are designed in a way that the answer is only either yes or no
+        an item of prompts can also be a list of prompts about chunks of the same listing, its answer is True if any of
+        the chunks got a yes
+        with logprobs, the confidences attribute gets the confidence of each answer: of its most certain yes chunk for
+        a yes, and of its least certain chunk for a no
 
         Parameters
         ----------
         prompts : list
            a list of prompts to send to chatgpt
         """
-        self.answers = self.response_to_bool([self.query_chatgpt(p) for p in prompts])
+        flat_prompts, owners = self.flatten_prompts(prompts)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self.query_answer, flat_prompts))
+
+        self.merge_results(len(prompts), owners, results)
+
+    def query_bulk(self, prompts, job_path='bookingai_bulk.jsonl', poll_seconds=60, max_requests=50000):
+        """same as query_list, but sends the prompts as an offline bulk job through the batch api (see
+        bookingai_bulk.BulkJob) instead of a request each: no rate limits and half the price, answered within a day
+        instead of at once. blocks until the job is done, the job can also be collected by a later call with the
+        same prompts and job_path, e.g. after a crash, without submitting anything again
+
+        Parameters
+        ----------
+        prompts : list
+           a list of prompts (or lists of chunk prompts) to send to chatgpt
+
+        job_path : str
+           the jsonl file the requests are written to, its state is kept next to it
+
+        poll_seconds : float
+           seconds between checks of the job's status
+
+        max_requests : int
+           max amount of requests in a single batch, more are split into several batches
+        """
+        import bookingai_bulk
+
+        flat_prompts, owners = self.flatten_prompts(prompts)
+        job = bookingai_bulk.BulkJob(job_path, self, max_requests, poll_seconds=poll_seconds)
+        self.merge_results(len(prompts), owners, job.run(flat_prompts))
+
+    @staticmethod
+    def flatten_prompts(prompts):
+        """returns the prompts with the chunk prompts of each listing one after the other, and the position in
+        prompts of each of them
+
+        Parameters
+        ----------
+        prompts : list
+           a list of prompts, or lists of chunk prompts about the same listing
+        """
+        flat_prompts = []
+        owners = []
+        for i, prompt in enumerate(prompts):
+            chunks = prompt if isinstance(prompt, list) else [prompt]
+            flat_prompts.extend(chunks)
+            owners.extend([i] * len(chunks))
+        return flat_prompts, owners
+
+    def merge_results(self, n_prompts, owners, results):
+        """populates the answers and confidences attributes out of the answers to flattened prompts (see
+        query_list), a listing asked about in several chunks gets a yes if any of them did
+
+        Parameters
+        ----------
+        n_prompts : int
+           amount of prompts before they were flattened
+
+        owners : list
+           the position of each flattened prompt, see flatten_prompts
+
+        results : list
+           (answer, confidence) of each flattened prompt, as returned by query_answer
+        """
+        self.response_to_bool([answer for answer, _ in results])
+
+        answers = [False] * n_prompts
+        for owner, answer in zip(owners, self.answers):
+            answers[owner] = answers[owner] or answer
+
+        confidences = [None] * n_prompts
+        if self.logprobs:
+            for owner, answer, (_, confidence) in zip(owners, self.answers, results):
+                if confidence is None or answer != answers[owner]:
+                    continue
+                current = confidences[owner]
+                if current is None:
+                    confidences[owner] = confidence
+                else:
+                    confidences[owner] = max(current, confidence) if answer else min(current, confidence)
+
+        self.answers = answers
+        self.confidences = confidences
+
+    def query_listing(self, prompt):
+        """sends the prompt about a single listing to chatgpt and returns the answer as a bool, without touching the
+        answers attribute, so it can be called from several threads at once (e.g. by a streaming pipeline)
+
+        Parameters
+        ----------
+        prompt : str or list
+           a prompt, or a list of prompts about chunks of the same listing (True if any of them got a yes)
+
+        Returns
+        -------
+        bool
+           True if the answer was yes
+        """
+        chunks = prompt if isinstance(prompt, list) else [prompt]
+        return any(self.is_yes(self.query_chatgpt(chunk)) for chunk in chunks)
+
+    @staticmethod
+    def parse_batch_answer(response, indices):
+        """reads an answer to a batched prompt, a json array of objects of the form {"index": 3, "answer": "yes"}
+        items that are malformed, answer something other than yes or no, or have an unexpected index are left out,
+        and so are indices that got two different answers. an answer with no text (None) has no valid answers
+
+        Parameters
+        ----------
+        response : str
+           the answer from chatgpt
+
+        indices : list
+           the listing indices that were asked about in the prompt
+
+        Returns
+        -------
+        dict
+           a dictionary of the valid answers, listing index to bool (True for yes)
+        """
+        if not isinstance(response, str):
+            return {}
+
+        start, end = response.find('['), response.rfind(']')
+        if start == -1 or end < start:
+            return {}
+
+        try:
+            items = json.loads(response[start:end + 1])
+        except ValueError:
+            return {}
+        if not isinstance(items, list):
+            return {}
+
+        expected = set(indices)
+        answers = {}
+        conflicts = set()
+
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+
+            index, answer = item.get('index'), item.get('answer')
+            if isinstance(index, str) and index.isdigit():
+                index = int(index)
+            if not isinstance(answer, str) or index not in expected:
+                continue
+
+            answer = ''.join(x for x in answer if x.isalpha()).lower()
+            if answer not in ('yes', 'no'):
+                continue
+
+            if index in answers and answers[index] != (answer == 'yes'):
+                conflicts.add(index)
+            answers[index] = answer == 'yes'
+
+        for index in conflicts:
+            del answers[index]
+
+        return answers
+
+    @bookingai_metrics.timed('gpt_query_batched')
+    def query_batched(self, batches, prompts):
+        """sends prompts about several listings at once concurrently to chatgpt, and populates the answers attribute
+        with a list of answers by the order of the listings
+        listings with a missing or malformed answer are asked again separately, using their own prompt from prompts
+
+        Parameters
+        ----------
+        batches : list
+           a list of (indices, prompt) tuples, as made by BookingBot.create_batched_prompts
+
+        prompts : list
+           a list of single listing prompts, as made by BookingBot.create_prompts, used as a fallback
+        """
+        def ask(batch):
+            indices, prompt = batch
+            # about 12 tokens per {"index": 0, "answer": "yes"} object, with some room to spare
+            max_tokens = max(self.model_params['max_tokens'], 16 * len(indices))
+            return self.parse_batch_answer(self.query_chatgpt(prompt, max_tokens=max_tokens), indices)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            answers = {}
+            for batch_answers in executor.map(ask, batches):
+                answers.update(batch_answers)
+
+        missing = [i for i in range(len(prompts)) if i not in answers]
+        self.batch_fallbacks = len(missing)
+        self.query_list([prompts[i] for i in missing])
+        for i, answer in zip(missing, self.answers):
+            answers[i] = answer
+
+        self.answers = [answers[i] for i in range(len(prompts))]
 
     def response_to_bool(self, responses):
         """takes in a list of yes and no answers and populates the attribute answers a list of bools (yes becomes True)
@@ -88,12 +913,72 @@ class GPThelper:
         responses : list
            a list of yes and no answers from chatgpt, by order of questions asked
         """
-        bools = []
-        for ans in responses:
-            ans = ''.join(x for x in ans if x.isalpha()).lower()
-            bools.append(ans == 'yes')
+        self.answers = [self.is_yes(ans) for ans in responses]
+
+    @staticmethod
+    def is_yes(response):
+        """returns True if an answer from chatgpt starts with yes, ignoring case and anything that is not a letter
+        (e.g. "Yes, it does." is a yes). a single token answer is read with one comparison. an answer with no text
+        (None, e.g. a response stopped by the content filter) is a no
+
+        Parameters
+        ----------
+        response : str
+           a yes or no answer from chatgpt
+        """
+        if not isinstance(response, str):
+            return False
+        words = response.split(maxsplit=1)
+        return bool(words) and ''.join(x for x in words[0] if x.isalpha()).lower() == 'yes'
+
+    @staticmethod
+    def answer_confidence(response, answer):
+        """returns how sure gpt was of a yes or no answer: the probability of the answer out of the probabilities of
+        yes and no as the first token, from the top logprobs of the response
 
-        self.answers = bools
+        Parameters
+        ----------
+        response : dict
+           a chat completion response, requested with logprobs
+
+        answer : str
+           the answer in the response
+
+        Returns
+        -------
+        float
+           between 0.5 and 1 for the most likely answer, None if the response has no logprobs or neither yes nor no is
+           in them
+        """
+        try:
+            top_logprobs = response['choices'][0]['logprobs']['content'][0]['top_logprobs']
+        except (KeyError, IndexError, TypeError):
+            return None
+
+        probabilities = {'yes': 0.0, 'no': 0.0}
+        for item in top_logprobs:
+            word = ''.join(x for x in item['token'] if x.isalpha()).lower()
+            if word in probabilities:
+                probabilities[word] += math.exp(item['logprob'])
+
+        total = probabilities['yes'] + probabilities['no']
+        if total == 0:
+            return None
+        return probabilities['yes' if GPThelper.is_yes(answer) else 'no'] / total
+
+    def uncertain(self):
+        """returns the indices of the answers of the last query_list with a confidence under min_confidence, an empty
+        list if logprobs is False
+
+        Returns
+        -------
+        list
+           indices in the answers attribute
+        """
+        if self.confidences is None:
+            return []
+        return [i for i, confidence in enumerate(self.confidences)
+                if confidence is not None and confidence < self.min_confidence]
 
     def string_results(self):
         """returns a string describing which entries got a yes answer from chatgpt
@@ -0,0 +1,164 @@
+import os
+import pandas as pd
+
+
+# columns of a listings dataset and their types, a columnar file always keeps them
+DATA_COLUMNS = ['name', 'price', 'score', 'link', 'text']
+SUMMARY_COLUMNS = ['name', 'price', 'score', 'link']
+DTYPES = {'name': 'string', 'price': 'Int64', 'score': 'float64', 'link': 'string', 'text': 'string'}
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+
+
+def is_columnar(path):
+    """returns True if a dataset path is of a columnar format (parquet or arrow ipc), by its extension
+
+    Parameters
+    ----------
+    path : str
+        path to a dataset file
+    """
+    return path is not None and os.path.splitext(path)[1].lower() in PARQUET_EXTENSIONS + ARROW_EXTENSIONS
+
+
+def data_schema(columns=None):
+    """returns the arrow schema of a listings dataset, or of some of its columns"""
+    import pyarrow as pa
+
+    types = {'name': pa.string(), 'price': pa.int64(), 'score': pa.float64(), 'link': pa.string(),
+             'text': pa.string()}
+    return pa.schema([(column, types[column]) for column in (columns or DATA_COLUMNS)])
+
+
+def save_frame(data, path):
+    """saves a listings dataframe by the extension of path: parquet (.parquet), arrow ipc (.arrow, .feather) or csv
+    columnar files are saved with explicit types, arrow ipc files uncompressed so they can be memory mapped
+
+    Parameters
+    ----------
+    data : dataframe
+        listings with the columns name, price, score, link, text
+
+    path : str
+        path to save the dataset in
+    """
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension not in PARQUET_EXTENSIONS + ARROW_EXTENSIONS:
+        data.to_csv(path, index=False)
+        return
+
+    import pyarrow as pa
+    import pyarrow.feather
+    import pyarrow.parquet
+
+    columns = [column for column in DATA_COLUMNS if column in data.columns]
+    frame = data[columns].astype({column: DTYPES[column] for column in columns})
+    table = pa.Table.from_pandas(frame, schema=data_schema(columns), preserve_index=False)
+
+    if extension in PARQUET_EXTENSIONS:
+        pyarrow.parquet.write_table(table, path)
+    else:
+        pyarrow.feather.write_feather(table, path, compression='uncompressed')
+
+
+def load_frame(path, columns=None):
+    """loads a listings dataframe, reading only the given columns
+    columnar files are memory mapped and only the requested columns are read, the values stay in arrow memory
+    (pandas ArrowDtype) instead of becoming python objects. a csv is always parsed in full, then the columns are picked
+
+    Parameters
+    ----------
+    path : str
+        path to a dataset saved by save_frame (or any csv of listings)
+
+    columns : list
+        names of the columns to load, all of them if None
+
+    Returns
+    -------
+    dataframe
+        the loaded listings
+    """
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in PARQUET_EXTENSIONS:
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(path, columns=columns, memory_map=True)
+    elif extension in ARROW_EXTENSIONS:
+        import pyarrow as pa
+        # zero copy, the columns point into the mapped file
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        if columns is not None:
+            table = table.select(columns)
+    else:
+        data = pd.read_csv(path, usecols=columns)
+        return data[columns] if columns is not None else data
+
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def iter_frames(path, chunksize=1000, columns=None, skip=0):
+    """yields a listings dataset a chunk of rows at a time, so a dataset too big for memory can be gone over with
+    only one chunk loaded at once. csv files are parsed chunk by chunk, parquet files read a batch at a time and arrow
+    ipc files memory mapped and sliced
+
+    Parameters
+    ----------
+    path : str
+        path to a dataset saved by save_frame (or any csv of listings)
+
+    chunksize : int
+        max amount of rows in each chunk
+
+    columns : list
+        names of the columns to load, all of them if None
+
+    skip : int
+        amount of rows to skip from the start (e.g. rows already gone over), whole parquet row groups are skipped
+        without reading them
+
+    Yields
+    ------
+    dataframe
+        the next chunk of rows, indexed by the position of each row in the dataset
+    """
+    extension = os.path.splitext(path)[1].lower()
+    position = 0
+
+    if extension in PARQUET_EXTENSIONS:
+        import pyarrow.parquet
+        parquet_file = pyarrow.parquet.ParquetFile(path, memory_map=True)
+        row_groups = []
+        for i in range(parquet_file.num_row_groups):
+            rows = parquet_file.metadata.row_group(i).num_rows
+            if not row_groups and position + rows <= skip:
+                position += rows
+                continue
+            row_groups.append(i)
+        batches = parquet_file.iter_batches(batch_size=chunksize, row_groups=row_groups, columns=columns)
+        frames = (batch.to_pandas(types_mapper=pd.ArrowDtype) for batch in batches)
+    elif extension in ARROW_EXTENSIONS:
+        import pyarrow as pa
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        # slicing the mapped table is zero copy
+        position = min(skip, table.num_rows)
+        batches = table.slice(position).to_batches(max_chunksize=chunksize)
+        frames = (batch.to_pandas(types_mapper=pd.ArrowDtype) for batch in batches)
+    else:
+        frames = pd.read_csv(path, usecols=columns, chunksize=chunksize)
+
+    for frame in frames:
+        if position + len(frame) <= skip:
+            position += len(frame)
+            continue
+
+        frame = frame.iloc[max(0, skip - position):]
+        frame.index = pd.RangeIndex(max(position, skip), max(position, skip) + len(frame))
+        position = frame.index.stop
+        if columns is not None:
+            frame = frame[columns]
+        yield frame
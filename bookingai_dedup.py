@@ -0,0 +1,224 @@
+import numpy as np
+import pandas as pd
+import re
+import zlib
+
+
+# parts of sentences booking.com adds to many descriptions, they make unrelated listings look alike
+BOILERPLATE = (
+    'couples in particular like the location',
+    'distance in property description is calculated using',
+    'we speak your language',
+    "this is our guests' favorite part of",
+    "this is our guests' favourite part of",
+    'got more for their money',
+)
+
+# an odd 64 bit constant, mixing the word hashes of a shingle into one hash
+SHINGLE_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def normalize_text(text, name=None):
+    """returns a description without what tells near duplicates apart but says nothing about the listing itself: case,
+    whitespace, punctuation, booking.com boilerplate, the listing's own name and distances (every number becomes 0)
+    e.g. two listings of a hotel chain, "Hotel X Haifa is 2.3 miles from the beach" and "Hotel X Eilat is 0.4 miles
+    from the beach", normalize to the same text
+
+    Parameters
+    ----------
+    text : str
+        a description, None or nan counts as empty
+
+    name : str
+        if not None, the name of the listing, removed from its description
+    """
+    if text is None or (isinstance(text, float) and np.isnan(text)):
+        return ''
+
+    text = str(text).lower()
+    if name is not None and not (isinstance(name, float) and np.isnan(name)) and str(name).strip():
+        text = text.replace(str(name).lower(), ' ')
+    if any(phrase in text for phrase in BOILERPLATE):
+        sentences = re.split(r'(?<=[.!?])\s+', text)
+        text = ' '.join(sentence for sentence in sentences if not any(phrase in sentence for phrase in BOILERPLATE))
+    text = re.sub(r'\d+(?:[.,]\d+)*', '0', text)
+    return ' '.join(re.findall(r'\w+', text))
+
+
+def shingles(text, size=4):
+    """returns the 32 bit hashes of the shingles of a normalized text, its runs of size consecutive words, a text
+    shorter than size is a single shingle
+
+    Parameters
+    ----------
+    text : str
+        a text returned by normalize_text
+
+    size : int
+        amount of words in each shingle
+
+    Returns
+    -------
+    array
+        unique hashes, as uint64
+    """
+    words = text.split() or ['']
+    hashes = np.fromiter((zlib.crc32(word.encode()) for word in words), dtype=np.uint64, count=len(words))
+    n_shingles = max(1, len(words) - size + 1)
+
+    # each word hash is mixed into the ones before it, a shingle of several words is a hash of their order too
+    mixed = np.zeros(n_shingles, dtype=np.uint64)
+    for offset in range(min(size, len(words))):
+        mixed = mixed * SHINGLE_MULTIPLIER + hashes[offset:offset + n_shingles]
+    return np.unique(mixed * SHINGLE_MULTIPLIER >> np.uint64(32))
+
+
+class NearDuplicates:
+    """
+    groups listings whose descriptions are near duplicates (e.g. listings of a hotel chain, or several apartments of
+    the same aparthotel), so a question is asked about one listing of each group and its answer is given to the rest
+    the descriptions are normalized (see normalize_text) and cut into word shingles, two descriptions are near
+    duplicates if the jaccard similarity of their shingles is at least threshold. the similarity is estimated with
+    minhash signatures, and locality sensitive hashing of the signatures (bands of rows, a listing is only compared
+    with listings that share a band with it) finds the similar listings without comparing every pair, so building the
+    groups takes about linear time in the amount of listings
+
+    Parameters
+    ----------
+    texts : series
+        the descriptions, the index of the series is kept in the results
+
+    names : series
+        if not None, the names of the listings, aligned with texts, removed from their descriptions
+
+    threshold : float
+        least estimated jaccard similarity of two descriptions in the same group
+
+    num_perm : int
+        amount of hash functions in each minhash signature, more is more accurate and slower
+
+    bands : int
+        amount of bands the signature is cut into, must divide num_perm. more bands find pairs of lower similarity
+        (more candidates to compare)
+
+    shingle_size : int
+        amount of words in each shingle
+
+    seed : int
+        seed of the hash functions
+
+    Attributes
+    ----------
+    signatures : array
+        the minhash signature of each description, a row each
+
+    representatives : series
+        the label of the first listing of each listing's group (itself for the first one), aligned with texts
+
+    Methods
+    -------
+    similarity(a, b)
+        returns the estimated jaccard similarity of the descriptions of two listings
+
+    groups()
+        returns the groups of more than one listing
+
+    collapse(labels)
+        returns, for some of the listings, the listing asked about in place of each one
+    """
+    def __init__(self, texts, names=None, threshold=0.9, num_perm=128, bands=16, shingle_size=4, seed=0):
+        if num_perm % bands:
+            raise ValueError('bands must divide num_perm')
+        if not 0 < threshold <= 1:
+            raise ValueError('threshold must be above 0 and at most 1')
+
+        texts = pd.Series(texts)
+        self.labels = texts.index
+        self.threshold = threshold
+        self.bands = bands
+
+        # multiply shift hashing: for random odd 64 bit a, the high 32 bits of a * hash + b (wrapping around 2 ** 64)
+        # are a random hash of hash, one for each of the num_perm pairs
+        rng = np.random.default_rng(seed)
+        a = rng.integers(0, np.iinfo(np.uint64).max, num_perm, dtype=np.uint64, endpoint=True)[:, None] | np.uint64(1)
+        b = rng.integers(0, np.iinfo(np.uint64).max, num_perm, dtype=np.uint64, endpoint=True)[:, None]
+
+        names = [None] * len(texts) if names is None else list(names)
+        self.signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+        for position, (text, name) in enumerate(zip(texts, names)):
+            hashes = shingles(normalize_text(text, name), shingle_size)[None, :]
+            self.signatures[position] = ((a * hashes + b) >> np.uint64(32)).min(axis=1)
+
+        self.representatives = pd.Series(self._group(), index=self.labels)
+
+    def _group(self):
+        """returns the label of the representative of each listing: the first listing before it sharing a band with
+        it and similar enough to it, itself if there is none. only representatives go into the buckets, so every
+        listing of a group is within threshold of the listing asked about it"""
+        rows = self.signatures.shape[1] // self.bands
+        buckets = [dict() for _ in range(self.bands)]
+        representatives = []
+
+        for position, signature in enumerate(self.signatures):
+            keys = [signature[band * rows:(band + 1) * rows].tobytes() for band in range(self.bands)]
+
+            found = None
+            checked = set()
+            for bucket, key in zip(buckets, keys):
+                for candidate in bucket.get(key, ()):
+                    if candidate in checked:
+                        continue
+                    checked.add(candidate)
+                    if np.mean(self.signatures[candidate] == signature) >= self.threshold:
+                        found = candidate
+                        break
+                if found is not None:
+                    break
+
+            if found is None:
+                found = position
+                for bucket, key in zip(buckets, keys):
+                    bucket.setdefault(key, []).append(position)
+            representatives.append(self.labels[found])
+
+        return representatives
+
+    def similarity(self, a, b):
+        """returns the estimated jaccard similarity of the shingles of two listings' descriptions
+
+        Parameters
+        ----------
+        a, b : object
+            index labels of the listings
+        """
+        a, b = self.labels.get_loc(a), self.labels.get_loc(b)
+        return float(np.mean(self.signatures[a] == self.signatures[b]))
+
+    def groups(self):
+        """returns the groups of near duplicates with more than one listing
+
+        Returns
+        -------
+        list
+            lists of index labels, each starting with its representative
+        """
+        groups = self.representatives.groupby(self.representatives, sort=False).groups
+        return [list(labels) for labels in groups.values() if len(labels) > 1]
+
+    def collapse(self, labels):
+        """returns which listing to ask about in place of each of some listings: the first of them in its group, so a
+        group is still asked about once if its representative is not among labels
+
+        Parameters
+        ----------
+        labels : index
+            labels of the listings to ask about, e.g. the ones that passed the filters
+
+        Returns
+        -------
+        series
+            the label of the listing asked about, indexed by labels. its unique values are the listings to ask about
+        """
+        representatives = self.representatives[labels]
+        asked = pd.Series(labels, index=labels)
+        return representatives.map(asked.groupby(representatives.values, sort=False).first())
@@ -0,0 +1,678 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import csv
+import hashlib
+import html
+import json
+import math
+import os
+import random
+import re
+import collections
+import threading
+import time
+import urllib.parse
+
+
+def question_keywords(question):
+    """returns the meaningful words of a question, used by the fake answers"""
+    words = [''.join(c for c in w if c.isalpha()) for w in question.lower().split()]
+    return [w for w in words if len(w) > 3 and w not in ('does', 'this', 'room', 'have', 'there', 'listing')]
+
+
+def keyword_answer(prompt):
+    """a naive stand-in for chatgpt: answers "yes" if any word of the question shows up in the description
+    expects prompts made with prompt_format.txt, or with prompt_format_batch.txt in which case it answers with a json
+    array of answers about each listing
+
+    Parameters
+    ----------
+    prompt : str
+        a prompt created by BookingBot.create_prompt or BookingBot.create_batched_prompts
+
+    Returns
+    -------
+    str
+        "yes" or "no", or a json array of answers for batched prompts
+    """
+    try:
+        question = prompt.split('the question is:')[1].splitlines()[1]
+    except IndexError:
+        return 'no'
+    words = question_keywords(question)
+
+    if 'These are the descriptions:' in prompt:
+        body = prompt.split('These are the descriptions:')[1].split('the question is:')[0]
+        listings = re.split(r'^listing (\d+):$', body, flags=re.MULTILINE)[1:]
+
+        answers = []
+        for index, description in zip(listings[::2], listings[1::2]):
+            answer = 'yes' if any(w in description.lower() for w in words) else 'no'
+            answers.append({'index': int(index), 'answer': answer})
+        return json.dumps(answers)
+
+    if 'This is the description:' not in prompt:
+        return 'no'
+
+    description = prompt.split('This is the description:')[1].split('the question is:')[0].lower()
+    return 'yes' if any(w in description for w in words) else 'no'
+
+
+class FakeServer:
+    """
+    a local http server running in a background thread, the base of the fake servers in this file
+    subclasses implement handle(method, path, body)
+
+    Parameters
+    ----------
+    latency : float
+        seconds each request takes before it is answered
+
+    Attributes
+    ----------
+    request_count : int
+        amount of requests received so far, including failed ones
+
+    max_in_flight : int
+        the highest amount of requests handled at the same time
+
+    base_url : str
+        the url of the server, e.g. http://127.0.0.1:8000
+
+    Methods
+    -------
+    handle(method, path, body)
+        returns the status, content type and body of the response to a request
+
+    start()
+        starts serving in a background thread, returns the server itself
+
+    stop()
+        shuts the server down
+    """
+    def __init__(self, latency=0.05, host='127.0.0.1', port=0):
+        self.latency = latency
+
+        self.request_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # headers and body are written separately, with nagle each response would wait for a delayed ack
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def respond(self, method):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length) if length else b''
+                status, content_type, data = server.dispatch(method, self.path, body)
+
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self.respond('GET')
+
+            def do_POST(self):
+                self.respond('POST')
+
+        return Handler
+
+    def dispatch(self, method, path, body):
+        """counts the request, waits latency seconds and passes it on to handle"""
+        with self.lock:
+            self.request_count += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        try:
+            time.sleep(self.latency)
+            return self.handle(method, path, body)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def handle(self, method, path, body):
+        """returns the status, content type and body of the response to a request, subclasses must override it"""
+        raise NotImplementedError
+
+    @staticmethod
+    def json_response(status, body):
+        return status, 'application/json', json.dumps(body).encode()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeChatServer(FakeServer):
+    """
+    a local http server that imitates openai's chat completions endpoint, used to test GPThelper without network
+    point GPThelper at it with api_base=server.api_base
+
+    Parameters
+    ----------
+    latency : float
+        seconds each request takes before it is answered
+
+    rate_limit_every : int
+        if not 0, every n-th request is answered with a 429 error
+
+    error_every : int
+        if not 0, every n-th request is answered with a 500 error
+
+    answer_fn : function
+        takes in the prompt and returns the answer text, defaults to keyword_answer
+
+    requests_per_minute : int
+        if not 0, requests above this amount in the last 60 seconds are answered with a 429 error, like openai's limit
+
+    latency_jitter : float
+        if not 0, each request takes up to this amount of seconds more than latency, at random
+
+    token_latency : float
+        seconds it takes to generate each token of the answer, on top of latency, like a real model decoding
+
+    max_concurrency : int
+        if not 0, requests above this amount at the same time are answered with a 429 error, like an overloaded
+        organization or proxy
+
+    verbose : bool
+        if True, answers with a sentence that starts with yes or no (e.g. "Yes, the description mentions it."), as
+        chat models tend to, cut at the max_tokens of the request. a request with a logit_bias gets a yes or no alone
+
+    Attributes
+    ----------
+    api_base : str
+        the url to use as api_base for openai
+
+    completion_tokens : int
+        amount of answer tokens generated so far
+    """
+    VERBOSE_ENDINGS = {
+        'yes': ', the description mentions it, so the answer to the question is yes.',
+        'no': ', the description does not mention anything about it, so the answer is no.',
+    }
+
+    def __init__(self, latency=0.05, rate_limit_every=0, error_every=0, answer_fn=None, requests_per_minute=0,
+                 latency_jitter=0, token_latency=0, verbose=False, max_concurrency=0, host='127.0.0.1', port=0):
+        super().__init__(latency, host, port)
+        self.rate_limit_every = rate_limit_every
+        self.error_every = error_every
+        self.answer_fn = answer_fn if answer_fn is not None else keyword_answer
+        self.requests_per_minute = requests_per_minute
+        self.latency_jitter = latency_jitter
+        self.token_latency = token_latency
+        self.verbose = verbose
+        self.max_concurrency = max_concurrency
+        self.completion_count = 0
+        self.completion_tokens = 0
+        self.rate_limited_count = 0
+        self.recent = collections.deque()
+
+    @property
+    def api_base(self):
+        return f'{self.base_url}/v1'
+
+    def handle(self, method, path, body):
+        """answers chat completion requests, failing every n-th one if rate_limit_every or error_every are set"""
+        if method != 'POST' or not path.endswith('/chat/completions'):
+            return self.json_response(404, {'error': {'message': f'unknown path {path}',
+                                                      'type': 'invalid_request_error'}})
+
+        if self.latency_jitter:
+            time.sleep(random.uniform(0, self.latency_jitter))
+
+        with self.lock:
+            self.completion_count += 1
+            n = self.completion_count
+
+            # sliding window of the requests accepted in the last minute
+            now = time.monotonic()
+            while self.recent and self.recent[0] <= now - 60:
+                self.recent.popleft()
+            over_limit = self.requests_per_minute and len(self.recent) >= self.requests_per_minute
+            over_limit = over_limit or (self.max_concurrency and self.in_flight > self.max_concurrency)
+            if not over_limit:
+                self.recent.append(now)
+
+        if over_limit or (self.rate_limit_every and n % self.rate_limit_every == 0):
+            with self.lock:
+                self.rate_limited_count += 1
+            return self.json_response(429, {'error': {'message': 'rate limit reached', 'type': 'rate_limit_exceeded'}})
+        if self.error_every and n % self.error_every == 0:
+            return self.json_response(500, {'error': {'message': 'server error', 'type': 'server_error'}})
+
+        return self.json_response(200, self.completion(json.loads(body or b'{}'), n))
+
+    @staticmethod
+    def answer_probability(prompt):
+        """returns a made up probability of the answer to a prompt, between 0.5 and 1, the same for the same prompt"""
+        digest = hashlib.sha256(prompt.encode()).digest()
+        return 0.5 + 0.5 * int.from_bytes(digest[:4], 'big') / 2 ** 32
+
+    def completion(self, request, n):
+        """builds a chat completion response body in openai's format, with logprobs of the first token if asked"""
+        prompt = '\n'.join(m['content'] for m in request.get('messages', []))
+        answer = self.answer_fn(prompt)
+        prompt_tokens = len(prompt) // 4
+
+        if answer in self.VERBOSE_ENDINGS and self.verbose and not request.get('logit_bias'):
+            answer = answer.capitalize() + self.VERBOSE_ENDINGS[answer]
+
+        # about 4 characters per token, cut at max_tokens
+        max_tokens = request.get('max_tokens') or 2 ** 31
+        tokens = re.findall(r'.{1,4}', answer, flags=re.DOTALL) or ['']
+        finish_reason = 'length' if len(tokens) > max_tokens else 'stop'
+        tokens = tokens[:max_tokens]
+        if request.get('logit_bias') and answer in ('yes', 'no'):
+            tokens = [answer]
+        answer = ''.join(tokens)
+
+        if self.token_latency:
+            time.sleep(self.token_latency * len(tokens))
+        with self.lock:
+            self.completion_tokens += len(tokens)
+
+        choice = {'index': 0, 'message': {'role': 'assistant', 'content': answer}, 'finish_reason': finish_reason}
+        if request.get('logprobs'):
+            probability = self.answer_probability(prompt)
+            first = tokens[0]
+            other = {'yes': 'no', 'no': 'yes'}.get(''.join(c for c in first if c.isalpha()).lower(), 'no')
+            top = [{'token': first, 'logprob': math.log(probability)},
+                   {'token': other, 'logprob': math.log(1 - probability)}]
+            choice['logprobs'] = {'content': [{'token': first, 'logprob': math.log(probability),
+                                               'top_logprobs': top[:request.get('top_logprobs') or 1]}]}
+
+        return {
+            'id': f'chatcmpl-fake-{n}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'fake'),
+            'choices': [choice],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(tokens),
+                      'total_tokens': prompt_tokens + len(tokens)},
+        }
+
+
+class FakeBatchServer(FakeChatServer):
+    """
+    a FakeChatServer that also imitates openai's batch api: files are uploaded to /v1/files, a batch of the chat
+    completion requests in a jsonl file is created at /v1/batches and run in a background thread, its status is read
+    at /v1/batches/{id} and its results downloaded from /v1/files/{id}/content, used to test BulkJob without network
+
+    Parameters
+    ----------
+    batch_delay : float
+        seconds a batch waits (validating) before its requests are run
+
+    batch_request_seconds : float
+        seconds each request of a batch takes, one after the other
+
+    batch_error_every : int
+        if not 0, every n-th request of a batch fails and goes to its error file
+
+    fail_batches : bool
+        if True, every batch fails without running any request, as a batch whose file is invalid
+
+    **chat_args
+        passed to FakeChatServer, the answers are made the same way
+
+    Attributes
+    ----------
+    files : dict
+        file id to its content (bytes)
+
+    batches : dict
+        batch id to the batch object, as returned by the api
+    """
+    def __init__(self, batch_delay=0.5, batch_request_seconds=0, batch_error_every=0, fail_batches=False,
+                 **chat_args):
+        super().__init__(**chat_args)
+        self.batch_delay = batch_delay
+        self.batch_request_seconds = batch_request_seconds
+        self.batch_error_every = batch_error_every
+        self.fail_batches = fail_batches
+        self.files = {}
+        self.batches = {}
+
+    @staticmethod
+    def parse_upload(body):
+        """returns the fields of a multipart/form-data body as a dict of name to bytes, the boundary is its first
+        line"""
+        boundary = body.split(b'\r\n', 1)[0]
+        fields = {}
+        for part in body.split(boundary)[1:-1]:
+            headers, _, value = part.strip(b'\r\n').partition(b'\r\n\r\n')
+            name = re.search(rb'name="([^"]*)"', headers).group(1).decode()
+            fields[name] = value
+        return fields
+
+    def add_file(self, content, purpose):
+        """stores a file and returns its file object"""
+        with self.lock:
+            file_id = f'file-fake-{len(self.files) + 1}'
+            self.files[file_id] = content
+        return {'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()),
+                'purpose': purpose}
+
+    def handle(self, method, path, body):
+        """answers the files and batches endpoints, the rest goes to FakeChatServer"""
+        path = urllib.parse.urlparse(path).path
+
+        if method == 'POST' and path.endswith('/v1/files'):
+            fields = self.parse_upload(body)
+            return self.json_response(200, self.add_file(fields['file'], fields.get('purpose', b'').decode()))
+
+        match = re.fullmatch(r'.*/v1/files/([\w-]+)/content', path)
+        if method == 'GET' and match:
+            if match.group(1) not in self.files:
+                return self.json_response(404, {'error': {'message': 'no such file', 'type': 'invalid_request_error'}})
+            return 200, 'application/octet-stream', self.files[match.group(1)]
+
+        if method == 'POST' and path.endswith('/v1/batches'):
+            request = json.loads(body or b'{}')
+            if request.get('input_file_id') not in self.files:
+                return self.json_response(400, {'error': {'message': 'no such file', 'type': 'invalid_request_error'}})
+            with self.lock:
+                batch_id = f'batch_fake_{len(self.batches) + 1}'
+                batch = {'id': batch_id, 'object': 'batch', 'endpoint': request.get('endpoint'),
+                         'input_file_id': request['input_file_id'],
+                         'completion_window': request.get('completion_window'), 'status': 'validating',
+                         'output_file_id': None, 'error_file_id': None, 'created_at': int(time.time()),
+                         'request_counts': {'total': 0, 'completed': 0, 'failed': 0}}
+                self.batches[batch_id] = batch
+            threading.Thread(target=self.run_batch, args=(batch_id,), daemon=True).start()
+            return self.json_response(200, dict(batch))
+
+        match = re.fullmatch(r'.*/v1/batches/([\w-]+)', path)
+        if method == 'GET' and match:
+            if match.group(1) not in self.batches:
+                return self.json_response(404, {'error': {'message': 'no such batch', 'type': 'invalid_request_error'}})
+            with self.lock:
+                return self.json_response(200, dict(self.batches[match.group(1)]))
+
+        return super().handle(method, path, body)
+
+    def run_batch(self, batch_id):
+        """runs the requests of a batch one after the other, then stores its output and error files"""
+        time.sleep(self.batch_delay)
+        batch = self.batches[batch_id]
+
+        if self.fail_batches:
+            with self.lock:
+                batch['status'] = 'failed'
+                batch['errors'] = {'data': [{'code': 'invalid_file', 'message': 'the file could not be read'}]}
+            return
+
+        lines = [json.loads(line) for line in self.files[batch['input_file_id']].splitlines() if line.strip()]
+        with self.lock:
+            batch['status'] = 'in_progress'
+            batch['request_counts']['total'] = len(lines)
+
+        output, errors = [], []
+        for n, line in enumerate(lines, 1):
+            if self.batch_request_seconds:
+                time.sleep(self.batch_request_seconds)
+            with self.lock:
+                self.completion_count += 1
+                request_id = self.completion_count
+
+            if self.batch_error_every and n % self.batch_error_every == 0:
+                errors.append({'id': f'batch_req_{request_id}', 'custom_id': line['custom_id'],
+                               'response': {'status_code': 500, 'request_id': str(request_id),
+                                            'body': {'error': {'message': 'server error', 'type': 'server_error'}}},
+                               'error': None})
+                counter = 'failed'
+            else:
+                output.append({'id': f'batch_req_{request_id}', 'custom_id': line['custom_id'],
+                               'response': {'status_code': 200, 'request_id': str(request_id),
+                                            'body': self.completion(line['body'], request_id)},
+                               'error': None})
+                counter = 'completed'
+            with self.lock:
+                batch['request_counts'][counter] += 1
+
+        with self.lock:
+            batch['status'] = 'finalizing'
+        output_file = self.add_file(''.join(json.dumps(item) + '\n' for item in output).encode(), 'batch_output')
+        error_file = self.add_file(''.join(json.dumps(item) + '\n' for item in errors).encode(), 'batch_output') \
+            if errors else None
+        with self.lock:
+            batch['output_file_id'] = output_file['id']
+            batch['error_file_id'] = error_file['id'] if error_file else None
+            batch['status'] = 'completed'
+
+
+def listings_from_csv(csv_path):
+    """reads listings from a csv made by BookingBot.save_search_data, to be served by FakeBookingServer
+
+    Parameters
+    ----------
+    csv_path : str
+        path to the csv
+
+    Returns
+    -------
+    list
+        a list of dicts with the keys name, price, score, text
+    """
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        return [{'name': row['name'], 'price': int(row['price']), 'score': float(row['score']), 'text': row['text']}
+                for row in csv.DictReader(f)]
+
+
+def synthetic_listings(amount, csv_path='inputs_outputs/results.csv', seed=0):
+    """returns amount listings made out of the listings of a csv, repeated with unique names and varied prices and
+    scores, for benchmarks bigger than the csv
+
+    Parameters
+    ----------
+    amount : int
+        amount of listings
+
+    csv_path : str
+        csv of real listings to repeat (see listings_from_csv)
+
+    seed : int
+        seed of the random prices and scores, the same seed gives the same listings
+    """
+    base = listings_from_csv(csv_path)
+    rng = random.Random(seed)
+
+    listings = []
+    for i in range(amount):
+        listing = dict(base[i % len(base)])
+        if i >= len(base):
+            listing['name'] = f'{listing["name"]} {i}'
+            listing['price'] = max(50, int(listing['price'] * rng.uniform(0.7, 1.3)))
+            listing['score'] = round(min(10.0, max(5.0, listing['score'] + rng.uniform(-1, 1))), 1)
+        listings.append(listing)
+    return listings
+
+
+def slugify(name):
+    """returns the url name of a listing page, names with no latin letters get a name made of their hash"""
+    slug = re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+    return slug if slug else 'hotel-' + hashlib.md5(name.encode()).hexdigest()[:10]
+
+
+class FakeBookingServer(FakeServer):
+    """
+    a local http server that imitates booking.com search results and listing pages, with the same html structure the
+    bot scrapes. pages are rendered from a list of listings, or served as saved html files from a fixtures folder
+
+    Parameters
+    ----------
+    listings : list
+        a list of dicts with the keys name, price, score, text (see listings_from_csv)
+
+    latency : float
+        seconds each request takes before it is answered
+
+    fixtures_dir : str
+        if not None, a folder of saved html pages, served by their path (e.g. hotel/il/prima-link.html)
+
+    assets : int
+        amount of images each rendered page shows, as the real pages do, along with a web font. the bot only reads the
+        text, so these only cost a browser time and memory (see bookingai_browser)
+
+    Attributes
+    ----------
+    ASSET_KB : int
+        size of each image and font in kb
+
+    links : list
+        the url of each listing's page, by the order of listings
+
+    search_url : str
+        the url of the first search results page
+
+    PAGE_SIZE : int
+        amount of property cards in each search results page
+
+    Methods
+    -------
+    listing_html(listing)
+        returns the html of a listing page
+
+    search_html(offset, rows)
+        returns the html of a search results page, with the property cards the bot scrapes and a next page button
+    """
+    PAGE_SIZE = 25
+
+    SEARCH_TEMPLATE = (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>search results</title></head><body>'
+        '<div id="search_results_table">{cards}</div>'
+        '<button aria-label="Next page" data-href="{next_href}" onclick="window.location.href=this.dataset.href"'
+        '{disabled}>next</button></body></html>'
+    )
+
+    CARD_TEMPLATE = (
+        '<div data-testid="property-card"><h3><a data-testid="title-link" href="{link}">'
+        '<div data-testid="title">{name}</div><span>Opens in new window</span></a></h3>'
+        '<div class="a3b8729ab1 d86cee9b25">{score}</div>'
+        '<span data-testid="price-and-discounted-price">₪&nbsp;{price:,}</span></div>'
+    )
+
+    LISTING_TEMPLATE = (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>{name}</title></head><body>'
+        '<h2 class="pp-header__title">{name}</h2>'
+        '<div class="hp-description k2-hp_main_desc--collapsed"><div>'
+        '<p class="a53cbfa6de b3efd73f69">{text}</p>'
+        '</div></div></body></html>'
+    )
+
+    ASSETS_TEMPLATE = (
+        '<style>@font-face {{font-family: "fake"; src: url("/static/font.woff2") format("woff2");}} '
+        'body {{font-family: "fake";}}</style><div class="gallery">{images}</div>'
+    )
+
+    ASSET_KB = 64
+
+    def __init__(self, listings=(), latency=0.05, fixtures_dir=None, assets=0, host='127.0.0.1', port=0):
+        super().__init__(latency, host, port)
+        self.listings = list(listings)
+        self.fixtures_dir = fixtures_dir
+        self.assets = assets
+        self.slugs = {slugify(listing['name']): listing for listing in self.listings}
+
+    @property
+    def links(self):
+        return [f'{self.base_url}/hotel/il/{slugify(listing["name"])}.html?label=fake&checkin=2023-10-14'
+                for listing in self.listings]
+
+    @property
+    def search_url(self):
+        return f'{self.base_url}/searchresults.html?offset=0'
+
+    def search_html(self, offset=0, rows=None):
+        """returns the html of a search results page, the cards of rows listings starting at offset
+
+        Parameters
+        ----------
+        offset : int
+            position of the first listing in the page
+
+        rows : int
+            amount of listings in the page, PAGE_SIZE if None
+        """
+        rows = rows or self.PAGE_SIZE
+        cards = []
+        for listing in self.listings[offset:offset + rows]:
+            link = f'/hotel/il/{slugify(listing["name"])}.html?label=fake&amp;sr_order=popularity'
+            cards.append(self.CARD_TEMPLATE.format(link=link, name=html.escape(listing['name']),
+                                                   score=listing['score'], price=listing['price']))
+
+        has_next = offset + rows < len(self.listings)
+        next_href = f'/searchresults.html?offset={offset + rows}'
+        page = self.SEARCH_TEMPLATE.format(cards=''.join(cards), next_href=next_href,
+                                           disabled='' if has_next else ' disabled')
+        return self.with_assets(page, f'search{offset}')
+
+    def listing_html(self, listing):
+        """returns the html of a listing page, the description comes from the listing's text"""
+        text = html.escape(listing['text']).replace('\n', '<br>')
+        page = self.LISTING_TEMPLATE.format(name=html.escape(listing['name']), text=text)
+        return self.with_assets(page, slugify(listing['name']))
+
+    def with_assets(self, page, prefix):
+        """adds the images and the web font of a page to its html, images are named after the page so a browser
+        can not reuse them from its cache across pages"""
+        if not self.assets:
+            return page
+
+        images = ''.join(f'<img src="/static/{prefix}-{i}.jpg" width="300" height="200">' for i in range(self.assets))
+        return page.replace('</body>', self.ASSETS_TEMPLATE.format(images=images) + '</body>')
+
+    def handle(self, method, path, body):
+        if self.fixtures_dir is not None:
+            file_path = os.path.join(self.fixtures_dir, urllib.parse.urlsplit(path).path.lstrip('/'))
+            if os.path.isfile(file_path):
+                with open(file_path, 'rb') as f:
+                    return 200, 'text/html; charset=utf-8', f.read()
+
+        parts = urllib.parse.urlsplit(path)
+        if parts.path.startswith('/static/'):
+            content_type = 'font/woff2' if parts.path.endswith('.woff2') else 'image/jpeg'
+            return 200, content_type, bytes(self.ASSET_KB * 1024)
+
+        if parts.path == '/searchresults.html':
+            query = urllib.parse.parse_qs(parts.query)
+            page = self.search_html(int(query.get('offset', ['0'])[0]), int(query.get('rows', ['0'])[0]))
+            return 200, 'text/html; charset=utf-8', page.encode()
+
+        match = re.fullmatch(r'/hotel/[a-z]+/([a-z0-9-]+)\.html', parts.path)
+        if match and match.group(1) in self.slugs:
+            return 200, 'text/html; charset=utf-8', self.listing_html(self.slugs[match.group(1)]).encode()
+
+        return 404, 'text/html; charset=utf-8', b'<html><body>not found</body></html>'
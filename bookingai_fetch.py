@@ -0,0 +1,198 @@
+import bookingai_metrics
+from concurrent.futures import ThreadPoolExecutor
+import collections
+import lxml.html
+import requests
+import requests.adapters
+import threading
+import time
+import urllib.parse
+
+
+class DetailFetcher:
+    """
+    fetches listing pages with a pooled http client instead of a browser, and extracts their descriptions
+    pages are fetched concurrently over keep-alive connections, while keeping a politeness limit on each host: at most
+    max_per_host requests at once, and at least host_delay seconds between the start of two requests to the same host
+
+    Parameters
+    ----------
+    max_workers : int
+        max amount of pages fetched at the same time overall
+
+    max_per_host : int
+        max amount of pages fetched at the same time from a single host
+
+    host_delay : float
+        min amount of seconds between two requests to the same host
+
+    timeout : float
+        seconds to wait for a page before giving up on it
+
+    metrics : bookingai_metrics.Metrics
+        registry the latency and outcome of each page are reported to, the shared bookingai_metrics.METRICS if None
+
+    Attributes
+    ----------
+    DESCRIPTION_XPATH : str
+        xpath of the description paragraph in a listing page, same as the one used by BookingBot
+
+    HEADERS : dict
+        default http headers, close to what a browser sends
+
+    session : requests.Session
+        the pooled http client
+
+    Methods
+    -------
+    set_cookies(cookies)
+        copies cookies (e.g. from a selenium session) into the http client
+
+    set_user_agent(user_agent)
+        sets the user agent sent with each request
+
+    fetch(link)
+        returns the description of a single listing page, None if it failed
+
+    fetch_all(links)
+        returns the descriptions of a list of listing pages, by the order of the links
+
+    parse_description(page)
+        static method
+        extracts the description from the html of a listing page
+    """
+    DESCRIPTION_XPATH = ("//div[@class='hp-description k2-hp_main_desc--collapsed']"
+                         "//p[@class='a53cbfa6de b3efd73f69']")
+
+    HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                      'Chrome/118.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.9',
+    }
+
+    def __init__(self, max_workers=8, max_per_host=4, host_delay=0.2, timeout=20, metrics=None):
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.host_delay = host_delay
+        self.timeout = timeout
+        self.metrics = metrics if metrics is not None else bookingai_metrics.METRICS
+
+        self.session = requests.Session()
+        self.session.headers.update(self.HEADERS)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # politeness state of each host
+        self.lock = threading.Lock()
+        self.host_slots = collections.defaultdict(lambda: threading.Semaphore(self.max_per_host))
+        self.host_next_start = collections.defaultdict(float)
+
+    def set_cookies(self, cookies):
+        """copies cookies into the http client, so pages are fetched with the same session as the browser
+
+        Parameters
+        ----------
+        cookies : list
+            a list of cookie dicts, as returned by selenium's get_cookies()
+        """
+        for cookie in cookies:
+            self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'),
+                                     path=cookie.get('path', '/'))
+
+    def set_user_agent(self, user_agent):
+        """sets the user agent of the http client
+
+        Parameters
+        ----------
+        user_agent : str
+            a user agent string, e.g. the one of the browser
+        """
+        self.session.headers['User-Agent'] = user_agent
+
+    def _wait_for_host(self, host):
+        """sleeps until host_delay seconds have passed since the last request to the host started"""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.host_next_start[host])
+            self.host_next_start[host] = start + self.host_delay
+        time.sleep(start - now)
+
+    @staticmethod
+    def parse_description(page):
+        """extracts the description from the html of a listing page
+
+        Parameters
+        ----------
+        page : str or bytes
+            html of a listing page
+
+        Returns
+        -------
+        str
+            the description, None if the page has none
+        """
+        tree = lxml.html.fromstring(page)
+        paragraphs = tree.xpath(DetailFetcher.DESCRIPTION_XPATH)
+        if not paragraphs:
+            return None
+
+        # line breaks are kept as they show in the browser
+        p = paragraphs[0]
+        for br in p.iter('br'):
+            br.tail = '\n' + (br.tail or '')
+        return p.text_content().strip()
+
+    def fetch(self, link):
+        """fetches a single listing page and returns its description
+
+        Parameters
+        ----------
+        link : str
+            url of the listing page
+
+        Returns
+        -------
+        str
+            the description, None if the request failed or the page has no description
+        """
+        host = urllib.parse.urlsplit(link).netloc
+        with self.lock:
+            slot = self.host_slots[host]
+
+        with slot:
+            self._wait_for_host(host)
+            start = time.perf_counter()
+            try:
+                response = self.session.get(link, timeout=self.timeout)
+                response.raise_for_status()
+            except requests.RequestException:
+                self.metrics.observe('fetch_page_seconds', time.perf_counter() - start)
+                self.metrics.increment('fetch_pages_total', status='failed')
+                return None
+            self.metrics.observe('fetch_page_seconds', time.perf_counter() - start)
+
+        description = self.parse_description(response.text)
+        self.metrics.increment('fetch_pages_total', status='ok' if description is not None else 'no_description')
+        return description
+
+    def fetch_all(self, links):
+        """fetches listing pages concurrently and returns their descriptions
+
+        Parameters
+        ----------
+        links : list
+            urls of listing pages
+
+        Returns
+        -------
+        list
+            the descriptions by the order of links, None for pages that failed
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.fetch, links))
+
+    def close(self):
+        """closes the pooled connections"""
+        self.session.close()
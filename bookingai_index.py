@@ -0,0 +1,208 @@
+import collections
+import math
+import pandas as pd
+import re
+
+
+# words of the question that say nothing about the listing itself
+STOPWORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'be', 'there', 'this', 'that', 'it', 'its', 'does', 'do', 'has', 'have',
+    'can', 'i', 'we', 'my', 'our', 'you', 'in', 'on', 'at', 'of', 'to', 'for', 'with', 'from', 'by', 'or', 'and',
+    'any', 'some', 'place', 'room', 'rooms', 'listing', 'accommodation', 'property', 'hotel', 'apartment', 'stay',
+    'near', 'nearby', 'close', 'available', 'offer', 'include', 'included', 'get', 'use', 'what', 'which', 'how',
+}
+
+# terms a description might use instead of the one in the question, both ways
+SYNONYMS = [
+    {'wifi', 'wi', 'internet', 'wireless'},
+    {'pool', 'swimming'},
+    {'parking', 'park', 'garage'},
+    {'balcony', 'terrace', 'patio', 'veranda'},
+    {'coffee', 'cafe', 'espresso', 'nespresso'},
+    {'kitchen', 'kitchenette', 'cooking'},
+    {'ac', 'air', 'conditioning', 'conditioned', 'conditioner'},
+    {'tv', 'television'},
+    {'beach', 'sea', 'seaside', 'shore'},
+    {'breakfast', 'brunch'},
+    {'gym', 'fitness'},
+    {'pet', 'pets', 'dog', 'dogs'},
+    {'fridge', 'refrigerator'},
+    {'shower', 'bathroom'},
+]
+
+
+def stem(word):
+    """returns a rough stem of a word, enough to match plurals (kettles, balconies) with their singular"""
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+STOP_STEMS = {stem(word) for word in STOPWORDS}
+
+
+def tokenize(text):
+    """returns the stemmed lowercase words of a text, in any language
+
+    Parameters
+    ----------
+    text : str
+        a description or a question, None counts as empty
+    """
+    if text is None or (isinstance(text, float) and math.isnan(text)):
+        return []
+    return [stem(word) for word in re.findall(r'\w+', str(text).lower())]
+
+
+class TextIndex:
+    """
+    an inverted index over listing descriptions, ranking them by relevance to a question with bm25
+    used to decide, without asking gpt, which listings can not be about the question at all (no word of the question,
+    or of its synonyms, shows in their description), or to only ask about the most relevant ones
+
+    Parameters
+    ----------
+    texts : series
+        the descriptions, the index of the series is kept in the results
+
+    k1 : float
+        bm25 term frequency saturation
+
+    b : float
+        bm25 length normalization
+
+    Attributes
+    ----------
+    postings : dict
+        term to a dict of document position to the amount of times the term is in it
+
+    doc_lengths : list
+        amount of terms in each description
+
+    Methods
+    -------
+    query_terms(question)
+        returns the terms of a question that are searched for, with their synonyms
+
+    scores(question)
+        returns the bm25 score of each listing
+
+    candidates(question, mode='overlap', top_n=10, within=None)
+        returns the index labels of the listings worth asking about
+    """
+    def __init__(self, texts, k1=1.5, b=0.75):
+        texts = pd.Series(texts)
+        self.labels = texts.index
+        self.k1 = k1
+        self.b = b
+
+        self.postings = collections.defaultdict(dict)
+        self.doc_lengths = []
+        for position, text in enumerate(texts):
+            words = tokenize(text)
+            self.doc_lengths.append(len(words))
+            for word, count in collections.Counter(words).items():
+                self.postings[word][position] = count
+
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0
+
+        self.synonyms = collections.defaultdict(set)
+        for group in SYNONYMS:
+            stems = {stem(word) for word in group}
+            for word in stems:
+                self.synonyms[word] |= stems
+
+    def query_terms(self, question):
+        """returns the terms searched for a question: its words without stopwords, and their synonyms
+
+        Parameters
+        ----------
+        question : str
+            a yes or no question, e.g. "is there a kettle?"
+
+        Returns
+        -------
+        set
+            the stemmed terms, empty if the question has no meaningful words
+        """
+        terms = set()
+        for word in tokenize(question):
+            if word in STOP_STEMS:
+                continue
+            terms.add(word)
+            terms |= self.synonyms.get(word, set())
+        return terms
+
+    def scores(self, question):
+        """returns the bm25 score of each listing for the terms of a question, 0 for listings with none of them
+
+        Parameters
+        ----------
+        question : str
+            a yes or no question
+
+        Returns
+        -------
+        series
+            float scores, aligned with the index of texts
+        """
+        n_docs = len(self.doc_lengths)
+        scores = [0.0] * n_docs
+
+        for term in self.query_terms(question):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+
+            # always positive, a term in most descriptions still counts a little
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[position] / (self.avg_length or 1))
+                scores[position] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return pd.Series(scores, index=self.labels, dtype=float)
+
+    def candidates(self, question, mode='overlap', top_n=10, within=None):
+        """returns the listings worth asking gpt about a question
+
+        Parameters
+        ----------
+        question : str
+            a yes or no question
+
+        mode : str
+            'overlap' - the listings whose description has at least one term of the question or its synonyms
+            'top' - the top_n listings by score (only the ones with a score above 0)
+
+        top_n : int
+            amount of listings to keep in 'top' mode
+
+        within : list
+            if not None, index labels of the only listings to choose from (e.g. the ones that passed other filters)
+
+        Raises
+        ------
+        ValueError
+            if mode is not 'overlap' or 'top'
+
+        Returns
+        -------
+        index
+            labels of the candidate listings, by descending score. all the listings if the question has no searchable
+            terms, since nothing can be ruled out
+        """
+        if mode not in ('overlap', 'top'):
+            raise ValueError("mode must be 'overlap' or 'top'")
+
+        scores = self.scores(question)
+        if within is not None:
+            scores = scores[scores.index.isin(within)]
+        if not self.query_terms(question):
+            return scores.index
+
+        scores = scores[scores > 0].sort_values(ascending=False, kind='stable')
+        if mode == 'top':
+            scores = scores.iloc[:top_n]
+        return scores.index
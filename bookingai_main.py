@@ -1,3 +1,6 @@
+import bookingai_matrix
+import bookingai_metrics
+import bookingai_query
 import bookingai_utils as utils
 import pprint
 
@@ -8,12 +11,13 @@ if __name__ == "__main__":
 
     # if the bot needs to scrape, asks for where to save the data
     if not has_data:
-        csv_path = input('please enter a csv path to save the data:\n')
+        csv_path = input('please enter a csv path to save the data '
+                         '(or a .parquet / .arrow path for a columnar file):\n')
         bot.save_search_data(csv_path=csv_path)
 
     # shows the results
     print('these are the rooms I found for you:\n\n')
-    pprint.pprint(bot.data)
+    pprint.pprint(bot.summary())
     print('\n\n')
 
     # asks for a question about the rooms - question must be worded as if for a single listing
@@ -21,11 +25,73 @@ if __name__ == "__main__":
     choice = input('do you have any questions about the rooms? y/n ')
 
     if choice.lower() == 'y':
-        q = input('please enter a question about each room: ')
-        prompts = bot.create_prompts(q)
+        q = input('please enter a question about each room (or several questions separated by ";"): ')
+        questions = [x.strip() for x in q.split(';') if x.strip()]
 
-        # shows which rooms have a "yes" answer to the question
-        s = utils.query_gpt(prompts)
-        print(f'\n{s}')
+        # rooms with near duplicate descriptions (e.g. of a hotel chain) can be asked about once and share the answer
+        choice = input('ask once about rooms with near duplicate descriptions? y/n ')
+        dedup = 0.9 if choice.lower() == 'y' else None
 
+        if len(questions) > 1:
+            # every room is asked every question once, then any combination of them is answered without asking again
+            prompts = sum(bot.estimate_prompts(x)['prompts'] for x in questions)
+            if dedup is not None:
+                rooms = bot.get_duplicates(dedup).representatives.nunique()
+                print(f'{len(bot.data) - rooms} rooms are near duplicates of others, {rooms} rooms are asked about')
+                prompts = prompts * rooms // len(bot.data)
+            print(f'sending about {prompts} prompts')
+            matrix = bookingai_matrix.ask_questions(bot, questions, dedup=dedup)
+
+            # the answers are kept next to the data, so they can be combined again later
+            if bot.dataset_path is not None:
+                matrix.save(bookingai_matrix.matrix_path(bot.dataset_path))
+
+            expression = input('combine the questions, e.g. "kettle AND balcony AND NOT noise" (leave empty to stop) ')
+            while expression:
+                try:
+                    print(f'\n{matrix.string_results(expression)}\n')
+                except ValueError as e:
+                    print(e)
+                expression = input('combine the questions (leave empty to stop) ')
+        else:
+            # limits on price, score or name are checked before asking, rooms that do not pass them are not sent to gpt
+            filters = input('any limits on the rooms? e.g. "price < 800, score > 8.5" (leave empty for none) ')
+            # questions asked before can be answered by a local model (see bookingai_cascade), only rooms it is not
+            # sure about are sent to gpt. the model file is a pickle, so it is only loaded when asked for by its path
+            cascade = None
+            cascade_path = input('path of local models saved by bookingai_cascade (leave empty for none) ').strip()
+            if cascade_path:
+                import bookingai_cascade
+                cascade = bookingai_cascade.CascadeClassifier.load(cascade_path)
+            query = bookingai_query.ListingQuery(bot, cascade=cascade).where_text(filters).ask(questions[0])
+            query.dedup(dedup)
+
+            # rooms whose description never mentions what the question is about can get a "no" without asking gpt
+            choice = input('skip rooms whose description does not mention what the question is about? y/n ')
+            if choice.lower() == 'y':
+                query.prefilter('overlap')
+
+            # shows what the question is about to cost before sending anything
+            estimate = query.estimate()
+            cost = 'unknown' if estimate['cost'] is None else f"${estimate['cost']:.4f}"
+            print(f"{estimate['listings']} rooms pass the limits, {estimate['candidates']} of them are asked about "
+                  f"({estimate['near_duplicates']} with the answer of a near duplicate)")
+            print(f"sending {estimate['prompts']} prompts, about {estimate['total_tokens']} tokens, "
+                  f"estimated cost {cost}")
+
+            # shows which rooms pass the limits and have a "yes" answer to the question
+            s = query.string_results(query.run())
+            print(f'\n{s}')
+            saved = query.stats['saved'] + query.stats['saved_by_dedup'] + query.stats['saved_by_cascade']
+            print(f"({saved} requests to gpt were avoided)")
+
+    # shows what the run cost, and keeps the time of each stage and request for a closer look
+    metrics = bookingai_metrics.METRICS
+    tokens = metrics.total('gpt_prompt_tokens_total') + metrics.total('gpt_completion_tokens_total')
+    print(f"\ngpt: {metrics.total('gpt_requests_total')} requests ({metrics.total('gpt_cache_hits_total')} answers "
+          f"from the cache), {tokens} tokens, about ${metrics.total('gpt_cost_dollars_total'):.4f}")
+    metrics.dump('bookingai_metrics.json')
+
+    # closes the browser, if one was started
+    bot.quit()
     print('\nthank you for using bookingai!')
@@ -0,0 +1,294 @@
+import bookingai_data
+import os
+import pandas as pd
+import re
+
+
+def matrix_path(dataset_path):
+    """returns the path an answer matrix is saved in next to a dataset, in the same format
+    e.g. results.csv becomes results.answers.csv and results.parquet becomes results.answers.parquet
+
+    Parameters
+    ----------
+    dataset_path : str
+        path of the dataset the answers are about
+    """
+    base, extension = os.path.splitext(dataset_path)
+    return f'{base}.answers{extension or ".csv"}'
+
+
+def ask_questions(bot, questions, gpt_helper=None, dedup=None):
+    """asks several yes or no questions about every listing of a bot, and returns all the answers as a matrix
+    all the (listing, question) prompts are sent through a single GPThelper.query_list call, so they share the same
+    workers and rate limits instead of waiting for one question to finish before the next one starts
+
+    Parameters
+    ----------
+    bot : bookingai_bot.BookingBot
+        a bot with data, scraped or loaded
+
+    questions : list
+        yes or no questions about a single listing
+
+    gpt_helper : bookingai_cgpt.GPThelper
+        the helper to send the prompts with, a new one if None
+
+    dedup : float
+        if not None, listings whose descriptions are near duplicates with at least this similarity are asked about
+        once, and get the answers of the first of them (see BookingBot.get_duplicates)
+
+    Raises
+    ------
+    ValueError
+        if the bot has no data, or a question is repeated
+
+    Returns
+    -------
+    AnswerMatrix
+        the answers, a row for each listing of the bot's data and a column for each question
+    """
+    if len(set(questions)) != len(questions):
+        raise ValueError('questions must be unique')
+    if bot.data is None:
+        raise ValueError('no data')
+
+    if gpt_helper is None:
+        # imported here so loading a saved matrix does not import openai
+        import bookingai_cgpt
+        gpt_helper = bookingai_cgpt.GPThelper()
+
+    # only the first listing of each group of near duplicates is asked about, the rest get its answers
+    if dedup is None:
+        representatives = pd.Series(bot.data.index, index=bot.data.index)
+    else:
+        representatives = bot.get_duplicates(dedup).representatives
+    asked = pd.Index(representatives.unique())
+    texts = bot.get_texts()[asked]
+    builder = bot.get_prompt_builder()
+
+    prompts = []
+    for question in questions:
+        for text in texts:
+            chunks = builder.build(text, question)
+            prompts.append(chunks[0] if len(chunks) == 1 else chunks)
+
+    gpt_helper.query_list(prompts)
+
+    n_asked = len(asked)
+    answers = {}
+    for i, question in enumerate(questions):
+        asked_answers = pd.Series(gpt_helper.answers[i * n_asked:(i + 1) * n_asked], index=asked)
+        answers[question] = asked_answers.loc[representatives.values].values
+    return AnswerMatrix(pd.DataFrame(answers, index=bot.data.index, dtype=bool))
+
+
+def load_matrix(path, index=None):
+    """loads an answer matrix saved by AnswerMatrix.save
+
+    Parameters
+    ----------
+    path : str
+        path of the saved matrix
+
+    index : index
+        if not None, the index of the data the matrix is about (e.g. bot.data.index), given to the loaded rows
+
+    Raises
+    ------
+    ValueError
+        if index is not None and its length is not the amount of rows in the matrix
+
+    Returns
+    -------
+    AnswerMatrix
+        the loaded answers
+    """
+    answers = bookingai_data.load_frame(path).astype(bool)
+
+    if index is not None:
+        if len(index) != len(answers):
+            raise ValueError(f'the matrix has {len(answers)} rows but the data has {len(index)}')
+        answers.index = index
+
+    return AnswerMatrix(answers)
+
+
+class AnswerMatrix:
+    """
+    the answers to several yes or no questions about the same listings, a bool for each (listing, question) pair
+    once the questions were asked, any combination of them can be answered instantly with an expression, e.g.
+    "kettle AND balcony AND NOT street noise", without asking gpt again
+
+    Parameters
+    ----------
+    answers : dataframe
+        bools with a row for each listing (same index as the bot's data) and a column for each question
+
+    Attributes
+    ----------
+    answers : dataframe
+        the answers
+
+    Methods
+    -------
+    questions()
+        returns the questions in the matrix
+
+    column(term)
+        returns the answers to the question a term refers to
+
+    evaluate(expression)
+        returns the listings matching an expression of questions joined by AND, OR, NOT and parentheses
+
+    string_results(expression)
+        returns which entries match an expression, well worded within a string
+
+    save(path)
+        saves the matrix as a csv, parquet or arrow file, by the extension of path
+    """
+    OPERATORS = ('AND', 'OR', 'NOT')
+
+    def __init__(self, answers):
+        self.answers = answers
+
+    def questions(self):
+        """returns the questions in the matrix, by order"""
+        return list(self.answers.columns)
+
+    def column(self, term):
+        """returns the answers to the question a term refers to: the question itself, or a part of a single question
+        (ignoring case), e.g. "kettle" for "does this room have a kettle?"
+
+        Parameters
+        ----------
+        term : str
+            a question or a part of one
+
+        Raises
+        ------
+        ValueError
+            if the term is not a part of any question, or is a part of more than one
+
+        Returns
+        -------
+        series
+            bools aligned with the index of the answers
+        """
+        if term in self.answers.columns:
+            return self.answers[term]
+
+        matches = [q for q in self.answers.columns if term.lower() in q.lower()]
+        if len(matches) != 1:
+            found = 'no question' if not matches else f'{len(matches)} questions'
+            raise ValueError(f'"{term}" matches {found}, it must match exactly one')
+        return self.answers[matches[0]]
+
+    def evaluate(self, expression):
+        """returns which listings match an expression, computed from the answers already in the matrix
+        terms are joined with AND, OR and NOT (upper case) and grouped with parentheses, NOT binds tightest and OR
+        loosest, e.g. "(kettle OR coffee) AND NOT street noise"
+
+        Parameters
+        ----------
+        expression : str
+            the expression, each term is a question or a part of one (see column)
+
+        Raises
+        ------
+        ValueError
+            if the expression is malformed, or a term does not match exactly one question
+
+        Returns
+        -------
+        series
+            bools aligned with the index of the answers
+        """
+        tokens = [t.strip() for t in re.split(r'(\(|\)|\bAND\b|\bOR\b|\bNOT\b)', expression) if t.strip()]
+        if not tokens:
+            raise ValueError('empty expression')
+
+        position = 0
+
+        def peek():
+            return tokens[position] if position < len(tokens) else None
+
+        def take(expected=None):
+            nonlocal position
+            token = peek()
+            if token is None or (expected is not None and token != expected):
+                raise ValueError(f'malformed expression "{expression}"')
+            position += 1
+            return token
+
+        def parse_or():
+            result = parse_and()
+            while peek() == 'OR':
+                take()
+                result = result | parse_and()
+            return result
+
+        def parse_and():
+            result = parse_not()
+            while peek() == 'AND':
+                take()
+                result = result & parse_not()
+            return result
+
+        def parse_not():
+            if peek() == 'NOT':
+                take()
+                return ~parse_not()
+            if peek() == '(':
+                take()
+                result = parse_or()
+                take(')')
+                return result
+
+            token = take()
+            if token in self.OPERATORS or token == ')':
+                raise ValueError(f'malformed expression "{expression}"')
+            return self.column(token)
+
+        result = parse_or()
+        if position != len(tokens):
+            raise ValueError(f'malformed expression "{expression}"')
+        return result
+
+    def string_results(self, expression):
+        """returns which entries match an expression, format example: "entries 5, 8, 9 match your question."
+
+        Parameters
+        ----------
+        expression : str
+            an expression of questions, see evaluate
+        """
+        result = self.evaluate(expression)
+        matches = [str(i) for i in result.index[result]]
+        if not matches:
+            return 'no entries match your question.'
+        return f'entries {", ".join(matches)} match your question.'
+
+    def save(self, path):
+        """saves the matrix by the extension of path, as a csv, parquet (.parquet) or arrow ipc (.arrow, .feather)
+        file, a column of bools for each question. rows are saved by the order of the data (see load_matrix)
+
+        Parameters
+        ----------
+        path : str
+            path to save the matrix in, usually matrix_path(bot.dataset_path)
+        """
+        extension = os.path.splitext(path)[1].lower()
+
+        if not bookingai_data.is_columnar(path):
+            self.answers.to_csv(path, index=False)
+            return
+
+        import pyarrow as pa
+        import pyarrow.feather
+        import pyarrow.parquet
+
+        table = pa.Table.from_pandas(self.answers, preserve_index=False)
+        if extension in bookingai_data.PARQUET_EXTENSIONS:
+            pyarrow.parquet.write_table(table, path)
+        else:
+            pyarrow.feather.write_feather(table, path, compression='uncompressed')
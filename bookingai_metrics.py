@@ -0,0 +1,396 @@
+import bookingai_prompts
+import contextlib
+import functools
+import json
+import threading
+import time
+
+
+class Histogram:
+    """
+    counts observed values (e.g. request latencies in seconds) in cumulative buckets, like a prometheus histogram
+
+    Parameters
+    ----------
+    buckets : tuple
+        upper bounds of the buckets, ascending, a last bucket of +Inf is always added
+
+    Methods
+    -------
+    observe(value)
+        adds a value
+
+    quantile(q)
+        returns an estimate of a quantile out of the buckets
+
+    to_dict()
+        returns the count, sum, mean, p50, p95 and buckets
+    """
+    def __init__(self, buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """adds a value to the histogram
+
+        Parameters
+        ----------
+        value : float
+            the observed value
+        """
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """returns an estimate of a quantile: the upper bound of the bucket it falls in (the max for the last bucket)
+
+        Parameters
+        ----------
+        q : float
+            the quantile, between 0 and 1
+        """
+        if self.count == 0:
+            return None
+
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self):
+        """returns the histogram as a dict with the keys count, sum, mean, max, p50, p95, buckets (cumulative counts by
+        upper bound)"""
+        cumulative = {}
+        seen = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            seen += count
+            cumulative[str(bound)] = seen
+
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': cumulative,
+        }
+
+
+class Metrics:
+    """
+    a thread safe registry of counters and histograms, filled while the bot scrapes and the gpt helper asks
+    it shows where the time of a run goes (a span for each stage, a latency histogram for each kind of request) and
+    what it cost (tokens reported by openai, estimated dollars, cache hits, retries)
+    the bot, the detail fetcher and the gpt helper all report to the shared METRICS registry unless given another one
+
+    Attributes
+    ----------
+    PREFIX : str
+        prefix of the metric names in the prometheus format
+
+    counters : dict
+        (name, labels) to value, labels being a sorted tuple of (key, value) pairs
+
+    histograms : dict
+        (name, labels) to Histogram
+
+    Methods
+    -------
+    increment(name, value=1, **labels)
+        adds to a counter
+
+    observe(name, value, **labels)
+        adds a value to a histogram
+
+    span(stage)
+        context manager, times the code inside it as a stage of the run
+
+    record_usage(model, usage, price_factor=1)
+        adds the tokens of an openai response, and their estimated cost
+
+    snapshot()
+        returns all the metrics as a dict
+
+    to_json()
+        returns the snapshot as a json string
+
+    to_prometheus()
+        returns all the metrics in the prometheus text format
+
+    dump(path, fmt='json')
+        writes the metrics to a file
+
+    start_dumping(path, interval=60, fmt='json')
+        writes the metrics to a file every interval seconds, until stop_dumping() is called
+
+    stop_dumping()
+        stops the background dumps
+
+    total(name)
+        returns the sum of a counter over all its labels
+
+    reset()
+        clears all the metrics
+    """
+    PREFIX = 'bookingai_'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+
+        self._dump_stop = None
+        self._dump_thread = None
+
+    @staticmethod
+    def _key(name, labels):
+        """returns the registry key of a metric and its labels"""
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        """adds to a counter, creating it at 0 the first time
+
+        Parameters
+        ----------
+        name : str
+            name of the counter, e.g. gpt_requests_total
+
+        value : float
+            amount to add
+
+        labels : dict
+            labels of the counter, e.g. status='ok'
+        """
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """adds a value to a histogram, creating it the first time
+
+        Parameters
+        ----------
+        name : str
+            name of the histogram, e.g. gpt_request_seconds
+
+        value : float
+            the observed value
+
+        labels : dict
+            labels of the histogram
+        """
+        key = self._key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextlib.contextmanager
+    def span(self, stage):
+        """times the code inside the with block as a stage of the run, in the stage_seconds histogram
+        spans can be nested (e.g. fetch_details inside save_search_data), each one is recorded on its own
+
+        Parameters
+        ----------
+        stage : str
+            name of the stage, e.g. home_page
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage)
+
+    def record_usage(self, model, usage, price_factor=1):
+        """adds the token counts of an openai response to the token counters, and their estimated cost
+
+        Parameters
+        ----------
+        model : str
+            the model the request was sent to
+
+        usage : dict
+            the usage field of the response, with the keys prompt_tokens and completion_tokens, None is ignored
+
+        price_factor : float
+            part of the listed price paid for the tokens, e.g. 0.5 for the batch api
+        """
+        if not usage:
+            return
+
+        prompt_tokens = usage.get('prompt_tokens', 0)
+        completion_tokens = usage.get('completion_tokens', 0)
+        self.increment('gpt_prompt_tokens_total', prompt_tokens, model=model)
+        self.increment('gpt_completion_tokens_total', completion_tokens, model=model)
+
+        prices = bookingai_prompts.PromptBuilder.PRICES
+        if model in prices:
+            prompt_price, completion_price = prices[model]
+            self.increment('gpt_cost_dollars_total', (prompt_tokens * prompt_price + completion_tokens *
+                                                      completion_price) * price_factor / 1000, model=model)
+
+    def snapshot(self):
+        """returns all the metrics as a dict
+
+        Returns
+        -------
+        dict
+            with the keys uptime_seconds, counters (list of dicts with the keys name, labels, value) and histograms
+            (list of dicts with the keys name, labels and those of Histogram.to_dict)
+        """
+        with self.lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [dict({'name': name, 'labels': dict(labels)}, **histogram.to_dict())
+                          for (name, labels), histogram in sorted(self.histograms.items())]
+
+        return {'uptime_seconds': time.time() - self.started, 'counters': counters, 'histograms': histograms}
+
+    def to_json(self):
+        """returns the snapshot of the metrics as a json string"""
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """returns all the metrics in the prometheus text exposition format
+
+        Returns
+        -------
+        str
+            counters as counter metrics, histograms as histogram metrics (_bucket, _sum, _count)
+        """
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            escaped = [(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs]
+            return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+        lines = []
+        typed = set()
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {self.PREFIX}{name} counter')
+                    typed.add(name)
+                lines.append(f'{self.PREFIX}{name}{label_text(labels)} {value}')
+
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {self.PREFIX}{name} histogram')
+                    typed.add(name)
+
+                seen = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    seen += count
+                    lines.append(f'{self.PREFIX}{name}_bucket{label_text(labels, [("le", str(bound))])} {seen}')
+                lines.append(f'{self.PREFIX}{name}_sum{label_text(labels)} {histogram.sum}')
+                lines.append(f'{self.PREFIX}{name}_count{label_text(labels)} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path, fmt='json'):
+        """writes the metrics to a file, replacing it
+
+        Parameters
+        ----------
+        path : str
+            path of the file
+
+        fmt : str
+            'json' or 'prometheus'
+
+        Raises
+        ------
+        ValueError
+            if fmt is not 'json' or 'prometheus'
+        """
+        if fmt not in ('json', 'prometheus'):
+            raise ValueError("fmt must be 'json' or 'prometheus'")
+
+        text = self.to_json() if fmt == 'json' else self.to_prometheus()
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def start_dumping(self, path, interval=60, fmt='json'):
+        """writes the metrics to a file every interval seconds in a background thread, for long runs
+        (e.g. a prometheus node exporter textfile directory), until stop_dumping() is called
+
+        Parameters
+        ----------
+        path : str
+            path of the file
+
+        interval : float
+            seconds between two dumps
+
+        fmt : str
+            'json' or 'prometheus'
+        """
+        self.stop_dumping()
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                self.dump(path, fmt)
+            # a last dump, so the file has the final numbers
+            self.dump(path, fmt)
+
+        self._dump_stop = stop
+        self._dump_thread = threading.Thread(target=loop, daemon=True)
+        self._dump_thread.start()
+
+    def stop_dumping(self):
+        """stops the background dumps started by start_dumping, after one last dump"""
+        if self._dump_thread is not None:
+            self._dump_stop.set()
+            self._dump_thread.join()
+            self._dump_thread = None
+            self._dump_stop = None
+
+    def total(self, name):
+        """returns the sum of a counter over all its labels, 0 if it was never incremented"""
+        with self.lock:
+            return sum(value for (counter, _), value in self.counters.items() if counter == name)
+
+    def reset(self):
+        """clears all the metrics"""
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+            self.started = time.time()
+
+
+def timed(stage):
+    """decorator for methods of objects with a metrics attribute (a Metrics), times each call as a span of a stage
+
+    Parameters
+    ----------
+    stage : str
+        name of the stage, e.g. home_page
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.span(stage):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# the registry everything reports to by default
+METRICS = Metrics()
@@ -0,0 +1,121 @@
+import bookingai_cgpt
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import queue
+import threading
+
+
+def stream_answers(bot, question, amount=100, gpt_helper=None, csv_path=None, max_pending=None):
+    """asks a question about search results while they are still being scraped, and yields the answers as they come
+    the bot scrapes in a background thread (see BookingBot.iter_search_data), each listing is sent to chatgpt as soon
+    as its description is available, so the first answers show up long before the scraping is done
+    at most max_pending listings wait for an answer at once, the scraping pauses when chatgpt falls behind, so memory
+    stays bounded no matter how big amount is
+
+    Parameters
+    ----------
+    bot : bookingai_bot.BookingBot
+        a bot with the search page open (after search_vacation)
+
+    question : str
+        a yes or no question about each listing
+
+    amount : int
+        amount of listings to scrape and ask about
+
+    gpt_helper : bookingai_cgpt.GPThelper
+        the helper to send the prompts with, a new one if None
+
+    csv_path : str
+        if not None, each answered listing is appended to a csv in this path, with its index and answer
+
+    max_pending : int
+        max amount of listings scraped but not answered yet, twice the helper's max_workers if None
+
+    Raises
+    ------
+    Exception
+        any error raised while scraping or asking chatgpt, once the listings already answered were yielded
+
+    Yields
+    ------
+    tuple
+        (listing, answer) by the order the answers came back, listing being a dict with the keys index, name, price,
+        score, link, text (index is the position in the search results) and answer a bool
+    """
+    if gpt_helper is None:
+        gpt_helper = bookingai_cgpt.GPThelper()
+    if max_pending is None:
+        max_pending = 2 * gpt_helper.max_workers
+
+    builder = bot.get_prompt_builder()
+    slots = threading.Semaphore(max_pending)
+    results = queue.Queue()
+    stop = threading.Event()
+
+    def ask(listing):
+        try:
+            prompt = builder.build(listing['text'], question)
+            results.put(('answer', listing, gpt_helper.query_listing(prompt)))
+        except Exception as e:
+            results.put(('error', listing, e))
+        finally:
+            slots.release()
+
+    def scrape(executor):
+        scraped = 0
+        try:
+            for listing in bot.iter_search_data(amount):
+                slots.acquire()
+                if stop.is_set():
+                    break
+                executor.submit(ask, listing)
+                scraped += 1
+        except Exception as e:
+            results.put(('error', None, e))
+        results.put(('done', scraped, None))
+
+    out_file = None
+    writer = None
+    if csv_path is not None:
+        out_file = open(csv_path, 'w', newline='', encoding='utf-8')
+        writer = csv.DictWriter(out_file, ['index', 'name', 'price', 'score', 'link', 'text', 'answer'],
+                                extrasaction='ignore')
+        writer.writeheader()
+
+    executor = ThreadPoolExecutor(max_workers=gpt_helper.max_workers)
+    scraper = threading.Thread(target=scrape, args=(executor,), daemon=True)
+    scraper.start()
+
+    error = None
+    answered = 0
+    scraped = None
+    try:
+        while scraped is None or answered < scraped:
+            kind, listing, value = results.get()
+
+            if kind == 'done':
+                scraped = listing
+            elif kind == 'error':
+                # keeps going so the listings already sent are answered, then raises
+                error = error or value
+                if listing is None:
+                    stop.set()
+                else:
+                    answered += 1
+            else:
+                answered += 1
+                if writer is not None:
+                    writer.writerow(dict(listing, answer=value))
+                    out_file.flush()
+                yield listing, value
+    finally:
+        stop.set()
+        # the scraper might be waiting for a slot
+        slots.release()
+        executor.shutdown(wait=False)
+        if out_file is not None:
+            out_file.close()
+
+    if error is not None:
+        raise error
@@ -0,0 +1,231 @@
+import re
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+def load_encoding(model):
+    """returns the tiktoken encoding of a model, or None if tiktoken is not installed or cannot load it
+    (tiktoken downloads its encodings the first time they are used)
+
+    Parameters
+    ----------
+    model : str
+        name of an openai model, e.g. gpt-3.5-turbo-0613
+    """
+    if tiktoken is None:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return None
+
+
+class PromptBuilder:
+    """
+    creates prompts from a prompt format file, keeping each prompt under a token budget
+    the format is read and compiled once, descriptions that make the prompt go over the budget are either truncated or
+    split to several chunks, each one sent in a prompt of its own (any "yes" between the chunks means yes)
+
+    Parameters
+    ----------
+    template_path : str
+        path to a txt file with the phrasing of the prompt, with @@@@@ in place of the description and &&&&& in place of
+        the question
+
+    max_prompt_tokens : int
+        max amount of tokens in a single prompt
+
+    overflow : str
+        what to do with a description too long for the budget, 'chunk' (split to several prompts) or 'truncate'
+
+    model : str
+        the model the prompts are meant for, used to count tokens and estimate costs
+
+    Attributes
+    ----------
+    PRICES : dict
+        dollars per 1000 prompt tokens and per 1000 completion tokens, by model
+
+    encoding : tiktoken.Encoding
+        the tokenizer of the model, None if not available, in which case tokens are estimated as 4 characters each
+
+    template_tokens : int
+        amount of tokens in the fixed parts of the format
+
+    Methods
+    -------
+    count_tokens(text)
+        returns the amount of tokens in a text
+
+    render(description, question)
+        returns a single prompt, without checking the budget
+
+    build(description, question)
+        returns a list of prompts about one description, more than one if it was chunked
+
+    estimate(descriptions, question, answer_tokens=1)
+        returns the amount of prompts, tokens and the estimated cost of asking a question about all descriptions
+    """
+    DESCRIPTION_MARK = '@@@@@'
+    QUESTION_MARK = '&&&&&'
+    CHARS_PER_TOKEN = 4
+
+    PRICES = {
+        'gpt-3.5-turbo-0613': (0.0015, 0.002),
+        'gpt-3.5-turbo': (0.0015, 0.002),
+        'gpt-4': (0.03, 0.06),
+    }
+
+    def __init__(self, template_path, max_prompt_tokens=3000, overflow='chunk', model='gpt-3.5-turbo-0613'):
+        if overflow not in ('chunk', 'truncate'):
+            raise ValueError("overflow must be 'chunk' or 'truncate'")
+
+        self.template_path = template_path
+        self.max_prompt_tokens = max_prompt_tokens
+        self.overflow = overflow
+        self.model = model
+        self.encoding = load_encoding(model)
+
+        with open(template_path, 'r') as f:
+            template = f.read()
+
+        # compiled as a list of fixed text parts and a list of the marks between them
+        pattern = f'({re.escape(self.DESCRIPTION_MARK)}|{re.escape(self.QUESTION_MARK)})'
+        pieces = re.split(pattern, template)
+        self.parts = pieces[::2]
+        self.marks = pieces[1::2]
+        self.template_tokens = self.count_tokens(''.join(self.parts))
+
+    def count_tokens(self, text):
+        """returns the amount of tokens in a text, estimated by its length if there is no tokenizer
+
+        Parameters
+        ----------
+        text : str
+            any text
+        """
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return -(-len(text) // self.CHARS_PER_TOKEN)
+
+    def render(self, description, question):
+        """returns a prompt containing the description and the question, without checking the budget
+
+        Parameters
+        ----------
+        description : str
+            description of a room or listing
+
+        question : str
+            question about the room
+        """
+        values = {self.DESCRIPTION_MARK: description, self.QUESTION_MARK: question}
+
+        pieces = [self.parts[0]]
+        for mark, part in zip(self.marks, self.parts[1:]):
+            pieces.append(values[mark])
+            pieces.append(part)
+        return ''.join(pieces)
+
+    def split_description(self, description, max_tokens):
+        """splits a description to pieces of at most max_tokens tokens
+
+        Parameters
+        ----------
+        description : str
+            description of a room or listing
+
+        max_tokens : int
+            max amount of tokens in a piece
+
+        Returns
+        -------
+        list
+            a list of str pieces of the description, by order
+        """
+        if self.encoding is not None:
+            tokens = self.encoding.encode(description)
+            return [self.encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+        max_chars = max_tokens * self.CHARS_PER_TOKEN
+        return [description[i:i + max_chars] for i in range(0, len(description), max_chars)]
+
+    def build(self, description, question):
+        """returns the prompts about a single description
+        if the prompt goes over max_prompt_tokens, the description is truncated or split into chunks by overflow
+
+        Parameters
+        ----------
+        description : str
+            description of a room or listing
+
+        question : str
+            question about the room
+
+        Raises
+        ------
+        ValueError
+            if the format and the question alone go over the budget
+
+        Returns
+        -------
+        list
+            a list of prompts, a single one unless the description was chunked
+        """
+        room = self.max_prompt_tokens - self.template_tokens - self.count_tokens(question)
+        if room <= 0:
+            raise ValueError('the prompt format and question alone are over max_prompt_tokens')
+
+        if self.count_tokens(description) <= room:
+            return [self.render(description, question)]
+
+        chunks = self.split_description(description, room)
+        if self.overflow == 'truncate':
+            chunks = chunks[:1]
+        return [self.render(chunk, question) for chunk in chunks]
+
+    def estimate(self, descriptions, question, answer_tokens=1):
+        """returns an estimate of what asking a question about all descriptions would take, before sending anything
+
+        Parameters
+        ----------
+        descriptions : iterable
+            descriptions of rooms or listings
+
+        question : str
+            question about each room
+
+        answer_tokens : int
+            expected amount of tokens in each answer
+
+        Returns
+        -------
+        dict
+            a dictionary with the keys prompts, prompt_tokens, completion_tokens, total_tokens, cost (in dollars,
+            None for a model without a known price)
+        """
+        n_prompts = 0
+        prompt_tokens = 0
+        for description in descriptions:
+            for prompt in self.build(description, question):
+                n_prompts += 1
+                prompt_tokens += self.count_tokens(prompt)
+
+        completion_tokens = n_prompts * answer_tokens
+
+        cost = None
+        if self.model in self.PRICES:
+            prompt_price, completion_price = self.PRICES[self.model]
+            cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+        return {
+            'prompts': n_prompts,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'cost': cost,
+        }
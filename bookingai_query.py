@@ -0,0 +1,392 @@
+import operator
+import pandas as pd
+import re
+
+
+class ListingQuery:
+    """
+    a query over the data of a BookingBot, made of structured filters and yes or no questions
+    the filters (on the price, score and name columns) are checked first with pandas, over all the listings at once and
+    for free. the questions are asked to chatgpt one after the other, each only about the listings that passed the
+    filters and got a yes to all the questions before it, so listings that can not match cost nothing
+    optionally, a local full text index over the descriptions also rules out listings that never mention what a question
+    is about, or keeps only the most relevant ones, before asking (see prefilter), listings with near duplicate
+    descriptions are asked about once (see dedup), and a local model trained on earlier answers answers the listings it
+    is sure about, so only the rest are asked (see bookingai_cascade)
+
+    Parameters
+    ----------
+    bot : bookingai_bot.BookingBot
+        a bot with data, scraped or loaded
+
+    gpt_helper : bookingai_cgpt.GPThelper
+        the helper to ask the questions with, a new one is created on the first run if None
+
+    cascade : bookingai_cascade.CascadeClassifier
+        local models for questions asked before, questions without a model are all asked to gpt. None for no local
+        answers
+
+    Attributes
+    ----------
+    OPERATORS : dict
+        operators allowed in a filter, to the function applying them on a column and a value
+
+    COLUMNS : tuple
+        columns that can be filtered on
+
+    filters : list
+        (column, operator, value) tuples, all of them must hold
+
+    questions : list
+        yes or no questions, all of them must get a yes
+
+    index_mode : str
+        None, 'overlap' or 'top', see prefilter
+
+    index_top_n : int
+        amount of listings asked about each question in 'top' mode
+
+    dedup_threshold : float
+        None, or the least similarity of near duplicate descriptions asked about once, see dedup
+
+    stats : dict
+        filled by run(): amount of listings, amount that passed the filters, amount asked about each question, amount
+        ruled out by the index for each question, amount answered with the answer of a near duplicate and amount
+        answered by the cascade for each question, amount of prompts sent and amount of listings saved by the filters,
+        the index, the near duplicates, the cascade and the questions before
+
+    Methods
+    -------
+    where(column, op, value)
+        adds a filter, returns the query
+
+    where_text(text)
+        adds the filters written in a text, e.g. "price < 800, score > 8.5", returns the query
+
+    ask(question)
+        adds a question, returns the query
+
+    prefilter(mode='overlap', top_n=10)
+        rules out listings by the full text index before asking, returns the query
+
+    dedup(threshold=0.9)
+        asks about one listing of each group of near duplicate descriptions, returns the query
+
+    filter_mask()
+        returns a bool series, True for the listings that pass all the filters
+
+    estimate()
+        returns the estimated tokens and cost of the first question, over the listings that pass the filters and the
+        index
+
+    run()
+        applies the filters, asks the questions and returns a dataframe of the results
+    """
+    OPERATORS = {
+        '<': operator.lt,
+        '<=': operator.le,
+        '>': operator.gt,
+        '>=': operator.ge,
+        '==': operator.eq,
+        '!=': operator.ne,
+        'contains': lambda column, value: column.str.contains(value, case=False, regex=False),
+    }
+
+    COLUMNS = ('name', 'price', 'score')
+
+    def __init__(self, bot, gpt_helper=None, cascade=None):
+        if bot.data is None:
+            raise ValueError('no data')
+
+        self.bot = bot
+        self.gpt_helper = gpt_helper
+        self.cascade = cascade
+        self.filters = []
+        self.questions = []
+        self.index_mode = None
+        self.index_top_n = 10
+        self.dedup_threshold = None
+        self.stats = {}
+
+    def where(self, column, op, value):
+        """adds a filter on a column, checked with pandas before any question is asked
+
+        Parameters
+        ----------
+        column : str
+            one of name, price, score
+
+        op : str
+            one of <, <=, >, >=, ==, !=, contains (case insensitive substring, for name)
+
+        value : object
+            value to compare the column with, a number for price and score, a str for name
+
+        Raises
+        ------
+        ValueError
+            if the column or the operator is not supported
+
+        Returns
+        -------
+        ListingQuery
+            the query itself, so calls can be chained
+        """
+        if column not in self.COLUMNS:
+            raise ValueError(f'can not filter on {column}, only on {", ".join(self.COLUMNS)}')
+        if op not in self.OPERATORS:
+            raise ValueError(f'unknown operator {op}')
+
+        self.filters.append((column, op, value))
+        return self
+
+    def where_text(self, text):
+        """adds the filters written in a text, separated by commas, each of the form "column operator value"
+        e.g. "price < 800, score > 8.5, name contains hostel". an empty text adds no filters
+
+        Parameters
+        ----------
+        text : str
+            the filters
+
+        Raises
+        ------
+        ValueError
+            if a filter is not written in this form, or its column or operator is not supported
+
+        Returns
+        -------
+        ListingQuery
+            the query itself, so calls can be chained
+        """
+        for part in text.split(','):
+            part = part.strip()
+            if not part:
+                continue
+
+            match = re.fullmatch(r'(\w+)\s*(<=|>=|==|!=|<|>|\s+contains\s+)\s*(.+)', part)
+            if match is None:
+                raise ValueError(f'can not read the filter "{part}"')
+
+            column, op, value = match.group(1).lower(), match.group(2).strip(), match.group(3).strip()
+            if column != 'name':
+                try:
+                    value = float(value)
+                except ValueError:
+                    raise ValueError(f'{column} must be compared with a number, not "{value}"')
+
+            self.where(column, op, value)
+
+        return self
+
+    def ask(self, question):
+        """adds a yes or no question, asked only about the listings that pass the filters and the questions before it
+
+        Parameters
+        ----------
+        question : str
+            question about a single listing, e.g. "does this room have a kettle?"
+
+        Returns
+        -------
+        ListingQuery
+            the query itself, so calls can be chained
+        """
+        self.questions.append(question)
+        return self
+
+    def prefilter(self, mode='overlap', top_n=10):
+        """uses the bot's full text index (see BookingBot.get_text_index) to avoid asking about listings, they get a
+        no without asking gpt. a question made only of stopwords (e.g. "is there any?") is asked about all the listings
+
+        Parameters
+        ----------
+        mode : str
+            'overlap' - skips listings whose description has no word of the question or of its synonyms
+            'top' - asks only about the top_n listings most relevant to the question
+            None - asks about every listing that passed the filters
+
+        top_n : int
+            amount of listings asked about each question in 'top' mode
+
+        Raises
+        ------
+        ValueError
+            if mode is not one of the above
+
+        Returns
+        -------
+        ListingQuery
+            the query itself, so calls can be chained
+        """
+        if mode not in (None, 'overlap', 'top'):
+            raise ValueError("mode must be None, 'overlap' or 'top'")
+
+        self.index_mode = mode
+        self.index_top_n = top_n
+        return self
+
+    def dedup(self, threshold=0.9):
+        """asks about one listing of each group of listings with near duplicate descriptions (e.g. listings of a hotel
+        chain, see BookingBot.get_duplicates) and gives its answer to the rest of the group
+
+        Parameters
+        ----------
+        threshold : float
+            least similarity (0 to 1) of descriptions asked about once, None asks about every listing. the lower it is,
+            the more listings share an answer, and the likelier two of them differ in what the question is about
+
+        Raises
+        ------
+        ValueError
+            if threshold is not None and not above 0 and at most 1
+
+        Returns
+        -------
+        ListingQuery
+            the query itself, so calls can be chained
+        """
+        if threshold is not None and not 0 < threshold <= 1:
+            raise ValueError('threshold must be above 0 and at most 1')
+
+        self.dedup_threshold = threshold
+        return self
+
+    def collapse(self, indices):
+        """returns the index labels of the listings to ask about in place of each of indices, itself unless dedup
+        is on and it has a near duplicate before it"""
+        if self.dedup_threshold is None:
+            return pd.Series(indices, index=indices)
+        return self.bot.get_duplicates(self.dedup_threshold).collapse(indices)
+
+    def candidates(self, question, matching):
+        """returns the index labels of the listings to ask a question about, out of the ones still matching"""
+        indices = matching.index[matching]
+        if self.index_mode is None:
+            return indices
+
+        candidates = self.bot.get_text_index().candidates(question, self.index_mode, self.index_top_n, indices)
+        # keeps the order of the data, not of the scores
+        return indices[indices.isin(candidates)]
+
+    def filter_mask(self):
+        """returns which listings pass all the filters, a listing with a missing value does not pass a filter on it
+
+        Returns
+        -------
+        series
+            bools aligned with the index of the bot's data
+        """
+        data = self.bot.data
+        mask = pd.Series(True, index=data.index)
+
+        for column, op, value in self.filters:
+            passed = self.OPERATORS[op](data[column], value)
+            mask &= pd.Series(passed, index=data.index).fillna(False).astype(bool)
+
+        return mask
+
+    def estimate(self, answer_tokens=1):
+        """returns the estimated tokens and cost of asking the first question about the listings that pass the filters
+        (the questions after it are asked about less listings, as many as got a yes)
+
+        Parameters
+        ----------
+        answer_tokens : int
+            estimated amount of tokens in each answer
+
+        Returns
+        -------
+        dict
+            same as PromptBuilder.estimate, with the extra keys listings (amount that pass the filters), candidates
+            (amount of them left after the index) and near_duplicates (amount of candidates not asked about, see dedup)
+        """
+        if not self.questions:
+            raise ValueError('no questions')
+
+        mask = self.filter_mask()
+        indices = self.candidates(self.questions[0], mask)
+        asked = pd.Index(self.collapse(indices).unique())
+        texts = self.bot.get_texts()[asked]
+        estimate = self.bot.get_prompt_builder().estimate(texts, self.questions[0], answer_tokens)
+        estimate['listings'] = int(mask.sum())
+        estimate['candidates'] = len(indices)
+        estimate['near_duplicates'] = len(indices) - len(asked)
+        return estimate
+
+    def run(self):
+        """applies the filters, then asks each question about the listings still matching, in order
+
+        Returns
+        -------
+        dataframe
+            aligned with the index of the bot's data, with the column filters (bool), a column per question (True,
+            False, or NA for listings that were not asked) and the column match (bool, True for the listings that
+            passed everything)
+        """
+        if self.gpt_helper is None:
+            # imported here so building and estimating a query does not import openai
+            import bookingai_cgpt
+            self.gpt_helper = bookingai_cgpt.GPThelper()
+
+        mask = self.filter_mask()
+        results = pd.DataFrame({'filters': mask})
+        self.stats = {'listings': len(mask), 'after_filters': int(mask.sum()), 'asked': {}, 'index_skipped': {},
+                      'duplicates_skipped': {}, 'answered_locally': {}, 'prompts': 0}
+
+        texts = self.bot.get_texts() if self.questions else None
+        builder = self.bot.get_prompt_builder()
+        matching = mask.copy()
+
+        for question in self.questions:
+            indices = self.candidates(question, matching)
+            collapsed = self.collapse(indices)
+            asked = pd.Index(collapsed.unique())
+            prompts = []
+            for des in texts[asked]:
+                chunks = builder.build(des, question)
+                prompts.append(chunks[0] if len(chunks) == 1 else chunks)
+
+            asked_answers = pd.Series(False, index=asked)
+            escalated = range(len(prompts))
+            if prompts and self.cascade is not None:
+                # the listings the local model is sure about are answered without asking
+                asked_answers[:], escalated = self.cascade.answer(question, texts[asked], prompts, self.gpt_helper)
+            elif prompts:
+                self.gpt_helper.query_list(prompts)
+                asked_answers[:] = self.gpt_helper.answers
+            self.stats['prompts'] += sum(len(prompts[i]) if isinstance(prompts[i], list) else 1 for i in escalated)
+
+            # listings ruled out by the index are a no, near duplicates get the answer of the listing asked about
+            answers = pd.Series(pd.NA, index=results.index, dtype='boolean')
+            answers[matching] = False
+            answers[indices] = asked_answers.loc[collapsed.values].values
+
+            results[question] = answers
+            self.stats['asked'][question] = len(indices)
+            self.stats['index_skipped'][question] = int(matching.sum()) - len(indices)
+            self.stats['duplicates_skipped'][question] = len(indices) - len(asked)
+            self.stats['answered_locally'][question] = len(prompts) - len(escalated)
+            matching &= answers.fillna(False).astype(bool)
+
+        results['match'] = matching
+        self.stats['saved'] = len(mask) * len(self.questions) - sum(self.stats['asked'].values())
+        self.stats['saved_by_index'] = sum(self.stats['index_skipped'].values())
+        self.stats['saved_by_dedup'] = sum(self.stats['duplicates_skipped'].values())
+        self.stats['saved_by_cascade'] = sum(self.stats['answered_locally'].values())
+        return results
+
+    @staticmethod
+    def string_results(results):
+        """returns the results of run() well worded within a string, format example: "entries 5, 8, 9 match your
+        question." (same as GPThelper.string_results, by the index of the bot's data)
+
+        Parameters
+        ----------
+        results : dataframe
+            returned by run()
+        """
+        matches = [str(i) for i in results.index[results['match']]]
+        if not matches:
+            return 'no entries match your question.'
+        return f'entries {", ".join(matches)} match your question.'
@@ -0,0 +1,518 @@
+import bookingai_bot
+import bookingai_cgpt
+import bookingai_metrics
+import bookingai_store
+from aiohttp import web
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import functools
+import json
+import os
+import time
+
+
+class BookingService:
+    """
+    a long running http service that keeps everything warm between requests: started browsers, loaded datasets, the
+    gpt helper (with its cache and rate limiter) and the answers already given
+    users asking for the same search, or the same question about the same dataset, share the work instead of each
+    doing it again, even while it is still running
+
+    endpoints (all bodies are json):
+    GET  /health                        - the service is up
+    GET  /metrics                       - all the metrics in the prometheus format (see bookingai_metrics)
+    POST /searches                      - starts a search (destination, start_date, end_date, n_adults, min_stars and
+                                          optionally amount), returns its dataset id right away
+    POST /datasets                      - loads a dataset from a file (path, relative to data_dir), returns its
+                                          dataset id. a file that changed since it was loaded is loaded again
+    GET  /datasets                      - lists the datasets and their status
+    GET  /datasets/{id}/listings        - the listings of a dataset without descriptions, ?wait=1 waits for a running
+                                          search
+    POST /datasets/{id}/questions       - asks a question (question) about each listing of a dataset, streams a json
+                                          line for each answer as it comes back, then a last line with the matches
+
+    Parameters
+    ----------
+    browsers : int
+        max amount of browsers, each runs one search at a time
+
+    gpt_helper : bookingai_cgpt.GPThelper
+        the helper all the questions are asked with, a new one if None
+
+    browser_profile : str
+        profile the browsers are started with, 'default', 'headless' or 'fast' (see bookingai_browser.PROFILES)
+
+    user_data_dir : str
+        if not None, a folder with a chrome profile folder for each browser, kept between runs of the service
+
+    data_dir : str
+        folder the datasets loaded through POST /datasets must be in
+
+    Attributes
+    ----------
+    datasets : dict
+        dataset id to a dict with the keys bot (a BookingBot holding the data, None until ready), status ('running',
+        'ready' or 'failed'), source, error, seconds, and for datasets loaded from a file, version (the modification
+        time and size of the file when it was loaded)
+
+    answers : dict
+        (dataset id, listing index, question) to an asyncio future of the answer, shared by everyone asking it
+
+    Methods
+    -------
+    start_search(params, amount=10)
+        starts a search in a free browser, returns its dataset id (the id of the same search if it was already made)
+
+    load_dataset(path)
+        loads a dataset from a file (again if the file changed), returns its dataset id
+
+    wait_for(dataset_id)
+        waits until a dataset is no longer running, returns it
+
+    ask(dataset_id, question)
+        async generator, yields (index, answer) for each listing as its answer comes back
+
+    make_app()
+        returns the aiohttp application serving the endpoints
+
+    close()
+        closes the browsers and the worker threads
+    """
+    def __init__(self, browsers=2, gpt_helper=None, browser_profile='headless', user_data_dir=None, data_dir='.'):
+        self.gpt_helper = gpt_helper if gpt_helper is not None else bookingai_cgpt.GPThelper()
+        self.browser_profile = browser_profile
+        self.user_data_dir = user_data_dir
+        self.data_dir = data_dir
+
+        self.datasets = {}
+        self.answers = {}
+        self.tasks = {}
+
+        # started browsers wait in idle_bots for the next search, made in the event loop on first use
+        self.max_browsers = browsers
+        self.started_browsers = 0
+        self.idle_bots = None
+        # browser number to its search bot, a number is free again once its browser is closed
+        self.search_bots = {}
+        self.free_numbers = list(range(browsers, 0, -1))
+
+        # searches hold a browser each, loading datasets and building prompts run on the loop's default executor
+        self.search_executor = ThreadPoolExecutor(max_workers=browsers)
+        self.gpt_executor = ThreadPoolExecutor(max_workers=self.gpt_helper.max_workers)
+
+    def _new_search_bot(self, number):
+        """returns a bot with a started browser, used for searches only
+
+        Parameters
+        ----------
+        number : int
+            number of the browser, each browser keeps its chrome profile in its own folder under user_data_dir
+        """
+        user_data_dir = None
+        if self.user_data_dir is not None:
+            user_data_dir = os.path.join(self.user_data_dir, f'browser_{number}')
+
+        bot = bookingai_bot.BookingBot(browser_profile=self.browser_profile, user_data_dir=user_data_dir)
+        bot.browser
+        return bot
+
+    async def _take_search_bot(self):
+        """waits for an idle search bot, starting a new browser if less than max_browsers were started"""
+        if self.idle_bots is None:
+            self.idle_bots = asyncio.Queue()
+
+        if self.idle_bots.empty() and self.started_browsers < self.max_browsers:
+            self.started_browsers += 1
+            number = self.free_numbers.pop()
+            try:
+                bot = await asyncio.get_running_loop().run_in_executor(self.search_executor, self._new_search_bot,
+                                                                       number)
+            except Exception:
+                self.started_browsers -= 1
+                self.free_numbers.append(number)
+                raise
+            self.search_bots[number] = bot
+            return bot
+
+        return await self.idle_bots.get()
+
+    @staticmethod
+    def _run_search(bot, params, amount):
+        """searches and scrapes with a search bot, returns a new bot holding only the data, so the search bot (and its
+        browser) can be reused for the next search"""
+        bot.stats_dict = params
+        bot.search_vacation()
+        bot.save_search_data(amount=amount)
+
+        data_bot = bookingai_bot.BookingBot()
+        data_bot.data = bot.data
+        bot.data = None
+        return data_bot
+
+    async def _search(self, dataset_id, params, amount):
+        """runs a search in a free browser and fills its dataset entry"""
+        dataset = self.datasets[dataset_id]
+        start = time.perf_counter()
+        bot = None
+
+        try:
+            bot = await self._take_search_bot()
+            dataset['bot'] = await asyncio.get_running_loop().run_in_executor(self.search_executor, self._run_search,
+                                                                              bot, params, amount)
+            dataset['status'] = 'ready'
+        except Exception as e:
+            dataset['status'] = 'failed'
+            dataset['error'] = f'{type(e).__name__}: {str(e).strip()}'
+            # a browser that failed might be stuck on any page, a new one is started for the next search
+            if bot is not None:
+                bot.quit()
+                number = next(n for n, b in self.search_bots.items() if b is bot)
+                del self.search_bots[number]
+                self.free_numbers.append(number)
+                self.started_browsers -= 1
+                bot = None
+        finally:
+            if bot is not None:
+                self.idle_bots.put_nowait(bot)
+            dataset['seconds'] = time.perf_counter() - start
+
+    def start_search(self, params, amount=10):
+        """starts a search in the background, in the first free browser
+
+        Parameters
+        ----------
+        params : dict
+            search parameters, same keys as BookingBot.stats_dict (destination, start_date, end_date, n_adults,
+            min_stars)
+
+        amount : int
+            amount of listings to scrape
+
+        Raises
+        ------
+        ValueError
+            if a search parameter is missing
+
+        Returns
+        -------
+        str
+            the dataset id of the search, the same for the same parameters so the search is made once
+        """
+        missing = [k for k in ('destination', 'start_date', 'end_date', 'n_adults', 'min_stars') if k not in params]
+        if missing:
+            raise ValueError(f'missing search parameters: {", ".join(missing)}')
+
+        key = json.dumps([params[k] for k in ('destination', 'start_date', 'end_date', 'n_adults', 'min_stars')] +
+                         [amount])
+        dataset_id = 'search-' + bookingai_store.content_hash(key)
+
+        # a failed search is tried again, a running or ready one is shared
+        if dataset_id not in self.datasets or self.datasets[dataset_id]['status'] == 'failed':
+            self.datasets[dataset_id] = {'bot': None, 'status': 'running', 'source': dict(params, amount=amount),
+                                         'error': None, 'seconds': None}
+            self.tasks[dataset_id] = asyncio.get_running_loop().create_task(self._search(dataset_id, params, amount))
+            self._forget_answers(dataset_id)
+
+        return dataset_id
+
+    def data_path(self, path):
+        """returns the absolute path of a dataset file asked for in a request, which must be inside data_dir
+
+        Parameters
+        ----------
+        path : str
+            path to the dataset, relative to data_dir
+
+        Raises
+        ------
+        ValueError
+            if the path leads outside data_dir (e.g. with .. or an absolute path), or is not a file
+        """
+        if not isinstance(path, str) or not path:
+            raise ValueError('path is missing')
+
+        root = os.path.realpath(self.data_dir)
+        full = os.path.realpath(os.path.join(root, path))
+        if os.path.commonpath([root, full]) != root or not os.path.isfile(full):
+            raise ValueError(f'path must be a dataset file in {self.data_dir}')
+        return full
+
+    def _file_dataset(self, path):
+        """returns the dataset id of a file, its version (modification time and size) and True if that version is
+        already loaded"""
+        stat = os.stat(path)
+        version = [stat.st_mtime_ns, stat.st_size]
+        dataset_id = 'file-' + bookingai_store.content_hash(path)
+        dataset = self.datasets.get(dataset_id)
+        return dataset_id, version, dataset is not None and dataset['version'] == version
+
+    def _put_file_dataset(self, dataset_id, path, version, bot, seconds):
+        """adds a dataset loaded from a file, replacing an older version of it and the answers about that version"""
+        self.datasets[dataset_id] = {'bot': bot, 'status': 'ready', 'source': {'path': path}, 'error': None,
+                                     'seconds': seconds, 'version': version}
+        self._forget_answers(dataset_id)
+
+    def load_dataset(self, path):
+        """loads a dataset from a csv, parquet or arrow file (see BookingBot.load_data), again only if the file changed
+        since it was loaded
+
+        Parameters
+        ----------
+        path : str
+            path to the dataset
+
+        Returns
+        -------
+        str
+            the dataset id, the same for every version of the file
+        """
+        path = os.path.abspath(path)
+        dataset_id, version, loaded = self._file_dataset(path)
+
+        if not loaded:
+            start = time.perf_counter()
+            bot = bookingai_bot.BookingBot(data_csv_path=path)
+            self._put_file_dataset(dataset_id, path, version, bot, time.perf_counter() - start)
+        return dataset_id
+
+    def _forget_answers(self, dataset_id):
+        """drops the answers about a dataset whose data is being replaced"""
+        for key in [key for key in self.answers if key[0] == dataset_id]:
+            del self.answers[key]
+
+    async def wait_for(self, dataset_id):
+        """waits until a dataset's search is over, returns the dataset entry
+
+        Raises
+        ------
+        KeyError
+            if there is no such dataset
+        """
+        dataset = self.datasets[dataset_id]
+        if dataset['status'] == 'running':
+            await asyncio.shield(self.tasks[dataset_id])
+        return dataset
+
+    def _answer(self, dataset_id, index, question, prompt):
+        """returns the future of a listing's answer, asking gpt only if nobody asked it before"""
+        key = (dataset_id, index, question)
+        future = self.answers.get(key)
+
+        # a failed answer is asked again
+        if future is None or (future.done() and future.exception() is not None):
+            future = asyncio.get_running_loop().run_in_executor(self.gpt_executor, self.gpt_helper.query_listing,
+                                                                prompt)
+            self.answers[key] = future
+            bookingai_metrics.METRICS.increment('service_answers_total', source='gpt')
+        else:
+            bookingai_metrics.METRICS.increment('service_answers_total', source='shared')
+        return future
+
+    @staticmethod
+    def _build_prompts(bot, question):
+        """returns (index, prompt) for each listing of a bot's data, the prompt being a list of chunk prompts for long
+        descriptions"""
+        builder = bot.get_prompt_builder()
+        prompts = []
+        for index, text in bot.get_texts().items():
+            chunks = builder.build(text, question)
+            prompts.append((index, chunks[0] if len(chunks) == 1 else chunks))
+        return prompts
+
+    async def ask(self, dataset_id, question):
+        """asks a question about every listing of a ready dataset, answers already given (or being asked by someone
+        else) are reused
+
+        Parameters
+        ----------
+        dataset_id : str
+            id of a ready dataset
+
+        question : str
+            a yes or no question about a single listing
+
+        Raises
+        ------
+        ValueError
+            if the dataset is not ready
+
+        Yields
+        ------
+        tuple
+            (index, answer) by the order the answers come back, index being the listing's index in the data
+        """
+        dataset = self.datasets[dataset_id]
+        if dataset['status'] != 'ready':
+            raise ValueError(f'dataset {dataset_id} is {dataset["status"]}')
+
+        # building the prompts of a big dataset takes a while, it is done off the event loop
+        prompts = await asyncio.get_running_loop().run_in_executor(None, self._build_prompts, dataset['bot'],
+                                                                   question)
+        if self.datasets[dataset_id] is not dataset:
+            raise ValueError(f'dataset {dataset_id} was loaded again while asking, ask again')
+
+        async def labelled(index, future):
+            return index, await future
+
+        pending = [labelled(index, self._answer(dataset_id, index, question, prompt)) for index, prompt in prompts]
+
+        for next_answer in asyncio.as_completed(pending):
+            yield await next_answer
+
+    # http handlers
+
+    @staticmethod
+    def _describe(dataset_id, dataset):
+        """returns what the api shows about a dataset"""
+        listings = None if dataset['bot'] is None else len(dataset['bot'].data)
+        return {'id': dataset_id, 'status': dataset['status'], 'source': dataset['source'], 'listings': listings,
+                'error': dataset['error'], 'seconds': dataset['seconds']}
+
+    async def _body(self, request):
+        """returns the json body of a request, raises a 400 error if it is not a json object"""
+        try:
+            body = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise web.HTTPBadRequest(text='the body must be json')
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text='the body must be a json object')
+        return body
+
+    def _dataset(self, request):
+        """returns the id and entry of the dataset in a request's path, raises a 404 error if there is none"""
+        dataset_id = request.match_info['dataset_id']
+        if dataset_id not in self.datasets:
+            raise web.HTTPNotFound(text=f'no dataset {dataset_id}')
+        return dataset_id, self.datasets[dataset_id]
+
+    async def handle_health(self, request):
+        return web.json_response({'status': 'ok', 'datasets': len(self.datasets),
+                                  'browsers': self.started_browsers})
+
+    async def handle_metrics(self, request):
+        return web.Response(text=bookingai_metrics.METRICS.to_prometheus(), content_type='text/plain')
+
+    async def handle_search(self, request):
+        body = await self._body(request)
+        try:
+            dataset_id = self.start_search(body, int(body.get('amount', 10)))
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+        return web.json_response(self._describe(dataset_id, self.datasets[dataset_id]), status=202)
+
+    async def handle_load(self, request):
+        body = await self._body(request)
+        try:
+            path = self.data_path(body.get('path'))
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+
+        # the file is read off the event loop, the datasets and answers are only changed on it
+        dataset_id, version, loaded = self._file_dataset(path)
+        if not loaded:
+            start = time.perf_counter()
+            bot = await asyncio.get_running_loop().run_in_executor(None, functools.partial(
+                bookingai_bot.BookingBot, data_csv_path=path))
+            self._put_file_dataset(dataset_id, path, version, bot, time.perf_counter() - start)
+        return web.json_response(self._describe(dataset_id, self.datasets[dataset_id]))
+
+    async def handle_datasets(self, request):
+        return web.json_response([self._describe(k, v) for k, v in self.datasets.items()])
+
+    async def handle_listings(self, request):
+        dataset_id, dataset = self._dataset(request)
+        if request.query.get('wait') == '1':
+            dataset = await self.wait_for(dataset_id)
+        if dataset['status'] != 'ready':
+            return web.json_response(self._describe(dataset_id, dataset), status=409)
+
+        summary = dataset['bot'].summary()
+        listings = json.loads(summary.to_json(orient='records', force_ascii=False))
+        for index, listing in zip(summary.index, listings):
+            listing['index'] = int(index)
+        return web.json_response(listings)
+
+    async def handle_question(self, request):
+        dataset_id, dataset = self._dataset(request)
+        body = await self._body(request)
+        question = body.get('question')
+        if not question:
+            raise web.HTTPBadRequest(text='question is missing')
+
+        dataset = await self.wait_for(dataset_id)
+        if dataset['status'] != 'ready':
+            return web.json_response(self._describe(dataset_id, dataset), status=409)
+
+        # a json line for each answer, sent as soon as it is known
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+
+        start = time.perf_counter()
+        matches = []
+        try:
+            async for index, answer in self.ask(dataset_id, question):
+                if answer:
+                    matches.append(int(index))
+                line = {'index': int(index), 'answer': answer, 'seconds': time.perf_counter() - start}
+                await response.write((json.dumps(line) + '\n').encode())
+        except Exception as e:
+            await response.write((json.dumps({'error': f'{type(e).__name__}: {str(e).strip()}'}) + '\n').encode())
+        else:
+            line = {'done': True, 'matches': sorted(matches), 'seconds': time.perf_counter() - start}
+            await response.write((json.dumps(line) + '\n').encode())
+
+        await response.write_eof()
+        return response
+
+    def make_app(self):
+        """returns the aiohttp application serving the endpoints, the service is closed with the application"""
+        app = web.Application()
+        app.add_routes([
+            web.get('/health', self.handle_health),
+            web.get('/metrics', self.handle_metrics),
+            web.post('/searches', self.handle_search),
+            web.post('/datasets', self.handle_load),
+            web.get('/datasets', self.handle_datasets),
+            web.get('/datasets/{dataset_id}/listings', self.handle_listings),
+            web.post('/datasets/{dataset_id}/questions', self.handle_question),
+        ])
+
+        async def on_cleanup(app):
+            self.close()
+
+        app.on_cleanup.append(on_cleanup)
+        return app
+
+    def close(self):
+        """closes all the browsers and the worker threads"""
+        for bot in self.search_bots.values():
+            bot.quit()
+        self.search_bots = {}
+        self.search_executor.shutdown(wait=False)
+        self.gpt_executor.shutdown(wait=False)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='runs bookingai as an http service')
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8080)
+    arg_parser.add_argument('--browsers', type=int, default=2, help='max amount of searches at the same time')
+    arg_parser.add_argument('--browser-profile', default='headless', choices=['default', 'headless', 'fast'],
+                            help='fast blocks images, fonts, media and trackers')
+    arg_parser.add_argument('--user-data-dir', help='folder to keep the chrome profiles in between runs')
+    arg_parser.add_argument('--data', nargs='*', default=[], help='datasets to load on start')
+    arg_parser.add_argument('--data-dir', default='.',
+                            help='folder the datasets loaded through POST /datasets must be in')
+    args = arg_parser.parse_args()
+
+    service = BookingService(browsers=args.browsers, browser_profile=args.browser_profile,
+                             user_data_dir=args.user_data_dir, data_dir=args.data_dir)
+    for path in args.data:
+        print(f'loaded {path} as {service.load_dataset(path)}')
+
+    web.run_app(service.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+import hashlib
+import re
+import sqlite3
+import time
+import urllib.parse
+
+
+def canonical_hotel_id(link):
+    """returns a stable id of a listing out of its booking.com url, without the tracking and search parameters
+    e.g. https://www.booking.com/hotel/il/prima-link.en-gb.html?label=...&checkin=... becomes /hotel/il/prima-link
+
+    Parameters
+    ----------
+    link : str
+        url of a listing page
+
+    Returns
+    -------
+    str
+        the hotel id, the whole url path (without a .html suffix) if it does not look like a hotel page
+    """
+    path = urllib.parse.urlsplit(link).path
+    match = re.match(r'(/hotel/[a-z]{2}/[^/.]+)', path)
+    if match:
+        return match.group(1)
+    return re.sub(r'\.html$', '', path)
+
+
+def content_hash(*values):
+    """returns a short sha256 hex digest of a few values, used to tell if a card or a description changed"""
+    raw = '\x1f'.join('' if v is None else str(v) for v in values)
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+class ListingStore:
+    """
+    a persistent store of scraped listings kept in a sqlite file, keyed by canonical hotel id
+    keeps the last card (name, price, score) and description of each listing with a hash of each, so scraping the same
+    destination again only needs to fetch the pages of new listings, or of listings whose card changed
+
+    Parameters
+    ----------
+    path : str
+        path to the sqlite file, created if it does not exist
+
+    Methods
+    -------
+    needs_fetch(cards)
+        returns a list of bools, True for the cards that are new or changed since they were stored
+
+    get_texts(hotel_ids)
+        returns the stored descriptions of listings
+
+    upsert(cards)
+        stores cards with their descriptions, returns the ids of the listings whose description changed
+
+    size()
+        returns the amount of stored listings
+    """
+    def __init__(self, path='listings.sqlite'):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS listings ('
+                          'hotel_id TEXT PRIMARY KEY, name TEXT, price INTEGER, score REAL, card_hash TEXT NOT NULL, '
+                          'text TEXT, text_hash TEXT, first_seen REAL NOT NULL, last_seen REAL NOT NULL)')
+        self.conn.commit()
+
+    @staticmethod
+    def card_hash(card):
+        """returns the hash of a card's name, price and score
+
+        Parameters
+        ----------
+        card : dict
+            a card with the keys name, price, score
+        """
+        return content_hash(card['name'], card['price'], card['score'])
+
+    def _stored(self, hotel_ids, columns):
+        """returns a dict of hotel id to a tuple of the stored columns, for the ids that are stored"""
+        stored = {}
+        hotel_ids = list(hotel_ids)
+
+        # sqlite limits the amount of parameters in a query
+        for start in range(0, len(hotel_ids), 500):
+            part = hotel_ids[start:start + 500]
+            query = (f'SELECT hotel_id, {", ".join(columns)} FROM listings '
+                     f'WHERE hotel_id IN ({", ".join("?" * len(part))})')
+            for row in self.conn.execute(query, part):
+                stored[row[0]] = row[1:]
+
+        return stored
+
+    def needs_fetch(self, cards):
+        """returns which cards need their page fetched: new listings, listings whose card changed and listings with no
+        stored description
+
+        Parameters
+        ----------
+        cards : list
+            a list of cards, dicts with the keys hotel_id, name, price, score
+
+        Returns
+        -------
+        list
+            a bool for each card, by order
+        """
+        stored = self._stored([card['hotel_id'] for card in cards], ['card_hash', 'text'])
+
+        needs = []
+        for card in cards:
+            row = stored.get(card['hotel_id'])
+            needs.append(row is None or row[0] != self.card_hash(card) or row[1] is None)
+        return needs
+
+    def get_texts(self, hotel_ids):
+        """returns the stored descriptions of listings
+
+        Parameters
+        ----------
+        hotel_ids : list
+            hotel ids of listings
+
+        Returns
+        -------
+        dict
+            hotel id to description, only for stored listings
+        """
+        return {hotel_id: row[0] for hotel_id, row in self._stored(hotel_ids, ['text']).items()}
+
+    def upsert(self, cards):
+        """stores cards with their descriptions, replacing what was stored about the same listings
+
+        Parameters
+        ----------
+        cards : list
+            a list of cards, dicts with the keys hotel_id, name, price, score, text
+
+        Returns
+        -------
+        list
+            hotel ids of the listings that are new or whose description changed
+        """
+        now = time.time()
+        stored = self._stored([card['hotel_id'] for card in cards], ['text_hash'])
+        changed = []
+
+        for card in cards:
+            text_hash = None if card['text'] is None else content_hash(card['text'])
+            if card['hotel_id'] not in stored or stored[card['hotel_id']][0] != text_hash:
+                changed.append(card['hotel_id'])
+
+            price = None if card['price'] is None else int(card['price'])
+            score = None if card['score'] is None else float(card['score'])
+            self.conn.execute('INSERT INTO listings (hotel_id, name, price, score, card_hash, text, text_hash, '
+                              'first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                              'ON CONFLICT(hotel_id) DO UPDATE SET name = excluded.name, price = excluded.price, '
+                              'score = excluded.score, card_hash = excluded.card_hash, text = excluded.text, '
+                              'text_hash = excluded.text_hash, last_seen = excluded.last_seen',
+                              (card['hotel_id'], card['name'], price, score, self.card_hash(card), card['text'],
+                               text_hash, now, now))
+
+        self.conn.commit()
+        return changed
+
+    def size(self):
+        """returns the amount of stored listings"""
+        return self.conn.execute('SELECT COUNT(*) FROM listings').fetchone()[0]
+
+    def close(self):
+        """closes the sqlite connection"""
+        self.conn.close()
@@ -0,0 +1,182 @@
+import bookingai_data
+import bookingai_matrix
+import bookingai_prompts
+import argparse
+import json
+import os
+import pandas as pd
+import sys
+import time
+
+
+def checkpoint_path(out_path):
+    """returns the path of the checkpoint kept next to an answers file, e.g. results.answers.csv.checkpoint"""
+    return out_path + '.checkpoint'
+
+
+def read_checkpoint(out_path):
+    """returns the checkpoint of an answers file as a dict (see answer_in_chunks), None if there is none"""
+    try:
+        with open(checkpoint_path(out_path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(out_path, state):
+    """replaces the checkpoint of an answers file at once, a crash while writing leaves the previous one"""
+    path = checkpoint_path(out_path)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def answer_in_chunks(dataset_path, questions, out_path=None, chunksize=1000, gpt_helper=None, restart=False,
+                     max_prompt_tokens=3000, prompt_overflow='chunk', template_path='prompt_format.txt', log=print):
+    """asks yes or no questions about every listing of a dataset too big to load, a chunk of rows at a time
+    only the text column of one chunk, its prompts and its answers are in memory at once: prompts are built when their
+    chunk is read and the answers of each chunk are appended to out_path as soon as they come back
+    after each chunk, a checkpoint next to out_path records how many rows are done, so a run that crashed or was
+    stopped goes on from the last finished chunk when started again, without asking about the rows before it
+
+    Parameters
+    ----------
+    dataset_path : str
+        path to a dataset (csv, parquet or arrow, see bookingai_data.iter_frames)
+
+    questions : list
+        yes or no questions about a single listing
+
+    out_path : str
+        csv to write the answers to, a column of bools for each question and a row for each listing (an answer matrix,
+        see bookingai_matrix.load_matrix), next to the dataset if None (see bookingai_matrix.matrix_path)
+
+    chunksize : int
+        amount of rows read, and asked about, at once
+
+    gpt_helper : bookingai_cgpt.GPThelper
+        the helper to send the prompts with, a new one if None
+
+    restart : bool
+        if True, ignores the checkpoint and starts over
+
+    max_prompt_tokens : int
+        max amount of tokens in a single prompt, see bookingai_prompts.PromptBuilder
+
+    prompt_overflow : str
+        what to do with descriptions that go over max_prompt_tokens, 'chunk' or 'truncate'
+
+    template_path : str
+        path to the txt file with the phrasing of the prompt
+
+    log : function
+        called with a progress line after each chunk, None for no progress
+
+    Raises
+    ------
+    ValueError
+        if out_path is not a csv, a question is repeated, or the checkpoint is of other questions or another dataset
+
+    Returns
+    -------
+    dict
+        out_path, rows (done in total), resumed_from (rows done before this run), prompts (sent in this run), seconds
+        and matches (amount of yes answers to each question, in total)
+    """
+    if len(set(questions)) != len(questions):
+        raise ValueError('questions must be unique')
+
+    if out_path is None:
+        out_path = bookingai_matrix.matrix_path(os.path.splitext(dataset_path)[0] + '.csv')
+    if os.path.splitext(out_path)[1].lower() != '.csv':
+        raise ValueError('answers are appended to a csv, out_path must end with .csv')
+
+    dataset = {'path': os.path.abspath(dataset_path), 'size': os.path.getsize(dataset_path),
+               'mtime': os.path.getmtime(dataset_path)}
+    state = None if restart else read_checkpoint(out_path)
+
+    if state is not None:
+        if state['questions'] != list(questions) or state['dataset'] != dataset:
+            raise ValueError(f'{checkpoint_path(out_path)} is of other questions or another dataset, delete it or '
+                             f'restart')
+        # answers appended after the last checkpoint are of a chunk that did not finish, it is asked again
+        with open(out_path, 'r+b') as f:
+            f.truncate(state['bytes'])
+    else:
+        pd.DataFrame(columns=list(questions)).to_csv(out_path, index=False)
+        state = {'dataset': dataset, 'questions': list(questions), 'rows': 0, 'bytes': os.path.getsize(out_path),
+                 'matches': {question: 0 for question in questions}, 'done': False}
+        write_checkpoint(out_path, state)
+
+    if gpt_helper is None:
+        import bookingai_cgpt
+        gpt_helper = bookingai_cgpt.GPThelper()
+
+    builder = bookingai_prompts.PromptBuilder(template_path, max_prompt_tokens, prompt_overflow)
+    start = time.perf_counter()
+    resumed_from = state['rows']
+    sent = 0
+
+    if not state['done']:
+        for chunk in bookingai_data.iter_frames(dataset_path, chunksize, ['text'], skip=state['rows']):
+            texts = [str(text) for text in chunk['text'].fillna('')]
+
+            prompts = []
+            for question in questions:
+                for text in texts:
+                    parts = builder.build(text, question)
+                    prompts.append(parts[0] if len(parts) == 1 else parts)
+
+            gpt_helper.query_list(prompts)
+            sent += sum(len(p) if isinstance(p, list) else 1 for p in prompts)
+
+            n_rows = len(texts)
+            answers = pd.DataFrame({question: gpt_helper.answers[i * n_rows:(i + 1) * n_rows]
+                                    for i, question in enumerate(questions)})
+            with open(out_path, 'a', newline='') as f:
+                answers.to_csv(f, header=False, index=False)
+                f.flush()
+                os.fsync(f.fileno())
+
+            state['rows'] += n_rows
+            state['bytes'] = os.path.getsize(out_path)
+            for question in questions:
+                state['matches'][question] += int(answers[question].sum())
+            write_checkpoint(out_path, state)
+
+            if log is not None:
+                seconds = time.perf_counter() - start
+                log(f'{state["rows"]} rows done ({(state["rows"] - resumed_from) / seconds:.1f} rows/s)')
+
+        state['done'] = True
+        write_checkpoint(out_path, state)
+
+    return {'out_path': out_path, 'rows': state['rows'], 'resumed_from': resumed_from, 'prompts': sent,
+            'seconds': time.perf_counter() - start, 'matches': dict(state['matches'])}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='asks questions about every listing of a big dataset, a chunk at '
+                                                     'a time, and goes on from where it stopped if started again')
+    arg_parser.add_argument('dataset', help='csv, parquet or arrow dataset')
+    arg_parser.add_argument('--questions', nargs='+', required=True, help='yes or no questions about each listing')
+    arg_parser.add_argument('--out', help='csv to write the answers to, next to the dataset by default')
+    arg_parser.add_argument('--chunksize', type=int, default=1000, help='rows asked about at once')
+    arg_parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and start over')
+    args = arg_parser.parse_args()
+
+    try:
+        result = answer_in_chunks(args.dataset, args.questions, args.out, args.chunksize, restart=args.restart)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    print(f'{result["rows"]} rows answered in {result["out_path"]}')
+    for question, matches in result['matches'].items():
+        print(f'{question}: {matches} matches')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,3 @@
-import bookingai_bot
-import bookingai_cgpt
 from dateutil import parser
 import ast
 
@@ -116,7 +114,7 @@ def create_bot(search_data=None, txt_path=None, csv_path=None):
         if not None, loads search parameters from txt in this path
 
     csv_path: str
-        if not None, loads data from external csv in this path
+        if not None, loads data from external csv (or parquet or arrow file) in this path
 
 
     Raises
@@ -124,6 +122,9 @@ def create_bot(search_data=None, txt_path=None, csv_path=None):
     ValueError
         if all arguments are None
     """
+    # imported here so importing this file stays cheap, the bot only imports selenium once it starts a browser
+    import bookingai_bot
+
     if csv_path is not None:
         return bookingai_bot.BookingBot(data_csv_path=csv_path)
     elif txt_path is not None:
@@ -143,6 +144,30 @@ def query_gpt(prompts):
     prompts : list
         a list of prompts to ask gpt
     """
+    import bookingai_cgpt
+
     gpt_helper = bookingai_cgpt.GPThelper()
     gpt_helper.query_list(prompts)
     return gpt_helper.string_results()
+
+
+def query_gpt_batched(bot, question, batch_size=5):
+    """like query_gpt, but asks about batch_size listings in each prompt, which takes less requests and tokens
+    listings with a malformed answer are asked again separately
+
+    Parameters
+    ----------
+    bot : bookingai_bot.BookingBot
+        a bot with data, scraped or loaded
+
+    question : str
+        a yes or no question about each listing
+
+    batch_size : int
+        amount of listings in each prompt
+    """
+    import bookingai_cgpt
+
+    gpt_helper = bookingai_cgpt.GPThelper()
+    gpt_helper.query_batched(bot.create_batched_prompts(question, batch_size), bot.create_prompts(question))
+    return gpt_helper.string_results()
@@ -0,0 +1,175 @@
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+import time
+
+
+class StepWaiter:
+    """
+    waits for conditions in the browser instead of sleeping for fixed times, and records how long each step waited
+    every wait polls its condition and returns as soon as it is met, or raises after the step's timeout
+
+    Parameters
+    ----------
+    driver : selenium.webdriver.Chrome
+        the browser to wait on
+
+    default_timeout : float
+        max seconds to wait in a step that does not set its own timeout
+
+    poll_frequency : float
+        seconds between two checks of a condition
+
+    metrics : bookingai_metrics.Metrics
+        if not None, each wait is also reported to this registry, in the wait_seconds histogram by step
+
+    Attributes
+    ----------
+    timings : list
+        a dict for each step waited on, with the keys step, seconds, timed_out
+
+    Methods
+    -------
+    wait(step, condition, timeout=None, required=True)
+        waits until condition(driver) returns a truthy value and returns it
+
+    clickable(step, locator, timeout=None, required=True)
+        waits until an element is visible and enabled, returns it
+
+    present(step, locator, timeout=None, required=True)
+        waits until an element is in the page, returns it
+
+    visible(step, locator, timeout=None, required=True)
+        waits until an element is visible, returns it
+
+    page_loaded(step, timeout=None, required=True)
+        waits until the document has finished loading
+
+    refreshed(step, element, timeout=None, required=True)
+        waits until an element is removed from the page (e.g. the results list after applying a filter)
+
+    network_idle(step, idle_time=0.5, timeout=None, required=True)
+        waits until the page has not started loading any resource for idle_time seconds
+
+    report()
+        returns the total seconds waited in each step
+    """
+    def __init__(self, driver, default_timeout=10, poll_frequency=0.1, metrics=None):
+        self.driver = driver
+        self.default_timeout = default_timeout
+        self.poll_frequency = poll_frequency
+        self.metrics = metrics
+        self.timings = []
+
+    def wait(self, step, condition, timeout=None, required=True):
+        """waits until a condition is met and records how long it took
+
+        Parameters
+        ----------
+        step : str
+            name of the step, used in timings
+
+        condition : function
+            takes in the driver and returns a truthy value once the condition is met, e.g. a selenium expected
+            condition. NoSuchElementException raised by it counts as not met yet
+
+        timeout : float
+            max seconds to wait, default_timeout if None
+
+        required : bool
+            if False, a timeout returns None instead of raising
+
+        Raises
+        ------
+        selenium.common.exceptions.TimeoutException
+            if the condition was not met within timeout and required is True
+
+        Returns
+        -------
+        object
+            the value returned by the condition
+        """
+        if timeout is None:
+            timeout = self.default_timeout
+
+        start = time.perf_counter()
+        try:
+            result = WebDriverWait(self.driver, timeout, poll_frequency=self.poll_frequency).until(condition)
+        except TimeoutException:
+            self._record(step, time.perf_counter() - start, True)
+            if required:
+                raise
+            return None
+
+        self._record(step, time.perf_counter() - start, False)
+        return result
+
+    def _record(self, step, seconds, timed_out):
+        """adds a wait to timings, and to the metrics registry if there is one"""
+        self.timings.append({'step': step, 'seconds': seconds, 'timed_out': timed_out})
+        if self.metrics is not None:
+            self.metrics.observe('wait_seconds', seconds, step=step, timed_out=timed_out)
+
+    def clickable(self, step, locator, timeout=None, required=True):
+        """waits until the element found by locator (e.g. (By.XPATH, "//button")) is visible and enabled"""
+        return self.wait(step, EC.element_to_be_clickable(locator), timeout, required)
+
+    def present(self, step, locator, timeout=None, required=True):
+        """waits until the element found by locator is in the page"""
+        return self.wait(step, EC.presence_of_element_located(locator), timeout, required)
+
+    def visible(self, step, locator, timeout=None, required=True):
+        """waits until the element found by locator is visible"""
+        return self.wait(step, EC.visibility_of_element_located(locator), timeout, required)
+
+    def page_loaded(self, step, timeout=None, required=True):
+        """waits until document.readyState is complete"""
+        return self.wait(step, lambda d: d.execute_script('return document.readyState') == 'complete',
+                         timeout, required)
+
+    def refreshed(self, step, element, timeout=None, required=True):
+        """waits until an element is no longer attached to the page, meaning the part of the page holding it was
+        rendered again"""
+        return self.wait(step, EC.staleness_of(element), timeout, required)
+
+    def network_idle(self, step, idle_time=0.5, timeout=None, required=True):
+        """waits until the page has not started loading a new resource (image, script, xhr etc.) for idle_time seconds
+
+        Parameters
+        ----------
+        step : str
+            name of the step, used in timings
+
+        idle_time : float
+            seconds with no new resource that count as idle
+
+        timeout : float
+            max seconds to wait, default_timeout if None
+
+        required : bool
+            if False, a timeout returns None instead of raising
+        """
+        state = {'count': -1, 'since': time.perf_counter()}
+
+        def idle(driver):
+            count = driver.execute_script("return performance.getEntriesByType('resource').length")
+            now = time.perf_counter()
+            if count != state['count']:
+                state['count'], state['since'] = count, now
+                return False
+            return now - state['since'] >= idle_time
+
+        return self.wait(step, idle, timeout, required)
+
+    def report(self):
+        """returns the total seconds waited in each step, by the order the steps first happened
+
+        Returns
+        -------
+        dict
+            step name to seconds
+        """
+        totals = {}
+        for timing in self.timings:
+            totals[timing['step']] = totals.get(timing['step'], 0) + timing['seconds']
+        return totals
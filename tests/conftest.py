@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# the modules are at the top of the repository, not in a package
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import bookingai_bot
+import bookingai_cgpt
+import bookingai_metrics
+
+
+def kettle_answer(prompt):
+    """answers yes to the prompts that mention a kettle, so tests know the answer of each prompt"""
+    return 'yes' if 'kettle' in prompt else 'no'
+
+
+def data_bot(data):
+    """returns a BookingBot holding data, with no browser, reading its prompt formats from the repository"""
+    bot = bookingai_bot.BookingBot()
+    bot.data = data
+    bot.TXT_PATH = os.path.join(REPO_DIR, bot.TXT_PATH)
+    bot.BATCH_TXT_PATH = os.path.join(REPO_DIR, bot.BATCH_TXT_PATH)
+    return bot
+
+
+@pytest.fixture
+def make_helper():
+    """returns a function making a GPThelper for tests, with no cache, its own metrics and short retry delays"""
+    def make(api_base=None, **kwargs):
+        kwargs.setdefault('use_cache', False)
+        helper = bookingai_cgpt.GPThelper(api_base=api_base, metrics=bookingai_metrics.Metrics(), **kwargs)
+        helper.RETRY_BASE_DELAY = 0.01
+        return helper
+    return make
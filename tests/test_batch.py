@@ -0,0 +1,32 @@
+import bookingai_batch
+import json
+import os
+import pytest
+
+
+def test_job_names_are_unique():
+    paths = ['inputs/tel_aviv.txt', 'other/tel_aviv.txt', 'haifa.txt', 'tel_aviv.txt', 'x/tel_aviv_2.txt']
+
+    assert bookingai_batch.job_names(paths) == ['tel_aviv', 'tel_aviv_2', 'haifa', 'tel_aviv_3', 'tel_aviv_2_2']
+
+
+def test_run_batch_refuses_an_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        bookingai_batch.run_batch(['haifa.txt'], out_dir=str(tmp_path / 'out'), dataset_format='xlsx')
+
+    assert not os.path.exists(tmp_path / 'out')
+
+
+def test_run_batch_reports_failed_jobs(tmp_path):
+    lines = []
+    results = bookingai_batch.run_batch([str(tmp_path / 'missing.txt')], out_dir=str(tmp_path / 'out'), workers=1,
+                                        log=lines.append)
+
+    # the parameters file does not exist, so the job fails before a browser is started
+    assert [r['status'] for r in results] == ['failed']
+    assert results[0]['error'].startswith('FileNotFoundError')
+    assert lines[0].startswith('[1/1] missing: failed')
+    with open(tmp_path / 'out' / 'batch_summary.json') as f:
+        summary = json.load(f)
+    assert summary['jobs'][0]['name'] == 'missing'
+    assert 'traceback' not in summary['jobs'][0]
@@ -0,0 +1,101 @@
+import json
+
+import bookingai_bot
+import bookingai_fakes
+import pandas as pd
+import pytest
+import requests
+
+# what CARDS_JS returns for a page of two cards, the second one with no price or score
+CARDS = [
+    {'name': 'Prima Link', 'link': 'https://www.booking.com/hotel/il/prima-link.html?aid=1',
+     'price': '₪ 1,200', 'score': '8.6'},
+    {'name': 'Sea View Hostel', 'link': 'https://www.booking.com/hotel/il/sea-view-hostel.html',
+     'price': None, 'score': None},
+]
+
+
+class FakeBrowser:
+    """stands in for webdriver.Chrome, records the calls made to it"""
+    def __init__(self):
+        self.calls = []
+        self.quit_count = 0
+
+    def execute_script(self, script, *args):
+        self.calls.append(('execute_script', script, args))
+        return json.dumps(CARDS)
+
+    def get(self, url):
+        self.calls.append(('get', url))
+
+    def quit(self):
+        self.quit_count += 1
+
+
+def test_scrape_cards_reads_the_cards_js_payload():
+    bot = bookingai_bot.BookingBot(browser=FakeBrowser())
+    cards = bot.scrape_cards(2)
+
+    assert bot.browser.calls == [('execute_script', bookingai_bot.BookingBot.CARDS_JS, (2, 0))]
+    assert list(cards.columns) == ['name', 'price', 'score', 'link']
+    assert cards['name'].tolist() == ['Prima Link', 'Sea View Hostel']
+
+
+def test_parse_cards_turns_price_and_score_into_numbers():
+    cards = bookingai_bot.BookingBot.parse_cards(pd.DataFrame(CARDS, columns=['name', 'price', 'score', 'link']))
+
+    assert cards['price'].tolist()[0] == 1200
+    assert cards['price'].isna().tolist() == [False, True]
+    assert cards['score'].tolist()[0] == 8.6
+    assert cards['score'].isna().tolist() == [False, True]
+
+
+def test_webdriver_methods_are_forwarded_to_the_browser():
+    browser = FakeBrowser()
+    bot = bookingai_bot.BookingBot(browser=browser)
+
+    bot.get('https://www.booking.com')
+
+    assert browser.calls == [('get', 'https://www.booking.com')]
+    with pytest.raises(AttributeError):
+        bot.no_such_method
+    with pytest.raises(AttributeError):
+        bot._no_such_attribute
+
+
+def test_bot_without_browser_does_not_start_one(tmp_path):
+    path = tmp_path / 'results.csv'
+    pd.DataFrame({'name': ['a'], 'price': [1], 'score': [8.0], 'link': ['x'], 'text': ['a kettle']}).to_csv(path)
+
+    bot = bookingai_bot.BookingBot(data_csv_path=str(path))
+    bot.quit()
+
+    assert not bot.has_browser()
+    assert bot.data['text'].tolist() == ['a kettle']
+
+
+def test_quit_closes_the_browser():
+    browser = FakeBrowser()
+    bot = bookingai_bot.BookingBot(browser=browser)
+    bot.quit()
+
+    assert browser.quit_count == 1
+    assert not bot.has_browser()
+
+
+def test_parse_search_page_reads_the_cards_of_the_fake_search_pages():
+    listings = [{'name': f'hotel {i}', 'price': 1000 + i, 'score': 8.5, 'text': f'room {i}'} for i in range(30)]
+
+    with bookingai_fakes.FakeBookingServer(listings, latency=0) as server:
+        response = requests.get(f'{server.base_url}/searchresults.html?offset=25')
+        cards = bookingai_bot.BookingBot.parse_search_page(response.text, response.url)
+        links = server.links
+
+    # the same selectors as CARDS_JS, with the name being the first piece of text of the title link
+    assert list(cards.columns) == ['name', 'price', 'score', 'link']
+    assert cards['name'].tolist() == [f'hotel {i}' for i in range(25, 30)]
+    assert [link.split('?')[0] for link in cards['link']] == [link.split('?')[0] for link in links[25:]]
+
+    parsed = bookingai_bot.BookingBot.parse_cards(cards)
+    assert parsed['price'].tolist() == [1025, 1026, 1027, 1028, 1029]
+    assert parsed['score'].tolist() == [8.5] * 5
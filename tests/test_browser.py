@@ -0,0 +1,82 @@
+import bookingai_browser
+import pytest
+from selenium import webdriver
+
+
+class FakeChrome:
+    """stands in for webdriver.Chrome, keeps its options and the cdp commands sent to it"""
+    def __init__(self, options=None):
+        self.options = options
+        self.cdp_commands = []
+
+    def execute_cdp_cmd(self, command, params):
+        self.cdp_commands.append((command, params))
+
+
+def test_default_profile_is_a_visible_chrome():
+    options = bookingai_browser.chrome_options('default', no_sandbox=False)
+
+    assert options.arguments == []
+    assert options.page_load_strategy == 'normal'
+
+
+def test_headless_profile():
+    options = bookingai_browser.chrome_options('headless', no_sandbox=False)
+
+    assert '--headless=new' in options.arguments
+    assert '--window-size=1920,1080' in options.arguments
+    assert '--blink-settings=imagesEnabled=false' not in options.arguments
+    assert options.page_load_strategy == 'normal'
+
+
+def test_fast_profile_blocks_images_and_returns_early():
+    options = bookingai_browser.chrome_options('fast', no_sandbox=False)
+
+    assert '--headless=new' in options.arguments
+    assert '--blink-settings=imagesEnabled=false' in options.arguments
+    assert options.experimental_options['prefs']['profile.managed_default_content_settings.images'] == 2
+    assert options.page_load_strategy == 'eager'
+
+
+@pytest.mark.parametrize('profile', ['default', 'headless', 'fast'])
+def test_sandbox_is_only_turned_off_when_asked_or_running_as_root(monkeypatch, profile):
+    monkeypatch.setattr(bookingai_browser.os, 'geteuid', lambda: 1000, raising=False)
+    assert '--no-sandbox' not in bookingai_browser.chrome_options(profile).arguments
+    assert '--no-sandbox' in bookingai_browser.chrome_options(profile, no_sandbox=True).arguments
+
+    monkeypatch.setattr(bookingai_browser.os, 'geteuid', lambda: 0, raising=False)
+    assert '--no-sandbox' in bookingai_browser.chrome_options(profile).arguments
+    assert '--no-sandbox' not in bookingai_browser.chrome_options(profile, no_sandbox=False).arguments
+
+
+def test_unknown_profile_is_refused():
+    with pytest.raises(ValueError):
+        bookingai_browser.chrome_options('turbo')
+
+
+def test_user_data_dir_is_made_absolute(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    options = bookingai_browser.chrome_options('headless', user_data_dir='profiles/1', no_sandbox=False)
+
+    assert f'--user-data-dir={tmp_path / "profiles" / "1"}' in options.arguments
+
+
+@pytest.mark.parametrize('profile, blocked', [('default', False), ('headless', False), ('fast', True)])
+def test_only_the_fast_profile_blocks_urls(monkeypatch, profile, blocked):
+    monkeypatch.setattr(webdriver, 'Chrome', FakeChrome)
+
+    browser = bookingai_browser.start_browser(profile, no_sandbox=False)
+
+    if blocked:
+        assert browser.cdp_commands == [('Network.enable', {}),
+                                        ('Network.setBlockedURLs', {'urls': bookingai_browser.blocked_url_patterns()})]
+    else:
+        assert browser.cdp_commands == []
+
+
+def test_blocked_url_patterns():
+    patterns = bookingai_browser.blocked_url_patterns()
+
+    # images with or without a query string, trackers on any subdomain
+    assert {'*.png', '*.png?*', '*.woff2', '*://*doubleclick.net/*'} <= set(patterns)
+    assert not any('booking.com' in pattern for pattern in patterns)
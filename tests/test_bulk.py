@@ -0,0 +1,89 @@
+import bookingai_bulk
+import bookingai_fakes
+import json
+import pytest
+from conftest import kettle_answer
+
+PROMPTS = [f'listing {i} has a kettle' if i % 3 == 0 else f'listing {i}' for i in range(10)]
+EXPECTED = [i % 3 == 0 for i in range(10)]
+
+
+@pytest.fixture
+def batch_server():
+    with bookingai_fakes.FakeBatchServer(batch_delay=0.05, latency=0, answer_fn=kettle_answer) as server:
+        yield server
+
+
+def answers(results):
+    return [answer == 'yes' for answer, _ in results]
+
+
+def test_run_splits_the_prompts_into_batches(tmp_path, batch_server, make_helper):
+    helper = make_helper(batch_server.api_base)
+    job = bookingai_bulk.BulkJob(str(tmp_path / 'job.jsonl'), helper, max_requests=4, poll_seconds=0.05)
+
+    assert answers(job.run(PROMPTS)) == EXPECTED
+    assert len(batch_server.batches) == 3
+    assert job.state['collected']
+    assert helper.metrics.total('gpt_bulk_fallbacks_total') == 0
+
+
+def test_job_resumes_from_its_state_file(tmp_path, batch_server, make_helper):
+    path = str(tmp_path / 'job.jsonl')
+    helper = make_helper(batch_server.api_base, use_cache=True, cache_path=str(tmp_path / 'cache.sqlite'))
+    helper.cache.put(PROMPTS[0], helper.model_params, 'yes')
+    helper.cache.put(PROMPTS[1], helper.model_params, 'no')
+
+    # a first run submits the job and stops before collecting it
+    first = bookingai_bulk.BulkJob(path, helper, max_requests=4, poll_seconds=0.05)
+    first.prepare(PROMPTS)
+    first.submit()
+    with open(bookingai_bulk.state_path(path)) as f:
+        saved = json.load(f)
+    # json turns the positions of the cached answers into strings
+    assert saved['cached'] == {'0': 'yes', '1': 'no'}
+    assert all(part['batch_id'] is not None for part in saved['parts'])
+
+    # a later run with the same prompts goes on with the same batches instead of submitting new ones
+    helper.cache.clear()
+    second = bookingai_bulk.BulkJob(path, helper, max_requests=4, poll_seconds=0.05)
+    assert answers(second.run(PROMPTS)) == EXPECTED
+    assert len(batch_server.batches) == 2
+    assert batch_server.completion_count == 8
+
+    # the answers are in the cache now, and collecting the job again counts its usage once
+    requests = helper.metrics.total('gpt_requests_total')
+    assert answers(bookingai_bulk.BulkJob(path, helper, poll_seconds=0.05).run(PROMPTS)) == EXPECTED
+    assert helper.metrics.total('gpt_requests_total') == requests
+    assert helper.cache.stats()['size'] == 8
+
+
+def test_job_of_other_prompts_is_refused_until_collected(tmp_path, batch_server, make_helper):
+    path = str(tmp_path / 'job.jsonl')
+    helper = make_helper(batch_server.api_base)
+    bookingai_bulk.BulkJob(path, helper).prepare(PROMPTS)
+
+    with pytest.raises(ValueError):
+        bookingai_bulk.BulkJob(path, helper).prepare(PROMPTS[:5])
+
+
+def test_failed_requests_fall_back_to_single_requests(tmp_path, make_helper):
+    with bookingai_fakes.FakeBatchServer(batch_delay=0.05, batch_error_every=3, latency=0,
+                                         answer_fn=kettle_answer) as server:
+        helper = make_helper(server.api_base)
+        results = bookingai_bulk.BulkJob(str(tmp_path / 'job.jsonl'), helper, poll_seconds=0.05).run(PROMPTS)
+
+        strict = bookingai_bulk.BulkJob(str(tmp_path / 'strict.jsonl'), helper, poll_seconds=0.05, fallback=False)
+        with pytest.raises(ValueError):
+            strict.run(PROMPTS)
+
+    assert answers(results) == EXPECTED
+    assert helper.metrics.total('gpt_bulk_fallbacks_total') == 3
+
+
+def test_query_bulk_merges_chunks(tmp_path, batch_server, make_helper):
+    helper = make_helper(batch_server.api_base)
+    helper.query_bulk(['a kettle', ['no kitchen', 'a kettle again'], 'nothing'], job_path=str(tmp_path / 'job.jsonl'),
+                      poll_seconds=0.05)
+
+    assert helper.answers == [True, True, False]
@@ -0,0 +1,83 @@
+import bookingai_cache
+import bookingai_fakes
+import pytest
+from conftest import kettle_answer
+
+PARAMS = {'model': 'gpt-3.5-turbo-0613', 'temperature': 0, 'max_tokens': 100}
+
+
+class Clock:
+    """a time.time that only moves when told to"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(bookingai_cache.time, 'time', clock)
+    return clock
+
+
+def test_hit_and_miss(tmp_path):
+    cache = bookingai_cache.AnswerCache(str(tmp_path / 'cache.sqlite'))
+
+    assert cache.get('prompt', PARAMS) is None
+    cache.put('prompt', PARAMS, 'yes')
+    assert cache.get('prompt', PARAMS) == 'yes'
+    # the same prompt with other model parameters is another answer
+    assert cache.get('prompt', dict(PARAMS, max_tokens=1)) is None
+    assert cache.stats() == {'size': 1, 'hits': 1, 'misses': 2}
+
+
+def test_answers_expire_after_ttl(tmp_path, clock):
+    cache = bookingai_cache.AnswerCache(str(tmp_path / 'cache.sqlite'), ttl=60)
+    cache.put('prompt', PARAMS, 'yes')
+
+    clock.now += 59
+    assert cache.get('prompt', PARAMS) == 'yes'
+    clock.now += 2
+    assert cache.get('prompt', PARAMS) is None
+    assert cache.stats()['size'] == 0
+
+
+def test_least_recently_used_answers_are_evicted(tmp_path, clock):
+    cache = bookingai_cache.AnswerCache(str(tmp_path / 'cache.sqlite'), max_entries=2)
+    cache.put('a', PARAMS, 'yes')
+    clock.now += 1
+    cache.put('b', PARAMS, 'no')
+    clock.now += 1
+    # a was used after b was saved, so b is the least recently used
+    assert cache.get('a', PARAMS) == 'yes'
+    clock.now += 1
+    cache.put('c', PARAMS, 'yes')
+
+    assert cache.get('b', PARAMS) is None
+    assert cache.get('a', PARAMS) == 'yes'
+    assert cache.get('c', PARAMS) == 'yes'
+
+
+def test_cache_is_kept_between_runs(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = bookingai_cache.AnswerCache(path)
+    cache.put('prompt', PARAMS, 'yes')
+    cache.close()
+
+    assert bookingai_cache.AnswerCache(path).get('prompt', PARAMS) == 'yes'
+
+
+def test_helper_asks_cached_prompts_once(tmp_path, make_helper):
+    prompts = ['a kettle', 'no kitchen', 'a kettle']
+
+    with bookingai_fakes.FakeChatServer(latency=0, answer_fn=kettle_answer) as server:
+        helper = make_helper(server.api_base, max_workers=1, use_cache=True,
+                             cache_path=str(tmp_path / 'cache.sqlite'))
+        helper.query_list(prompts)
+        helper.query_list(prompts)
+
+    assert helper.answers == [True, False, True]
+    assert server.request_count == 2
+    assert helper.cache.stats()['hits'] == 4
@@ -0,0 +1,85 @@
+import bookingai_cascade
+import bookingai_fakes
+import pandas as pd
+import pytest
+from conftest import kettle_answer
+
+ROOMS = ['studio', 'suite', 'double room', 'twin room', 'apartment', 'loft', 'cabin', 'bungalow', 'villa', 'dorm']
+# gpt's answers to "is there a kettle?", twice over so there is enough to hold some out
+TEXTS = ([f'a {room} with a kettle' for room in ROOMS] + [f'a {room} with a balcony' for room in ROOMS]) * 2
+ANSWERS = ([True] * len(ROOMS) + [False] * len(ROOMS)) * 2
+QUESTION = 'is there a kettle?'
+
+
+def trained_cascade():
+    cascade = bookingai_cascade.CascadeClassifier(min_confidence=0.7)
+    cascade.fit(QUESTION, TEXTS, ANSWERS)
+    return cascade
+
+
+def test_fit_and_predict():
+    cascade = trained_cascade()
+    answers, confidences = cascade.predict(QUESTION, pd.Series(['a loft with a kettle', 'a villa with a balcony']))
+
+    assert cascade.has_model('Is there a kettle')
+    assert answers.tolist() == [True, False]
+    assert (confidences >= 0.7).all()
+
+
+@pytest.mark.parametrize('answers', [ANSWERS[:10], [True] * len(ANSWERS)])
+def test_too_few_or_one_sided_answers_are_refused(answers):
+    with pytest.raises(ValueError):
+        bookingai_cascade.CascadeClassifier().fit(QUESTION, TEXTS[:len(answers)], answers)
+
+
+def test_evaluate_reports_each_threshold_and_trains_on_everything():
+    cascade = bookingai_cascade.CascadeClassifier()
+    report = cascade.evaluate(QUESTION, TEXTS, ANSWERS)
+
+    assert (report['train'], report['test']) == (30, 10)
+    assert list(report['thresholds']) == list(cascade.THRESHOLDS)
+    for row in report['thresholds'].values():
+        assert 0 <= row['escalation_rate'] <= 1
+        assert 0 <= row['agreement'] <= 1
+    assert cascade.has_model(QUESTION)
+    assert cascade.reports[bookingai_cascade.normalize_question(QUESTION)] == report
+
+
+def test_only_uncertain_listings_are_asked_to_gpt(make_helper):
+    texts = pd.Series(['a loft with a kettle', 'free parking nearby', 'a villa with a balcony'])
+    # the description with no word the model knows gets an even chance, so it is escalated
+    prompts = [f'{text}, {QUESTION}' for text in texts]
+
+    with bookingai_fakes.FakeChatServer(latency=0, answer_fn=kettle_answer) as server:
+        answers, escalated = trained_cascade().answer(QUESTION, texts, prompts, make_helper(server.api_base))
+
+    # the fake gpt says yes to every prompt mentioning a kettle, which the question itself does
+    assert escalated == [1]
+    assert server.request_count == 1
+    assert answers == [True, True, False]
+
+
+def test_questions_without_a_model_are_all_asked(make_helper):
+    texts = pd.Series(['a loft with a kettle', 'a villa with a balcony'])
+    prompts = [f'{text}, is there a balcony?' for text in texts]
+
+    with bookingai_fakes.FakeChatServer(latency=0, answer_fn=kettle_answer) as server:
+        answers, escalated = trained_cascade().answer('is there a balcony?', texts, prompts,
+                                                      make_helper(server.api_base))
+
+    assert escalated == [0, 1]
+    assert server.request_count == 2
+    assert answers == [True, False]
+
+
+def test_save_and_load(tmp_path):
+    cascade = trained_cascade()
+    path = str(tmp_path / 'cascade.pkl')
+    cascade.save(path)
+    loaded = bookingai_cascade.CascadeClassifier.load(path)
+
+    texts = pd.Series(['a cabin with a kettle', 'a dorm with a balcony', 'free parking nearby'])
+    assert loaded.min_confidence == 0.7
+    assert loaded.min_examples == cascade.min_examples
+    for expected, actual in zip(cascade.predict(QUESTION, texts), loaded.predict(QUESTION, texts)):
+        assert expected.tolist() == actual.tolist()
@@ -0,0 +1,240 @@
+import bookingai_cgpt
+import bookingai_fakes
+import math
+import openai
+import pytest
+import threading
+import time
+from conftest import kettle_answer
+
+
+def test_rate_limiter_takes_requests_while_there_is_room():
+    limiter = bookingai_cgpt.RateLimiter(requests_per_minute=2, tokens_per_minute=1000)
+
+    assert limiter.try_acquire(10) == 0
+    assert limiter.try_acquire(10) == 0
+    # the third request waits for the request bucket to refill, up to 30 seconds at 2 per minute
+    assert 0 < limiter.try_acquire(10) <= 30
+
+
+def test_rate_limiter_waits_for_tokens():
+    limiter = bookingai_cgpt.RateLimiter(requests_per_minute=100, tokens_per_minute=600)
+
+    assert limiter.try_acquire(600) == 0
+    assert 0 < limiter.try_acquire(60) <= 6
+
+
+def test_rate_limiter_caps_requests_larger_than_the_bucket():
+    limiter = bookingai_cgpt.RateLimiter(requests_per_minute=100, tokens_per_minute=600)
+
+    # would wait forever if not capped at the size of the bucket
+    assert limiter.try_acquire(10 ** 6) == 0
+
+
+def test_query_list_retries_rate_limited_requests(make_helper):
+    prompts = [f'prompt {i} kettle' if i % 2 else f'prompt {i}' for i in range(8)]
+
+    with bookingai_fakes.FakeChatServer(latency=0, rate_limit_every=3, answer_fn=kettle_answer) as server:
+        helper = make_helper(server.api_base, max_workers=4)
+        helper.query_list(prompts)
+
+    assert helper.answers == [i % 2 == 1 for i in range(8)]
+    # every third request got a 429 and was sent again, 8 answers take 11 requests
+    assert server.request_count == 11
+    assert helper.metrics.total('gpt_retries_total') == server.rate_limited_count == 3
+
+
+def test_query_chatgpt_gives_up_after_max_retries(make_helper):
+    with bookingai_fakes.FakeChatServer(latency=0, rate_limit_every=1) as server:
+        helper = make_helper(server.api_base, max_retries=2)
+        with pytest.raises(openai.error.RateLimitError):
+            helper.query_chatgpt('prompt')
+
+    assert server.request_count == 3
+
+
+def test_parse_batch_answer_reads_a_json_array():
+    response = 'here you go: [{"index": 0, "answer": "Yes"}, {"index": "2", "answer": "no."}]'
+    assert bookingai_cgpt.GPThelper.parse_batch_answer(response, [0, 1, 2]) == {0: True, 2: False}
+
+
+@pytest.mark.parametrize('response', [
+    None,
+    '',
+    'yes',
+    '[{"index": 0, "answer": "yes"}',
+    '[{"index": 0, "answer": "yes"},]',
+    '{"index": 0, "answer": "yes"}',
+    '] [',
+    '[1, 2, 3]',
+])
+def test_parse_batch_answer_ignores_malformed_responses(response):
+    assert bookingai_cgpt.GPThelper.parse_batch_answer(response, [0, 1]) == {}
+
+
+def test_parse_batch_answer_leaves_out_bad_items():
+    response = ('[{"index": 0, "answer": "maybe"}, {"index": 7, "answer": "yes"}, {"answer": "yes"}, '
+                '{"index": 1, "answer": true}, "yes", {"index": 2, "answer": "yes"}, '
+                '{"index": 3, "answer": "yes"}, {"index": 3, "answer": "no"}]')
+    assert bookingai_cgpt.GPThelper.parse_batch_answer(response, [0, 1, 2, 3]) == {2: True}
+
+
+def test_query_batched_asks_again_about_listings_with_no_valid_answer(make_helper):
+    def answer(prompt):
+        if prompt.startswith('batch'):
+            return '[{"index": 0, "answer": "yes"}, {"index": 1, "answer": "perhaps"}]'
+        return kettle_answer(prompt)
+
+    with bookingai_fakes.FakeChatServer(latency=0, answer_fn=answer) as server:
+        helper = make_helper(server.api_base)
+        helper.query_batched([([0, 1], 'batch of 0 and 1'), ([2], 'batch of 2')], ['a kettle', 'a kettle', 'none'])
+
+    assert helper.answers == [True, True, False]
+    assert helper.batch_fallbacks == 2
+    assert server.request_count == 4
+
+
+@pytest.mark.parametrize('response, expected', [
+    ('yes', True),
+    ('Yes, it does.', True),
+    ('"YES"', True),
+    ('no', False),
+    ('yesterday it had one', False),
+    ('', False),
+    (None, False),
+])
+def test_is_yes(response, expected):
+    assert bookingai_cgpt.GPThelper.is_yes(response) is expected
+
+
+def logprobs_response(top):
+    return {'choices': [{'logprobs': {'content': [{'top_logprobs': [{'token': token, 'logprob': math.log(p)}
+                                                                    for token, p in top]}]}}]}
+
+
+def test_answer_confidence():
+    response = logprobs_response([('Yes', 0.6), ('yes', 0.2), ('No', 0.1), ('maybe', 0.1)])
+
+    assert bookingai_cgpt.GPThelper.answer_confidence(response, 'Yes') == pytest.approx(0.8 / 0.9)
+    assert bookingai_cgpt.GPThelper.answer_confidence(response, 'no') == pytest.approx(0.1 / 0.9)
+
+
+@pytest.mark.parametrize('response', [
+    {},
+    {'choices': []},
+    {'choices': [{'logprobs': None}]},
+    {'choices': [{'logprobs': {'content': None}}]},
+    {'choices': [{'logprobs': {'content': []}}]},
+    logprobs_response([('maybe', 0.9)]),
+])
+def test_answer_confidence_without_usable_logprobs(response):
+    assert bookingai_cgpt.GPThelper.answer_confidence(response, 'yes') is None
+
+
+def test_single_token_answers_with_confidence(make_helper):
+    prompts = ['a kettle', 'no kitchen', ['chunk one', 'chunk with a kettle']]
+
+    with bookingai_fakes.FakeChatServer(latency=0, verbose=True, answer_fn=kettle_answer) as server:
+        helper = make_helper(server.api_base, single_token=True, logprobs=True)
+        helper.query_list(prompts)
+
+    assert helper.answers == [True, False, True]
+    assert server.completion_tokens == 4
+    expected = [server.answer_probability(prompt) for prompt in ('a kettle', 'no kitchen', 'chunk with a kettle')]
+    assert helper.confidences == pytest.approx(expected)
+
+
+def test_answer_with_no_text_is_a_no(make_helper):
+    with bookingai_fakes.FakeChatServer(latency=0) as server:
+        # a response stopped by the content filter has no content
+        server.completion = lambda request, n: {'choices': [{'index': 0, 'finish_reason': 'content_filter',
+                                                             'message': {'role': 'assistant', 'content': None}}]}
+        helper = make_helper(server.api_base, use_cache=True, cache_path=':memory:')
+        helper.query_list(['a kettle', ['a kettle', 'another kettle']])
+
+    assert helper.answers == [False, False]
+    assert helper.cache.stats()['size'] == 0
+
+
+def test_pool_sends_to_the_least_loaded_endpoint():
+    pool = bookingai_cgpt.EndpointPool([{'name': 'a'}, {'name': 'b', 'requests_per_minute': 7000}])
+
+    first, second, third = pool.acquire(10), pool.acquire(10), pool.acquire(10)
+
+    # b has twice the limit, so it takes a second request before a does
+    assert [first.name, second.name, third.name] == ['a', 'b', 'b']
+
+
+def test_pool_ejects_a_rate_limited_endpoint_with_backoff():
+    pool = bookingai_cgpt.EndpointPool([{'name': 'a'}, {'name': 'b'}], eject_seconds=5)
+    a, b = pool.endpoints
+
+    assert pool.release(pool.acquire(10), 429)
+    start = time.monotonic()
+    assert a.ejected_until == pytest.approx(start + 5, abs=0.5)
+    assert pool.available() == [b]
+    assert pool.acquire(10) is b
+
+    # a second 429 in a row doubles the time the endpoint is left out
+    a.ejected_until = 0
+    pool.release(b, 200)
+    assert pool.acquire(10) is a
+    assert pool.release(a, 429)
+    assert a.ejected_until == pytest.approx(time.monotonic() + 10, abs=0.5)
+    assert a.stats()['rate_limited'] == 2 and a.stats()['ejected']
+
+    # an answer that is not a 429 starts the backoff over
+    a.ejected_until = 0
+    pool.release(pool.acquire(10), 200)
+    assert pool.acquire(10) is a
+    pool.release(a, 200)
+    assert a.consecutive_rate_limits == 0
+
+
+def test_pool_never_ejects_its_last_available_endpoint():
+    pool = bookingai_cgpt.EndpointPool([{'name': 'a'}])
+
+    assert not pool.release(pool.acquire(10), 429)
+    assert pool.available() == pool.endpoints
+
+
+def test_pool_keeps_max_in_flight():
+    pool = bookingai_cgpt.EndpointPool([{'name': 'a', 'max_in_flight': 1}, {'name': 'b', 'max_in_flight': 1}])
+    a, b = pool.acquire(10), pool.acquire(10)
+    assert {a.name, b.name} == {'a', 'b'}
+
+    released = threading.Timer(0.1, pool.release, (b, 200))
+    released.start()
+    start = time.monotonic()
+    assert pool.acquire(10) is b
+    assert time.monotonic() - start >= 0.05
+    released.join()
+
+
+def test_endpoint_is_released_after_an_error_that_is_not_from_openai(make_helper):
+    with bookingai_fakes.FakeChatServer(latency=0) as server:
+        # a response with no choices fails while it is read, outside of openai's errors
+        server.completion = lambda request, n: {'choices': []}
+        helper = make_helper(server.api_base)
+        with pytest.raises(IndexError):
+            helper.query_chatgpt('a kettle')
+
+    endpoint = helper.pool.endpoints[0]
+    assert endpoint.in_flight == 0
+    assert endpoint.errors == 1
+
+
+def test_rate_limited_endpoint_is_left_out_while_others_answer(make_helper):
+    prompts = [f'prompt {i} kettle' for i in range(12)]
+
+    with bookingai_fakes.FakeChatServer(latency=0, rate_limit_every=1) as limited, \
+            bookingai_fakes.FakeChatServer(latency=0, answer_fn=kettle_answer) as healthy:
+        helper = make_helper(endpoints=[{'api_base': limited.api_base, 'name': 'limited'},
+                                        {'api_base': healthy.api_base, 'name': 'healthy'}], max_workers=4)
+        helper.query_list(prompts)
+
+    assert helper.answers == [True] * 12
+    # once ejected, the limited endpoint gets no more requests until its time is up
+    assert limited.request_count <= 4
+    assert healthy.request_count == 12
+    assert helper.metrics.total('gpt_endpoint_ejections_total') == limited.request_count
@@ -0,0 +1,59 @@
+import bookingai_bot
+import bookingai_data
+import pandas as pd
+import pytest
+
+DATA = pd.DataFrame({
+    'name': ['Prima Link', 'Sea View Hostel', 'No Score'],
+    'price': [800, 300, None],
+    'score': [8.6, 7.9, None],
+    'link': ['https://www.booking.com/hotel/il/prima-link.html', 'https://www.booking.com/hotel/il/sea-view.html',
+             'https://www.booking.com/hotel/il/no-score.html'],
+    'text': ['a room with a kettle', 'beds & a balcony', None],
+})
+
+
+@pytest.mark.parametrize('name', ['listings.parquet', 'listings.arrow', 'listings.csv'])
+def test_save_and_load_keep_the_values(tmp_path, name):
+    path = str(tmp_path / name)
+    bookingai_data.save_frame(DATA, path)
+
+    loaded = bookingai_data.load_frame(path)
+
+    assert list(loaded.columns) == bookingai_data.DATA_COLUMNS
+    assert loaded['name'].tolist() == DATA['name'].tolist()
+    assert loaded['price'].tolist()[:2] == [800, 300]
+    assert pd.isna(loaded['price'].tolist()[2])
+    assert loaded['text'].tolist()[:2] == DATA['text'].tolist()[:2]
+    assert pd.isna(loaded['text'].tolist()[2])
+
+
+@pytest.mark.parametrize('name', ['listings.parquet', 'listings.arrow', 'listings.csv'])
+def test_load_reads_only_the_given_columns(tmp_path, name):
+    path = str(tmp_path / name)
+    bookingai_data.save_frame(DATA, path)
+
+    loaded = bookingai_data.load_frame(path, ['price', 'name'])
+
+    assert list(loaded.columns) == ['price', 'name']
+    assert loaded['name'].tolist() == DATA['name'].tolist()
+
+
+def test_columnar_data_is_loaded_without_its_text(tmp_path):
+    path = str(tmp_path / 'listings.parquet')
+    bookingai_data.save_frame(DATA, path)
+
+    bot = bookingai_bot.BookingBot()
+    bot.load_data(path)
+
+    assert 'text' not in bot.data.columns
+    assert bot.get_texts().tolist()[:2] == DATA['text'].tolist()[:2]
+
+    # saving it again reads the texts back in
+    bot.save_data(str(tmp_path / 'again.arrow'))
+    assert bookingai_data.load_frame(str(tmp_path / 'again.arrow'))['text'].tolist()[:2] == DATA['text'].tolist()[:2]
+
+
+def test_is_columnar_goes_by_the_extension():
+    assert [bookingai_data.is_columnar(p) for p in ['a.parquet', 'a.PQ', 'a.feather', 'a.csv', None]] == \
+        [True, True, True, False, False]
@@ -0,0 +1,86 @@
+import bookingai_dedup
+import bookingai_fakes
+import bookingai_matrix
+import bookingai_query
+import pandas as pd
+import pytest
+from conftest import data_bot
+
+BASE = ('Offering a garden and a terrace, the rooms come with air conditioning, a flat screen tv, a private bathroom '
+        'with a shower and free toiletries. A buffet breakfast is served every morning and the staff at the 24 hour '
+        'front desk speak english and hebrew. The hotel is 2.3 miles from the beach.')
+# a single word apart from BASE, about 0.88 similar
+VEGAN = BASE.replace('A buffet breakfast', 'A vegan breakfast')
+CABIN = 'A quiet cabin in the forest with a fireplace, a kettle and a view of the lake, pets are allowed on request.'
+
+DATA = pd.DataFrame({
+    'name': ['Hotel X Haifa', 'Hotel X Eilat', 'Forest Cabin', 'Hotel X Tel Aviv'],
+    'price': [800, 700, 300, 900],
+    'score': [8.6, 8.1, 9.3, 8.8],
+    'link': ['a', 'b', 'c', 'd'],
+    'text': ['Hotel X Haifa: ' + BASE, 'Hotel X Eilat: ' + BASE.replace('2.3', '0.4'), CABIN,
+             'Hotel X Tel Aviv: ' + BASE.replace('2.3', '1')],
+}, index=[10, 11, 12, 13])
+
+
+def test_normalize_text_drops_the_name_numbers_and_boilerplate():
+    haifa = bookingai_dedup.normalize_text('Hotel X Haifa is 2.3 miles from the beach. We speak your language!',
+                                           'Hotel X Haifa')
+    eilat = bookingai_dedup.normalize_text('Hotel X Eilat is 0.4 miles from the beach.', 'Hotel X Eilat')
+
+    assert haifa == eilat == 'is 0 miles from the beach'
+    assert bookingai_dedup.normalize_text(float('nan')) == ''
+
+
+def test_chain_copies_are_grouped_and_unrelated_listings_are_not():
+    duplicates = bookingai_dedup.NearDuplicates(DATA['text'], DATA['name'])
+
+    assert duplicates.groups() == [[10, 11, 13]]
+    assert duplicates.representatives.tolist() == [10, 10, 12, 10]
+    assert duplicates.similarity(10, 11) == 1.0
+    assert duplicates.similarity(10, 12) < 0.1
+
+
+def test_threshold_decides_how_close_near_duplicates_are():
+    texts = pd.Series([BASE, VEGAN])
+
+    assert bookingai_dedup.NearDuplicates(texts, threshold=0.9).groups() == []
+    assert bookingai_dedup.NearDuplicates(texts, threshold=0.7).groups() == [[0, 1]]
+    assert bookingai_dedup.NearDuplicates(texts, threshold=1.0).groups() == []
+
+
+@pytest.mark.parametrize('kwargs', [{'threshold': 0}, {'threshold': 1.5}, {'num_perm': 100, 'bands': 16}])
+def test_bad_parameters_are_refused(kwargs):
+    with pytest.raises(ValueError):
+        bookingai_dedup.NearDuplicates(DATA['text'], **kwargs)
+
+
+def test_collapse_asks_the_first_listing_present_of_each_group():
+    duplicates = bookingai_dedup.NearDuplicates(DATA['text'], DATA['name'])
+
+    # the representative 10 is not among the labels, so 11 is asked about for itself and for 13
+    assert duplicates.collapse(pd.Index([11, 12, 13])).to_dict() == {11: 11, 12: 12, 13: 11}
+
+
+def test_query_asks_once_about_each_group(make_helper):
+    with bookingai_fakes.FakeChatServer(latency=0) as server:
+        query = bookingai_query.ListingQuery(data_bot(DATA), make_helper(server.api_base))
+        results = query.dedup(0.9).ask('is there a buffet breakfast?').run()
+
+    assert server.request_count == 2
+    assert query.stats['duplicates_skipped'] == {'is there a buffet breakfast?': 2}
+    assert query.stats['saved_by_dedup'] == 2
+    assert results['match'].tolist() == [True, True, False, True]
+
+
+def test_ask_questions_fans_answers_out_to_near_duplicates(make_helper):
+    bot = data_bot(DATA)
+
+    with bookingai_fakes.FakeChatServer(latency=0) as server:
+        matrix = bookingai_matrix.ask_questions(bot, ['is there a kettle?', 'is there a terrace?'],
+                                                make_helper(server.api_base), dedup=0.9)
+
+    assert server.request_count == 4
+    assert matrix.answers.index.tolist() == [10, 11, 12, 13]
+    assert matrix.answers['is there a kettle?'].tolist() == [False, False, True, False]
+    assert matrix.answers['is there a terrace?'].tolist() == [True, True, False, True]
@@ -0,0 +1,71 @@
+import bookingai_fakes
+import json
+import requests
+
+PROMPT = ('This is the description:\n{text}\n\nthe question is:\n{question}\nplease reply "yes" only if you are SURE '
+          'of the answer')
+
+
+def complete(server, content, **params):
+    return requests.post(f'{server.api_base}/chat/completions',
+                         json=dict(params, model='fake', messages=[{'role': 'system', 'content': content}]))
+
+
+def test_keyword_answer():
+    question = 'does this room have a kettle?'
+    assert bookingai_fakes.keyword_answer(PROMPT.format(text='an electric Kettle', question=question)) == 'yes'
+    assert bookingai_fakes.keyword_answer(PROMPT.format(text='a balcony', question=question)) == 'no'
+    assert bookingai_fakes.keyword_answer('not a prompt') == 'no'
+
+
+def test_keyword_answer_of_a_batched_prompt():
+    prompt = ('These are the descriptions:\nlisting 3:\na kettle\nlisting 5:\na balcony\n\nthe question is:\n'
+              'is there a kettle?\n')
+    assert json.loads(bookingai_fakes.keyword_answer(prompt)) == [{'index': 3, 'answer': 'yes'},
+                                                                  {'index': 5, 'answer': 'no'}]
+
+
+def test_chat_server_rate_limits_every_nth_request():
+    with bookingai_fakes.FakeChatServer(latency=0, rate_limit_every=2) as server:
+        statuses = [complete(server, 'prompt').status_code for _ in range(4)]
+
+    assert statuses == [200, 429, 200, 429]
+    assert server.rate_limited_count == 2
+
+
+def test_chat_server_keeps_requests_per_minute():
+    with bookingai_fakes.FakeChatServer(latency=0, requests_per_minute=3) as server:
+        statuses = [complete(server, 'prompt').status_code for _ in range(5)]
+
+    assert statuses == [200, 200, 200, 429, 429]
+
+
+def test_chat_server_logprobs_and_single_token_answers():
+    prompt = PROMPT.format(text='a kettle', question='is there a kettle?')
+
+    with bookingai_fakes.FakeChatServer(latency=0, verbose=True) as server:
+        verbose = complete(server, prompt).json()
+        single = complete(server, prompt, max_tokens=1, logit_bias={'9891': 100}, logprobs=True,
+                          top_logprobs=2).json()
+
+    assert verbose['choices'][0]['message']['content'].startswith('Yes, ')
+    assert single['choices'][0]['message']['content'] == 'yes'
+    top = single['choices'][0]['logprobs']['content'][0]['top_logprobs']
+    assert [item['token'] for item in top] == ['yes', 'no']
+    assert single['usage']['completion_tokens'] == 1
+
+
+def test_booking_server_pages():
+    listings = [{'name': f'hotel {i}', 'price': 100 + i, 'score': 8.0, 'text': f'room {i}'} for i in range(30)]
+
+    with bookingai_fakes.FakeBookingServer(listings, latency=0) as server:
+        first = requests.get(server.search_url).text
+        last = requests.get(f'{server.base_url}/searchresults.html?offset=25').text
+        listing = requests.get(server.links[7]).text
+        missing = requests.get(f'{server.base_url}/hotel/il/missing.html')
+
+    assert first.count('data-testid="property-card"') == 25
+    assert last.count('data-testid="property-card"') == 5
+    assert ' disabled>next' not in first and ' disabled>next' in last
+    assert 'room 7' in listing
+    assert missing.status_code == 404
@@ -0,0 +1,31 @@
+import bookingai_fakes
+import bookingai_fetch
+import bookingai_metrics
+
+LISTINGS = [
+    {'name': 'Prima Link', 'price': 800, 'score': 8.6, 'text': 'a room with a kettle.\nfree parking'},
+    {'name': 'Sea View Hostel', 'price': 300, 'score': 7.9, 'text': 'beds & a balcony'},
+]
+
+
+def test_fetch_all_keeps_the_order_of_the_links():
+    with bookingai_fakes.FakeBookingServer(LISTINGS, latency=0) as server:
+        fetcher = bookingai_fetch.DetailFetcher(host_delay=0, metrics=bookingai_metrics.Metrics())
+        texts = fetcher.fetch_all(server.links[::-1] + [f'{server.base_url}/hotel/il/missing.html'])
+        fetcher.close()
+
+    assert texts == ['beds & a balcony', 'a room with a kettle.\nfree parking', None]
+    assert fetcher.metrics.total('fetch_pages_total') == 3
+
+
+def test_fetch_keeps_max_per_host():
+    listings = [dict(LISTINGS[0], name=f'hotel {i}') for i in range(8)]
+
+    with bookingai_fakes.FakeBookingServer(listings, latency=0.05) as server:
+        fetcher = bookingai_fetch.DetailFetcher(max_workers=8, max_per_host=2, host_delay=0,
+                                                metrics=bookingai_metrics.Metrics())
+        texts = fetcher.fetch_all(server.links)
+        fetcher.close()
+
+    assert texts == [listings[0]['text']] * 8
+    assert server.max_in_flight <= 2
@@ -0,0 +1,59 @@
+import bookingai_fakes
+import bookingai_index
+import bookingai_query
+import pandas as pd
+import pytest
+from conftest import data_bot
+
+TEXTS = pd.Series([
+    'a quiet room with a kettle',
+    'kettles, kettle and a kettle in the kitchen of a much longer description about the view and the street',
+    'free wifi and a sea view',
+    'a terrace facing the beach',
+    None,
+], index=[10, 11, 12, 13, 14])
+
+
+def test_bm25_ranks_listings_by_how_much_they_mention_the_question():
+    scores = bookingai_index.TextIndex(TEXTS).scores('does the room have a kettle?')
+
+    # plurals count as the same term, and a term repeated scores higher despite the longer description
+    assert scores[11] > scores[10] > 0
+    assert (scores[[12, 13, 14]] == 0).all()
+
+
+def test_synonyms_match_both_ways():
+    index = bookingai_index.TextIndex(TEXTS)
+
+    assert list(index.candidates('is there a balcony?')) == [13]
+    assert set(index.candidates('is it near the sea?')) == {12, 13}
+    assert list(index.candidates('internet?')) == [12]
+
+
+def test_stopwords_are_not_searched_for():
+    index = bookingai_index.TextIndex(TEXTS)
+
+    assert index.query_terms('is there a kettle in the room?') == {'kettle'}
+    # a question of only stopwords can not rule anything out
+    assert list(index.candidates('is there any?')) == list(TEXTS.index)
+
+
+def test_top_mode_keeps_the_best_listings_within_the_given_ones():
+    index = bookingai_index.TextIndex(TEXTS)
+
+    assert list(index.candidates('a kettle?', mode='top', top_n=1)) == [11]
+    assert list(index.candidates('a kettle?', mode='top', top_n=1, within=[10, 12])) == [10]
+    with pytest.raises(ValueError):
+        index.candidates('a kettle?', mode='best')
+
+
+def test_prefilter_skips_listings_that_never_mention_the_question(make_helper):
+    data = pd.DataFrame({'name': list('abcde'), 'price': [1] * 5, 'score': [8.0] * 5, 'link': list('abcde'),
+                         'text': TEXTS.fillna('').tolist()})
+
+    with bookingai_fakes.FakeChatServer(latency=0) as server:
+        query = bookingai_query.ListingQuery(data_bot(data), make_helper(server.api_base))
+        results = query.ask('is there a kettle?').prefilter('overlap').run()
+
+    assert server.request_count == 2
+    assert results['match'].tolist() == [True, True, False, False, False]
@@ -0,0 +1,67 @@
+import bookingai_fakes
+import bookingai_matrix
+import pandas as pd
+import pytest
+from conftest import data_bot
+
+DATA = pd.DataFrame({
+    'name': ['Prima Link', 'Sea View Hostel', 'Dan Panorama'],
+    'price': [800, 300, 1200],
+    'score': [8.6, 7.9, 9.1],
+    'link': ['a', 'b', 'c'],
+    'text': ['a kettle and a balcony', 'a kettle on a noisy street', 'a balcony'],
+}, index=[4, 7, 9])
+
+QUESTIONS = ['is there a kettle?', 'is there a balcony?', 'is there street noise?']
+
+
+@pytest.fixture
+def matrix():
+    return bookingai_matrix.AnswerMatrix(pd.DataFrame({
+        QUESTIONS[0]: [True, True, False],
+        QUESTIONS[1]: [True, False, True],
+        QUESTIONS[2]: [False, True, False],
+    }, index=DATA.index))
+
+
+def test_ask_questions_gives_a_row_per_listing_and_a_column_per_question(make_helper):
+    with bookingai_fakes.FakeChatServer(latency=0) as server:
+        matrix = bookingai_matrix.ask_questions(data_bot(DATA), QUESTIONS, make_helper(server.api_base))
+
+    assert matrix.answers.shape == (3, 3)
+    assert matrix.questions() == QUESTIONS
+    assert list(matrix.answers.index) == [4, 7, 9]
+    assert matrix.answers[QUESTIONS[0]].tolist() == [True, True, False]
+    assert server.request_count == 9
+
+
+def test_repeated_questions_are_refused():
+    with pytest.raises(ValueError):
+        bookingai_matrix.ask_questions(data_bot(DATA), ['a kettle?', 'a kettle?'])
+
+
+def test_evaluate_combines_the_answers(matrix):
+    assert matrix.evaluate('kettle AND balcony').tolist() == [True, False, False]
+    assert matrix.evaluate('kettle AND NOT noise OR balcony').tolist() == [True, False, True]
+    assert matrix.evaluate('kettle AND NOT (noise OR balcony)').tolist() == [False, False, False]
+    assert matrix.string_results('balcony') == 'entries 4, 9 match your question.'
+
+
+@pytest.mark.parametrize('expression', ['', 'kettle AND', '(kettle', 'kettle balcony OR', 'wifi', 'is there'])
+def test_evaluate_refuses_malformed_expressions(matrix, expression):
+    with pytest.raises(ValueError):
+        matrix.evaluate(expression)
+
+
+@pytest.mark.parametrize('extension', ['.csv', '.parquet', '.arrow'])
+def test_save_and_load(tmp_path, matrix, extension):
+    path = bookingai_matrix.matrix_path(str(tmp_path / f'results{extension}'))
+    matrix.save(path)
+
+    loaded = bookingai_matrix.load_matrix(path, DATA.index)
+
+    assert path.endswith(f'results.answers{extension}')
+    assert loaded.questions() == QUESTIONS
+    pd.testing.assert_frame_equal(loaded.answers, matrix.answers, check_dtype=False)
+    with pytest.raises(ValueError):
+        bookingai_matrix.load_matrix(path, DATA.index[:2])
@@ -0,0 +1,77 @@
+import bookingai_metrics
+import pytest
+
+
+def test_histogram_counts_values_in_their_buckets():
+    histogram = bookingai_metrics.Histogram(buckets=(0.1, 1, 10))
+    for value in [0.05, 0.1, 0.5, 2, 20]:
+        histogram.observe(value)
+
+    # a value on a bound is in that bucket, a value above the last bound is in +Inf
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.to_dict()['buckets'] == {'0.1': 2, '1': 3, '10': 4, '+Inf': 5}
+    assert histogram.to_dict()['mean'] == pytest.approx(22.65 / 5)
+    assert histogram.quantile(0.5) == 1
+    assert histogram.quantile(1) == 20
+
+
+def test_empty_histogram_has_no_quantiles():
+    assert bookingai_metrics.Histogram().quantile(0.5) is None
+
+
+def test_counters_add_up_by_labels():
+    metrics = bookingai_metrics.Metrics()
+    metrics.increment('gpt_requests_total', status='ok')
+    metrics.increment('gpt_requests_total', 2, status='ok')
+    metrics.increment('gpt_requests_total', status='rate_limited')
+
+    assert metrics.total('gpt_requests_total') == 4
+    assert metrics.total('never_counted') == 0
+    assert {c['labels']['status']: c['value'] for c in metrics.snapshot()['counters']} == {'ok': 3, 'rate_limited': 1}
+
+
+def test_prometheus_text():
+    metrics = bookingai_metrics.Metrics()
+    metrics.increment('gpt_requests_total', status='ok')
+    metrics.increment('gpt_requests_total', status='a "quoted"\nlabel')
+    metrics.observe('stage_seconds', 0.5, stage='home_page')
+    metrics.observe('stage_seconds', 3, stage='home_page')
+
+    lines = metrics.to_prometheus().splitlines()
+
+    assert lines[:3] == [
+        '# TYPE bookingai_gpt_requests_total counter',
+        'bookingai_gpt_requests_total{status="a \\"quoted\\"\\nlabel"} 1',
+        'bookingai_gpt_requests_total{status="ok"} 1',
+    ]
+    assert lines[3] == '# TYPE bookingai_stage_seconds histogram'
+    # buckets are cumulative
+    assert 'bookingai_stage_seconds_bucket{stage="home_page",le="0.25"} 0' in lines
+    assert 'bookingai_stage_seconds_bucket{stage="home_page",le="0.5"} 1' in lines
+    assert 'bookingai_stage_seconds_bucket{stage="home_page",le="5"} 2' in lines
+    assert lines[-3:] == [
+        'bookingai_stage_seconds_bucket{stage="home_page",le="+Inf"} 2',
+        'bookingai_stage_seconds_sum{stage="home_page"} 3.5',
+        'bookingai_stage_seconds_count{stage="home_page"} 2',
+    ]
+
+
+def test_usage_is_counted_with_its_cost():
+    metrics = bookingai_metrics.Metrics()
+    metrics.record_usage('gpt-3.5-turbo-0613', {'prompt_tokens': 1000, 'completion_tokens': 10})
+    metrics.record_usage('gpt-3.5-turbo-0613', None)
+
+    assert metrics.total('gpt_prompt_tokens_total') == 1000
+    assert metrics.total('gpt_completion_tokens_total') == 10
+    assert metrics.total('gpt_cost_dollars_total') > 0
+
+
+def test_span_times_the_stage():
+    metrics = bookingai_metrics.Metrics()
+    with pytest.raises(KeyError):
+        with metrics.span('home_page'):
+            raise KeyError
+
+    # a stage that failed is still timed
+    assert metrics.snapshot()['histograms'][0]['labels'] == {'stage': 'home_page'}
+    assert metrics.snapshot()['histograms'][0]['count'] == 1
@@ -0,0 +1,82 @@
+import os
+import types
+
+import bookingai_bot
+import bookingai_fakes
+import bookingai_pipeline
+import pandas as pd
+
+
+class PagedBot(bookingai_bot.BookingBot):
+    """a bot that reads its search results from lists of cards, one list for each results page, instead of a browser
+    descriptions have a kettle for odd indices, except the listing at index 1 that has none over http"""
+    def __init__(self, pages):
+        super().__init__(browser=types.SimpleNamespace(find_elements=lambda *args: []))
+        self.TXT_PATH = os.path.join(os.path.dirname(bookingai_bot.__file__), 'prompt_format.txt')
+        self._waiter = types.SimpleNamespace(refreshed=lambda *args: None, present=lambda *args: None)
+        self.pages = pages
+        self.page = 0
+        self.scraped = 0
+
+    def scrape_cards(self, amount=10, offset=0):
+        return pd.DataFrame(self.pages[self.page][offset:offset + amount], columns=['name', 'price', 'score', 'link'])
+
+    def go_to_next_results_page(self):
+        if self.page + 1 == len(self.pages):
+            return None
+        self.page += 1
+        return 'page'
+
+    def get_detail_fetcher(self):
+        def fetch(link):
+            number = int(link.rsplit('/', 1)[1])
+            return None if number == 1 else ('a kettle' if number % 2 else 'nothing')
+        return types.SimpleNamespace(max_workers=2, fetch=fetch)
+
+    def fetch_description_with_browser(self, link):
+        return 'from the browser'
+
+    def iter_search_data(self, amount=10):
+        for listing in super().iter_search_data(amount):
+            self.scraped += 1
+            yield listing
+
+
+def make_pages(amount, per_page):
+    cards = [{'name': f'hotel {i}', 'price': '100', 'score': '8', 'link': f'https://booking.example/{i}'}
+             for i in range(amount)]
+    return [cards[i:i + per_page] for i in range(0, amount, per_page)]
+
+
+def test_iter_search_data_goes_through_result_pages():
+    bot = PagedBot(make_pages(12, per_page=4))
+
+    listings = list(bot.iter_search_data(10))
+
+    assert bot.page == 2
+    # the listing with no description over http is opened in the browser after the pages are done with
+    assert [listing['index'] for listing in listings] == [0, 2, 3, 4, 5, 6, 7, 8, 9, 1]
+    assert listings[-1]['text'] == 'from the browser'
+    assert listings[0]['price'] == 100
+
+
+def test_iter_search_data_stops_when_results_run_out():
+    bot = PagedBot(make_pages(6, per_page=4))
+
+    assert len(list(bot.iter_search_data(10))) == 6
+
+
+def test_stream_answers_keeps_at_most_max_pending_listings_waiting(make_helper):
+    bot = PagedBot(make_pages(20, per_page=5))
+    answers = {}
+
+    with bookingai_fakes.FakeChatServer(latency=0.02) as server:
+        helper = make_helper(server.api_base, max_workers=1)
+        for listing, answer in bookingai_pipeline.stream_answers(bot, 'a kettle?', amount=20, gpt_helper=helper,
+                                                                 max_pending=2):
+            answers[listing['index']] = answer
+            # the scraper may hold one more listing while it waits for a slot
+            assert bot.scraped <= len(answers) + 2 + 1
+
+    assert sorted(answers) == list(range(20))
+    assert answers == {i: i % 2 == 1 and i != 1 for i in range(20)}
@@ -0,0 +1,59 @@
+import bookingai_prompts
+import pytest
+
+
+@pytest.fixture
+def make_builder(tmp_path, monkeypatch):
+    """returns a function making a PromptBuilder with a short format, counting 4 characters a token"""
+    monkeypatch.setattr(bookingai_prompts, 'load_encoding', lambda model: None)
+    path = tmp_path / 'format.txt'
+    path.write_text('about: @@@@@\nquestion: &&&&&\n')
+
+    def make(**kwargs):
+        return bookingai_prompts.PromptBuilder(str(path), **kwargs)
+    return make
+
+
+def test_short_description_is_a_single_prompt(make_builder):
+    builder = make_builder(max_prompt_tokens=100)
+
+    assert builder.build('a kettle', 'a kettle?') == ['about: a kettle\nquestion: a kettle?\n']
+
+
+def test_long_description_is_chunked_at_the_budget(make_builder):
+    builder = make_builder(max_prompt_tokens=20)
+    description = 'x' * 100
+
+    prompts = builder.build(description, 'kettle?')
+
+    assert len(prompts) > 1
+    assert all(builder.count_tokens(prompt) <= 20 for prompt in prompts)
+    assert ''.join(prompt.split('about: ')[1].split('\n')[0] for prompt in prompts) == description
+
+
+def test_long_description_is_truncated_at_the_budget(make_builder):
+    builder = make_builder(max_prompt_tokens=20, overflow='truncate')
+
+    prompts = builder.build('x' * 100, 'kettle?')
+    chunked = make_builder(max_prompt_tokens=20).build('x' * 100, 'kettle?')
+
+    # only the first chunk is kept
+    assert prompts == chunked[:1]
+    assert builder.count_tokens(prompts[0]) <= 20
+
+
+def test_question_over_the_budget_is_refused(make_builder):
+    with pytest.raises(ValueError):
+        make_builder(max_prompt_tokens=10).build('a kettle', 'q' * 40)
+
+
+def test_estimate_counts_chunks(make_builder):
+    builder = make_builder(max_prompt_tokens=20)
+
+    estimate = builder.estimate(['short', 'x' * 100], 'kettle?', answer_tokens=1)
+    prompts = 1 + len(builder.build('x' * 100, 'kettle?'))
+
+    assert estimate['prompts'] == prompts
+    assert estimate['completion_tokens'] == prompts
+    assert estimate['total_tokens'] == estimate['prompt_tokens'] + prompts
+    assert estimate['cost'] > 0
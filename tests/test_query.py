@@ -0,0 +1,46 @@
+import bookingai_fakes
+import bookingai_query
+import pandas as pd
+import pytest
+from conftest import data_bot
+
+DATA = pd.DataFrame({
+    'name': ['Prima Link', 'Sea View Hostel', 'Dan Panorama', 'Cheap Beds'],
+    'price': [800, 300, 1200, None],
+    'score': [8.6, 7.9, 9.1, 6.0],
+    'link': ['a', 'b', 'c', 'd'],
+    'text': ['a kettle and a balcony', 'a kettle', 'a balcony and a kettle', 'a kettle'],
+})
+
+
+def test_filters_are_read_from_text():
+    query = bookingai_query.ListingQuery(data_bot(DATA)).where_text('price < 1000, score >= 7.9, name contains VIEW')
+
+    assert query.filters == [('price', '<', 1000.0), ('score', '>=', 7.9), ('name', 'contains', 'VIEW')]
+    assert query.filter_mask().tolist() == [False, True, False, False]
+
+
+@pytest.mark.parametrize('text', ['price', 'text contains kettle', 'price < cheap', 'price ~ 3'])
+def test_unreadable_filters_are_refused(text):
+    with pytest.raises(ValueError):
+        bookingai_query.ListingQuery(data_bot(DATA)).where_text(text)
+
+
+def test_missing_values_do_not_pass_a_filter():
+    query = bookingai_query.ListingQuery(data_bot(DATA)).where('price', '<', 10 ** 6)
+
+    assert query.filter_mask().tolist() == [True, True, True, False]
+
+
+def test_questions_are_only_asked_about_listings_still_matching(make_helper):
+    with bookingai_fakes.FakeChatServer(latency=0) as server:
+        query = bookingai_query.ListingQuery(data_bot(DATA), make_helper(server.api_base))
+        results = query.where('price', '<', 1000).ask('is there a balcony?').ask('is there a kettle?').run()
+
+    # the first question about the two listings under 1000, the second only about the one with a balcony
+    assert query.stats['asked'] == {'is there a balcony?': 2, 'is there a kettle?': 1}
+    assert query.stats['saved'] == 5
+    assert server.request_count == 3
+    assert results['match'].tolist() == [True, False, False, False]
+    assert results['is there a kettle?'].isna().tolist() == [False, True, True, True]
+    assert query.string_results(results) == 'entries 0 match your question.'
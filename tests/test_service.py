@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import bookingai_fakes
+import bookingai_service
+import pandas as pd
+from aiohttp.test_utils import TestClient, TestServer
+from conftest import REPO_DIR
+
+
+def write_dataset(path, texts):
+    pd.DataFrame({'name': [f'hotel {i}' for i in range(len(texts))], 'price': 100, 'score': 8.0,
+                  'link': [f'https://www.booking.com/hotel/il/{i}.html' for i in range(len(texts))],
+                  'text': texts}).to_csv(path, index=False)
+
+
+def call(service, requests):
+    """runs requests(client) against the service's app, returns what it returns"""
+    async def run():
+        async with TestClient(TestServer(service.make_app())) as client:
+            return await requests(client)
+    return asyncio.run(run())
+
+
+def test_datasets_outside_the_data_dir_are_rejected(tmp_path, make_helper):
+    (tmp_path / 'data').mkdir()
+    write_dataset(tmp_path / 'outside.csv', ['a kettle'])
+    service = bookingai_service.BookingService(gpt_helper=make_helper(), data_dir=str(tmp_path / 'data'))
+
+    async def requests(client):
+        statuses = []
+        for path in ['../outside.csv', str(tmp_path / 'outside.csv'), 'missing.csv', '']:
+            response = await client.post('/datasets', json={'path': path})
+            statuses.append(response.status)
+        return statuses
+
+    assert call(service, requests) == [400, 400, 400, 400]
+    assert service.datasets == {}
+
+
+def test_a_changed_file_is_loaded_again(tmp_path, make_helper):
+    write_dataset(tmp_path / 'results.csv', ['a kettle'])
+    service = bookingai_service.BookingService(gpt_helper=make_helper(), data_dir=str(tmp_path))
+
+    async def requests(client):
+        first = await (await client.post('/datasets', json={'path': 'results.csv'})).json()
+        again = await (await client.post('/datasets', json={'path': 'results.csv'})).json()
+        write_dataset(tmp_path / 'results.csv', ['a kettle', 'a balcony'])
+        changed = await (await client.post('/datasets', json={'path': 'results.csv'})).json()
+        return first, again, changed
+
+    first, again, changed = call(service, requests)
+
+    assert first['id'] == again['id'] == changed['id']
+    assert [first['listings'], again['listings'], changed['listings']] == [1, 1, 2]
+
+
+def test_questions_are_answered_with_the_chat_server(tmp_path, make_helper, monkeypatch):
+    # the bots read the prompt format from the working directory
+    monkeypatch.chdir(REPO_DIR)
+    write_dataset(tmp_path / 'results.csv', ['a kettle', 'a balcony', 'an electric kettle'])
+
+    async def requests(client):
+        loaded = await (await client.post('/datasets', json={'path': 'results.csv'})).json()
+        answers = []
+        # the same question again is answered without asking
+        for _ in range(2):
+            response = await client.post(f'/datasets/{loaded["id"]}/questions', json={'question': 'is there a kettle?'})
+            answers.append([json.loads(line) for line in (await response.text()).splitlines()])
+        return answers
+
+    with bookingai_fakes.FakeChatServer(latency=0) as server:
+        service = bookingai_service.BookingService(gpt_helper=make_helper(server.api_base), data_dir=str(tmp_path))
+        lines, again = call(service, requests)
+
+    assert sorted((line['index'], line['answer']) for line in lines[:-1]) == [(0, True), (1, False), (2, True)]
+    assert lines[-1]['done'] and lines[-1]['matches'] == [0, 2]
+    assert again[-1]['matches'] == [0, 2]
+    assert server.request_count == 3
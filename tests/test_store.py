@@ -0,0 +1,55 @@
+import bookingai_bot
+import bookingai_store
+import pandas as pd
+
+LINK = 'https://www.booking.com/hotel/il/prima-link.html'
+
+
+def test_canonical_hotel_id_ignores_tracking_and_search_parameters():
+    links = [
+        LINK,
+        LINK + '?aid=304142&label=gen173nr&checkin=2026-11-01&checkout=2026-11-03&group_adults=2',
+        'https://www.booking.com/hotel/il/prima-link.en-gb.html?sid=abc#hotelTmpl',
+    ]
+
+    assert {bookingai_store.canonical_hotel_id(link) for link in links} == {'/hotel/il/prima-link'}
+
+
+def test_needs_fetch_only_for_new_or_changed_cards(tmp_path):
+    store = bookingai_store.ListingStore(str(tmp_path / 'listings.sqlite'))
+    card = {'hotel_id': '/hotel/il/prima-link', 'name': 'Prima Link', 'price': 800, 'score': 8.6}
+    store.upsert([dict(card, text='a kettle')])
+
+    assert store.needs_fetch([card, dict(card, price=900), dict(card, hotel_id='/hotel/il/other')]) == \
+        [False, True, True]
+    assert store.get_texts(['/hotel/il/prima-link']) == {'/hotel/il/prima-link': 'a kettle'}
+    store.close()
+
+
+class CountingBot(bookingai_bot.BookingBot):
+    """a bot that makes up descriptions instead of fetching them, and keeps the links it was asked to fetch"""
+    def __init__(self, store_path):
+        super().__init__(browser=object(), store_path=store_path)
+        self.fetched = []
+
+    def fetch_descriptions(self, links):
+        self.fetched.extend(links)
+        return [f'description of {link}' for link in links]
+
+
+def test_describe_cards_skips_listings_whose_card_did_not_change(tmp_path):
+    cards = pd.DataFrame({'name': ['Prima Link', 'Sea View'], 'price': ['800', '300'], 'score': ['8.6', '7.9'],
+                          'link': [LINK + '?checkin=2026-11-01', 'https://www.booking.com/hotel/il/sea-view.html']})
+    path = str(tmp_path / 'listings.sqlite')
+
+    first = CountingBot(path)
+    texts = first.describe_cards(first.parse_cards(cards))
+    first.listing_store.close()
+
+    # the same destination again, with other dates in the links and a new price for one listing
+    cards['link'] = [LINK + '?checkin=2026-12-01', 'https://www.booking.com/hotel/il/sea-view.html?aid=1']
+    cards.loc[1, 'price'] = '350'
+    second = CountingBot(path)
+
+    assert second.describe_cards(second.parse_cards(cards)) == [texts[0], f'description of {cards["link"][1]}']
+    assert second.fetched == [cards['link'][1]]
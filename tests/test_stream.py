@@ -0,0 +1,100 @@
+import os
+
+import bookingai_data
+import bookingai_fakes
+import bookingai_matrix
+import bookingai_stream
+import pandas as pd
+import pytest
+from conftest import REPO_DIR
+
+TEMPLATE = os.path.join(REPO_DIR, 'prompt_format.txt')
+QUESTIONS = ['is there a kettle?', 'is there a balcony?']
+
+
+def write_dataset(path, rows=10):
+    texts = ['a kettle' if i % 2 else 'a balcony' for i in range(rows)]
+    bookingai_data.save_frame(pd.DataFrame({'name': [f'hotel {i}' for i in range(rows)], 'price': 100, 'score': 8.0,
+                                            'link': 'x', 'text': texts}), str(path))
+
+
+class Stop(Exception):
+    pass
+
+
+def stop_after(rows):
+    """returns a log function that stops the run once rows rows are done, like a crash right after a checkpoint"""
+    def log(line):
+        if int(line.split()[0]) >= rows:
+            raise Stop
+    return log
+
+
+@pytest.mark.parametrize('name', ['listings.csv', 'listings.parquet'])
+def test_answers_are_written_a_chunk_at_a_time(tmp_path, make_helper, name):
+    write_dataset(tmp_path / name)
+    lines = []
+
+    with bookingai_fakes.FakeChatServer(latency=0) as server:
+        result = bookingai_stream.answer_in_chunks(str(tmp_path / name), QUESTIONS, chunksize=3,
+                                                   gpt_helper=make_helper(server.api_base), template_path=TEMPLATE,
+                                                   log=lines.append)
+
+    assert result['out_path'] == str(tmp_path / 'listings.answers.csv')
+    assert [line.split()[0] for line in lines] == ['3', '6', '9', '10']
+    assert result['rows'] == 10 and result['prompts'] == 20 and server.request_count == 20
+    assert result['matches'] == {QUESTIONS[0]: 5, QUESTIONS[1]: 5}
+
+    matrix = bookingai_matrix.load_matrix(result['out_path'])
+    assert matrix.answers[QUESTIONS[0]].tolist() == [i % 2 == 1 for i in range(10)]
+
+
+def test_resuming_does_not_ask_again_about_finished_chunks(tmp_path, make_helper):
+    write_dataset(tmp_path / 'listings.csv')
+    out_path = str(tmp_path / 'answers.csv')
+
+    with bookingai_fakes.FakeChatServer(latency=0) as server:
+        helper = make_helper(server.api_base)
+        with pytest.raises(Stop):
+            bookingai_stream.answer_in_chunks(str(tmp_path / 'listings.csv'), QUESTIONS, out_path, chunksize=3,
+                                              gpt_helper=helper, template_path=TEMPLATE, log=stop_after(6))
+        asked_before = server.request_count
+
+        # answers of a chunk that did not reach its checkpoint are left out and asked again
+        with open(out_path, 'a') as f:
+            f.write('True,True\n')
+
+        result = bookingai_stream.answer_in_chunks(str(tmp_path / 'listings.csv'), QUESTIONS, out_path, chunksize=3,
+                                                   gpt_helper=helper, template_path=TEMPLATE, log=None)
+
+    assert asked_before == 12
+    assert result['resumed_from'] == 6 and result['prompts'] == 8
+    assert server.request_count == 12 + 8
+    matrix = bookingai_matrix.load_matrix(out_path)
+    assert matrix.answers[QUESTIONS[0]].tolist() == [i % 2 == 1 for i in range(10)]
+    assert result['matches'] == {QUESTIONS[0]: 5, QUESTIONS[1]: 5}
+
+
+def test_a_finished_run_asks_nothing(tmp_path, make_helper):
+    write_dataset(tmp_path / 'listings.csv', rows=4)
+
+    with bookingai_fakes.FakeChatServer(latency=0) as server:
+        for _ in range(2):
+            result = bookingai_stream.answer_in_chunks(str(tmp_path / 'listings.csv'), QUESTIONS[:1], chunksize=3,
+                                                       gpt_helper=make_helper(server.api_base),
+                                                       template_path=TEMPLATE, log=None)
+
+    assert server.request_count == 4
+    assert result['prompts'] == 0 and result['rows'] == 4
+
+
+def test_a_checkpoint_of_other_questions_is_refused(tmp_path, make_helper):
+    write_dataset(tmp_path / 'listings.csv', rows=2)
+
+    with bookingai_fakes.FakeChatServer(latency=0) as server:
+        bookingai_stream.answer_in_chunks(str(tmp_path / 'listings.csv'), QUESTIONS[:1],
+                                          gpt_helper=make_helper(server.api_base), template_path=TEMPLATE, log=None)
+        with pytest.raises(ValueError):
+            bookingai_stream.answer_in_chunks(str(tmp_path / 'listings.csv'), QUESTIONS,
+                                              gpt_helper=make_helper(server.api_base), template_path=TEMPLATE,
+                                              log=None)
@@ -0,0 +1,32 @@
+import bookingai_wait
+import pytest
+from selenium.common.exceptions import TimeoutException
+
+
+def test_wait_returns_once_the_condition_is_met():
+    checks = []
+    waiter = bookingai_wait.StepWaiter(driver=None, default_timeout=1, poll_frequency=0.01)
+
+    assert waiter.wait('step', lambda driver: checks.append(1) or len(checks) >= 3) is True
+    assert len(checks) == 3
+    assert waiter.timings[0]['timed_out'] is False
+
+
+def test_wait_raises_after_the_timeout():
+    waiter = bookingai_wait.StepWaiter(driver=None, default_timeout=10, poll_frequency=0.01)
+
+    with pytest.raises(TimeoutException):
+        waiter.wait('filters', lambda driver: False, timeout=0.05)
+
+    assert waiter.timings[0]['step'] == 'filters'
+    assert waiter.timings[0]['timed_out'] is True
+    assert 0.05 <= waiter.timings[0]['seconds'] < 1
+
+
+def test_optional_wait_returns_none_after_the_timeout():
+    waiter = bookingai_wait.StepWaiter(driver=None, poll_frequency=0.01)
+
+    assert waiter.wait('popup', lambda driver: False, timeout=0.05, required=False) is None
+    assert waiter.wait('popup', lambda driver: False, timeout=0.05, required=False) is None
+    assert [timing['timed_out'] for timing in waiter.timings] == [True, True]
+    assert list(waiter.report()) == ['popup']